@@ -133,6 +133,24 @@ USE_TZ = True
 
 REPO_DIR = os.path.join(os.path.join(BASE_DIR, 'static'), 'All_Repo')
 
+# Least recently used workspaces are evicted once REPO_DIR grows beyond this many bytes
+WORKSPACE_DISK_BUDGET = 5 * 1024 ** 3
+
+# FTP sites are listed instead of mirrored when editing starts, pages are downloaded when opened
+FTP_LAZY_SYNC = False
+
+# Seconds a listing of an FTP site is used before the server is listed again
+FTP_LISTING_TTL = 600
+
+# Size cap in bytes of the on-disk cache of extracted element and image tables
+TABLE_CACHE_SIZE = 64 * 1024 ** 2
+
+# Processes extracting tables of all pages after a workspace is synced
+PIPELINE_WORKERS = 2
+
+# Milliseconds a worker boot may spend importing modules, checked by the startup_time command
+STARTUP_IMPORT_BUDGET = 400
+
 STATIC_URL = 'static/'
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'static_media/')
@@ -1,26 +1,64 @@
-import git
-import datetime as dt
-import uuid
-import sys
-import os
-import ftplib
-
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import Group
-from .models import ClientRequest, ChangeRequest
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .history import DEFAULT_DAYS, latency_report, push_backlog
+from .models import ClientRequest, ChangeRequest, TransferAttempt
+from .pagination import LargeTablePaginator
+from .push import push_change_requests
 
 admin.site.unregister(Group)
 
+
+class RelatedObjectFilter(admin.SimpleListFilter):
+    """
+    Filter by a related object without listing every one of them.
+    
+    Sidebar only shows the selected object, lists link to the filtered changelist
+    (e.g. ?profile=1) and forms pick related objects with autocomplete.
+    """
+    
+    def lookups(self, request, model_admin):
+        value = self.value()
+        if not value or not value.isdigit():
+            return []
+        
+        related_model = model_admin.model._meta.get_field(self.parameter_name).related_model
+        related = related_model._base_manager.filter(pk=value).first()
+        return [(value, str(related) if related is not None else value)]
+    
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value and value.isdigit():
+            return queryset.filter(**{f'{self.parameter_name}_id': value})
+        return queryset
+
+
+class ProfileFilter(RelatedObjectFilter):
+    title = 'profile'
+    parameter_name = 'profile'
+
+
+class ClientRequestFilter(RelatedObjectFilter):
+    title = 'client'
+    parameter_name = 'client_request'
+
 @admin.register(ClientRequest)
 class ClientRequestAdmin(UserAdmin):
     
-    search_fields = ('url', 'profile',)
+    # exact searches and filters on indexed columns, see Meta.indexes
+    search_fields = ('=url', '=code_link', '=profile__email',)
     ordering = ('profile',)
-    list_display = ('profile', 'username', 'url', 'code_link', 'token', 'version_control', 'branch', 'port')
-    list_filter = ('url', 'code_link', 'profile', )
+    list_display = ('profile', 'username', 'url', 'code_link', 'token', 'version_control', 'branch', 'port', 'change_requests')
+    list_select_related = ('profile',)
+    list_filter = ('version_control', ProfileFilter, )
     filter_horizontal =  tuple()
+    autocomplete_fields = ('profile',)
+    paginator = LargeTablePaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Client Details', {'fields': ('profile', 'username',)}),
@@ -32,102 +70,83 @@ class ClientRequestAdmin(UserAdmin):
         ('Code Details', {'fields': ('url', 'code_link', 'token', 'version_control', 'branch')}),
     )
     
-
-def uploadThis(ftp, path):
-    files = os.listdir(path)
-    os.chdir(path)
-    for f in files:
-        if os.path.isfile(f'{path}/{f}'):
-            fh = open(f, 'rb')
-            ftp.storbinary('STOR %s' % f, fh)
-            fh.close()
-        elif os.path.isdir(f'{path}/{f}'):
-            try:
-                ftp.mkd(f)
-            except:
-                pass
-            ftp.cwd(f)
-            uploadThis(ftp, f'{path}/{f}')
-    ftp.cwd('..')
-    os.chdir('..')
-    
+    @admin.display(description='Change Requests')
+    def change_requests(self, obj):
+        url = reverse('admin:accounts_changerequest_changelist')
+        return format_html('<a href="{}?client_request={}">View</a>', url, obj.pk)
     
+
 @admin.action(description='Push selected repositories')
 def push_repository(modeladmin, request, queryset):
-    for query in queryset:
-        if not query.success:
-            try:
-                
-                if query.client_request.version_control.lower() == 'ftp':
-                    
-                    code_link = query.client_request.code_link
-                    username = query.client_request.username
-                    token = query.client_request.token
-                    branch = query.client_request.branch
-                    port = query.client_request.port
-                    
-                    # create FTP instance 
-                    ftp = ftplib.FTP()
-                    
-                    # connect to ftp server
-                    ftp.connect(host=code_link, port=int(port))
-                    
-                    # Login to server
-                    ftp.login(username, token)
-                    
-                    try:
-                        ftp.mkd(branch)
-                    except:
-                        pass
-                    
-                    # change to location to source
-                    ftp.cwd(branch)
-                    
-                    uploadThis(ftp, query.repo)
-                    
-                    ftp.quit()
-                    
-                    commit_message = f"AI_MODIFIER_{uuid.uuid4().hex}"
-                    
-                    query.success=True
-                    query.error=f'Successfully Pushed comment: {commit_message}'
-                
-                else:
-                    repo = git.Repo(query.repo)
-                    repo.git.add(all=True)
-                    commit_message = f"AI_MODIFIER_{uuid.uuid4().hex}"
-                    repo.index.commit(commit_message)
-                    # repo.commit(commit_message)
-                    origin = repo.remote(name='origin')
-                    origin.push()
-                    
-                    query.success=True
-                    query.error=f'Successfully Pushed comment: {commit_message}'
-                    # print(query.repo)
-                
-                
-            except Exception as e:
-                query.update(success=False, error=f'Error: {e}')
-            
-        query.save()
-            
-    
+    push_change_requests(queryset)
+
+
 @admin.register(ChangeRequest)
 class ChangeRequestAdmin(UserAdmin):
     
     actions = [push_repository]
-    search_fields = ('repo', 'client_request', 'success', 'error',)
+    # exact searches and filters on indexed columns, see Meta.indexes
+    search_fields = ('=repo', '=client_request__url',)
     ordering = ('repo',)
-    list_display = ('repo', 'client_request', 'success', 'error',)
-    list_filter = ('client_request', 'success',)
+    list_display = ('repo', 'client_request', 'created_at', 'success', 'error',)
+    list_select_related = ('client_request',)
+    list_filter = ('success', ClientRequestFilter,)
     filter_horizontal =  tuple()
+    autocomplete_fields = ('client_request',)
+    paginator = LargeTablePaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Client Details', {'fields': ('client_request',)}),
-        ('Repository', {'fields': ('repo', 'success', 'error',)}),
+        ('Repository', {'fields': ('repo', 'files', 'success', 'error',)}),
     )
     
     add_fieldsets = (
         ('Client Details', {'fields': ('client_request',)}),
-        ('Repository', {'fields': ('repo', 'success', 'error',)}),
+        ('Repository', {'fields': ('repo', 'files', 'success', 'error',)}),
     )
+
+
+@admin.register(TransferAttempt)
+class TransferAttemptAdmin(admin.ModelAdmin):
+    
+    change_list_template = 'admin/accounts/transferattempt/change_list.html'
+    list_display = ('repo', 'client_request', 'kind', 'transport', 'created_at', 'started_at', 'duration', 'files', 'bytes', 'success',)
+    list_select_related = ('client_request',)
+    list_filter = ('kind', 'transport', 'success', ClientRequestFilter,)
+    search_fields = ('=repo', '=client_request__url',)
+    paginator = LargeTablePaginator
+    show_full_result_count = False
+    
+    def has_add_permission(self, request):
+        # attempts are only recorded by pushes and syncs
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def get_urls(self):
+        return [
+            path('dashboard/', self.admin_site.admin_view(self.dashboard_view), name='accounts_transferattempt_dashboard'),
+        ] + super().get_urls()
+    
+    def dashboard_view(self, request):
+        """
+        Push and sync latency percentiles per transport and per client.
+        """
+        try:
+            days = max(1, int(request.GET.get('days', DEFAULT_DAYS)))
+        except ValueError:
+            days = DEFAULT_DAYS
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Push and sync latency',
+            'opts': self.model._meta,
+            'days': days,
+            'backlog': push_backlog(),
+            'by_transport': latency_report('transport', days),
+            'by_client': latency_report('client', days),
+        }
+        
+        return TemplateResponse(request, 'admin/accounts/transferattempt/dashboard.html', context)
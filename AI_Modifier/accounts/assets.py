@@ -0,0 +1,225 @@
+"""
+Reverse index of images to the pages referencing them.
+
+The index of a workspace is built when it is synced and updated whenever the
+editor changes a page, so finding every page using an image doesn't parse the
+whole site. It is kept next to the workspace's lock, outside the workspace,
+so it is never pushed.
+
+Paths within the index are relative to the workspace.
+"""
+import json
+import os
+import posixpath
+from urllib.parse import urlsplit, unquote
+
+from bs4 import BeautifulSoup
+
+from .extraction import fingerprint, walk
+from .image_meta import build_image_index, update_image_index
+from .locks import lock_path
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Bumped whenever the layout of the index changes
+INDEX_VERSION = 1
+
+
+def resolve_src(page: str, src: str) -> str:
+    """
+    Resolve 'src' of an <img> on 'page' to a path within the workspace.
+
+    : returns: path relative to workspace, None for external and data urls
+    """
+    parts = urlsplit(src.strip())
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+
+    path = unquote(parts.path)
+    if path.startswith('/'):
+        return posixpath.normpath(path.lstrip('/'))
+
+    return posixpath.normpath(posixpath.join(posixpath.dirname(page), path))
+
+
+def relative_src(page: str, image: str, like: str) -> str:
+    """
+    Build src of 'image' for an <img> on 'page', root-relative if the replaced src 'like' was.
+    """
+    if like.strip().startswith('/'):
+        return f'/{image}'
+    return posixpath.relpath(image, posixpath.dirname(page) or '.')
+
+
+def page_references(soup: BeautifulSoup, page: str) -> list:
+    """
+    Find images referenced by <img> tags of a page.
+
+    : returns: list of [image, locator], image is None for external sources
+    """
+    return [[resolve_src(page, img['src']), f'{path}:{fingerprint(img)}']
+            for img, path in walk(soup) if img.name == 'img' and img.get('src')]
+
+
+def read_page(repo_name: str, page: str) -> BeautifulSoup:
+    with open(os.path.join(repo_name, page)) as fp:
+        return BeautifulSoup(fp, 'html.parser')
+
+
+def build_index(repo_name: str, save: bool = True) -> dict:
+    """
+    Scan every page and image of the workspace and save the index.
+
+    Must be called while holding the writer lock of the workspace, unless not
+    'save', in which case the index is only returned.
+    """
+    index = {'version': INDEX_VERSION, 'pages': {}, 'images': []}
+
+    for root, dirnames, filenames in os.walk(repo_name):
+
+        # git metadata isn't part of the site
+        dirnames[:] = [dirname for dirname in dirnames if dirname != '.git']
+
+        for filename in filenames:
+            file_path = os.path.relpath(os.path.join(root, filename), repo_name).replace(os.sep, '/')
+
+            if filename.endswith('.html'):
+                index['pages'][file_path] = page_references(read_page(repo_name, file_path), file_path)
+
+            elif filename.lower().endswith(IMAGE_EXTENSIONS):
+                index['images'].append(file_path)
+
+    if not save:
+        return index
+
+    save_index(repo_name, index)
+
+    # dimensions of unchanged images are kept from the previous build
+    build_image_index(repo_name, index['images'])
+
+    return index
+
+
+def save_index(repo_name: str, index: dict) -> None:
+    path = lock_path(repo_name, 'assets')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # written aside and moved in place, readers never see half an index
+    temp = lock_path(repo_name, f'assets.{os.getpid()}')
+    with open(temp, 'w') as fp:
+        json.dump(index, fp)
+    os.replace(temp, path)
+
+
+def load_index(repo_name: str, save: bool = True) -> dict:
+    """
+    Get the index of the workspace, building it if it's missing or outdated.
+
+    : args: repo_name: path of the workspace
+          : save: save an index built here, only with the writer lock of the workspace held
+    """
+    try:
+        with open(lock_path(repo_name, 'assets')) as fp:
+            index = json.load(fp)
+        if index.get('version') == INDEX_VERSION:
+            return index
+    except (OSError, ValueError):
+        pass
+
+    return build_index(repo_name, save)
+
+
+def update_index(repo_name: str, file_paths: list) -> None:
+    """
+    Refresh entries of changed pages and images (absolute paths) within the index.
+    """
+    index = load_index(repo_name)
+    images = set(index['images'])
+    changed_images = []
+
+    for file_path in file_paths:
+        relative = os.path.relpath(file_path, repo_name).replace(os.sep, '/')
+        exists = os.path.exists(file_path)
+
+        if relative.endswith('.html'):
+            if exists:
+                index['pages'][relative] = page_references(read_page(repo_name, relative), relative)
+            else:
+                index['pages'].pop(relative, None)
+
+        elif relative.lower().endswith(IMAGE_EXTENSIONS):
+            changed_images.append(relative)
+            if exists:
+                images.add(relative)
+            else:
+                images.discard(relative)
+
+    index['images'] = sorted(images)
+    save_index(repo_name, index)
+
+    if changed_images:
+        update_image_index(repo_name, changed_images)
+
+
+def references(index: dict) -> dict:
+    """
+    Reverse the index.
+
+    : returns: dict of image to list of (page, locator) referencing it
+    """
+    result = {image: [] for image in index['images']}
+
+    for page, page_images in index['pages'].items():
+        for image, locator in page_images:
+            if image is not None:
+                result.setdefault(image, []).append((page, locator))
+
+    return result
+
+
+def unreferenced_images(repo_name: str) -> list:
+    """
+    Get images of the workspace which no page uses, only the reader lock is needed.
+    """
+    index = load_index(repo_name, save=False)
+    used = references(index)
+
+    return sorted(image for image in index['images'] if not used[image])
+
+
+def replace_image(repo_name: str, old: str, new: str, dry_run: bool = False) -> dict:
+    """
+    Point every <img> referencing image 'old' to image 'new' instead.
+
+    Only pages referencing 'old' according to the index are parsed and each of
+    them is written once. Must be called while holding the writer lock of the
+    workspace unless 'dry_run'.
+
+    : args: repo_name: path of the workspace
+          : old, new: paths of the images relative to workspace
+          : dry_run: only count the tags, don't write anything
+
+    : returns: dict of changed page to number of replaced tags
+    """
+    pages = sorted({page for page, locator in references(load_index(repo_name, save=not dry_run)).get(old, [])})
+    changed = {}
+
+    for page in pages:
+        soup = read_page(repo_name, page)
+
+        count = 0
+        for img in soup.find_all('img', src=True):
+            if resolve_src(page, img['src']) == old:
+                img['src'] = relative_src(page, new, img['src'])
+                count += 1
+
+        if count:
+            changed[page] = count
+            if not dry_run:
+                with open(os.path.join(repo_name, page), 'w') as fp:
+                    fp.write(soup.prettify())
+
+    if changed and not dry_run:
+        update_index(repo_name, [os.path.join(repo_name, page) for page in changed])
+
+    return changed
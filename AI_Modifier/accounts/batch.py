@@ -0,0 +1,250 @@
+"""
+Batch edits across many client workspaces.
+
+An edit spec is a JSON file such as
+
+    {
+        "clients": ["https://client.example"],
+        "edits": [
+            {"pages": "*footer*.html", "match": "2023", "replace": "2024"},
+            {"pages": "**.html", "match": "Old Name Ltd", "replace": "New Name Ltd",
+             "style": {"color": "#1a1a1a"}},
+            {"restyle": [["color", "#333", "#1a1a1a"]]}
+        ]
+    }
+
+"clients" lists urls of client requests and is optional, all clients are
+edited without it. Every edit applies to pages whose path (relative to the
+workspace) matches the "pages" glob, all pages by default. Text edits replace
+"match" with "replace" within editable text, "regex": true treats "match" as a
+regular expression, and "style" sets declarations of the changed elements.
+"restyle" changes inline styles like the restyle command.
+"""
+import fnmatch
+import html as entities
+import json
+import os
+import re
+import time
+
+from bs4 import BeautifulSoup, NavigableString
+
+from .css import set_declarations
+from .extraction import editable_string, walk
+from .locks import repo_lock
+from .restyle import html_pages, restyle_html
+from .workspace import sync_workspace, workspace_path
+
+# Keys an edit may have
+EDIT_KEYS = {'pages', 'match', 'replace', 'regex', 'style', 'restyle'}
+
+
+def load_spec(path: str) -> dict:
+    """
+    Read and validate an edit spec.
+
+    : args: path: path of the JSON spec
+
+    : returns: spec with defaults filled in
+    : raises: ValueError if the spec is malformed
+    """
+    with open(path) as fp:
+        spec = json.load(fp)
+
+    if not isinstance(spec, dict) or not isinstance(spec.get('edits'), list) or not spec['edits']:
+        raise ValueError('spec must be an object with a non-empty list of "edits"')
+
+    clients = spec.get('clients')
+    if clients is not None and not (isinstance(clients, list) and all(isinstance(url, str) for url in clients)):
+        raise ValueError('"clients" must be a list of urls')
+
+    edits = []
+    for number, edit in enumerate(spec['edits'], 1):
+        if not isinstance(edit, dict):
+            raise ValueError(f'edit {number} must be an object')
+
+        unknown = set(edit) - EDIT_KEYS
+        if unknown:
+            raise ValueError(f'edit {number} has unknown keys: {", ".join(sorted(unknown))}')
+
+        if 'match' not in edit and 'restyle' not in edit:
+            raise ValueError(f'edit {number} needs "match" or "restyle"')
+
+        if 'match' in edit and ('replace' not in edit and 'style' not in edit):
+            raise ValueError(f'edit {number} needs "replace" or "style" for its "match"')
+
+        if edit.get('regex'):
+            try:
+                re.compile(edit['match'])
+            except re.error as e:
+                raise ValueError(f'edit {number} has invalid regex: {e}')
+
+        if not isinstance(edit.get('style', {}), dict):
+            raise ValueError(f'edit {number}: "style" must be an object of declarations')
+
+        restyle = edit.get('restyle', [])
+        if not all(isinstance(change, list) and len(change) == 3 for change in restyle):
+            raise ValueError(f'edit {number}: "restyle" must be a list of [property, from, to]')
+
+        edits.append({'pages': edit.get('pages', '*'),
+                      'match': edit.get('match'),
+                      'replace': edit.get('replace'),
+                      'regex': bool(edit.get('regex')),
+                      'style': {name.strip().lower(): value for name, value in edit.get('style', {}).items()},
+                      'restyle': [tuple(change) for change in restyle]})
+
+    return {'clients': clients, 'edits': edits}
+
+
+def replace_text(string: str, edit: dict) -> tuple:
+    """
+    Replace 'match' of 'edit' within 'string'.
+
+    : returns: tuple of new string and number of replacements
+    """
+    if edit['regex']:
+        return re.subn(edit['match'], edit['replace'] if edit['replace'] is not None else r'\g<0>', string)
+
+    count = string.count(edit['match'])
+    if count and edit['replace'] is not None:
+        string = string.replace(edit['match'], edit['replace'])
+
+    return string, count
+
+
+def apply_edits(html: str, edits: list) -> tuple:
+    """
+    Apply 'edits' to an html page.
+
+    : args: html: content of the page
+          : edits: edits of a spec which apply to this page
+
+    : returns: tuple of soup (None if nothing changed) and number of changes
+    """
+    text_edits = [edit for edit in edits if edit['match'] is not None]
+    changes = [change for edit in edits for change in edit['restyle']]
+
+    # pages not containing any plain match can't change, regexes and restyles are left to the parser;
+    # sources write text such as '©' and '&' as entities, the parser resolves them
+    text = entities.unescape(html)
+    if not changes and not any(edit['regex'] or edit['match'] in text for edit in text_edits):
+        return None, 0
+
+    soup = BeautifulSoup(html, 'html.parser')
+    count = 0
+
+    for tag, path in walk(soup):
+
+        # only the tag holding the text itself, wrappers around it share its string
+        if len(tag.contents) != 1 or not isinstance(tag.contents[0], NavigableString):
+            continue
+
+        string = editable_string(tag)
+        if string is None:
+            continue
+
+        new_string = string
+        for edit in text_edits:
+            new_string, replaced = replace_text(new_string, edit)
+            if replaced:
+                count += replaced
+                if edit['style']:
+                    tag['style'] = set_declarations(tag.get('style'), edit['style'])
+
+        if new_string != string:
+            tag.string = new_string
+
+    if changes:
+        restyled, replaced = restyle_html(str(soup), changes)
+        if restyled is not None:
+            soup = restyled
+            count += replaced
+
+    return (soup if count else None), count
+
+
+def edit_workspace(repo_name: str, edits: list, dry_run: bool = False) -> dict:
+    """
+    Apply 'edits' to every matching page of the workspace, writing each page at most once.
+
+    : args: repo_name: path of the workspace
+          : edits: edits of a spec
+          : dry_run: only count changes, don't write anything
+
+    : returns: dict of changed page (relative to workspace) to number of changes
+    """
+    counts = {}
+
+    # editors can't change the workspace while it is being edited
+    with repo_lock(repo_name):
+        for page in html_pages(repo_name):
+            relpath = os.path.relpath(page, repo_name)
+            page_edits = [edit for edit in edits if fnmatch.fnmatch(relpath, edit['pages'])]
+            if not page_edits:
+                continue
+
+            with open(page) as fp:
+                soup, count = apply_edits(fp.read(), page_edits)
+
+            if soup is None:
+                continue
+
+            if not dry_run:
+                with open(page, "w") as fp:
+                    fp.write(soup.prettify())
+
+            counts[relpath] = count
+
+    return counts
+
+
+def edit_client(pk: int, edits: list, dry_run: bool = False, push: bool = False) -> dict:
+    """
+    Sync workspace of client request 'pk', apply 'edits' and record a ChangeRequest.
+
+    Workspaces with local edits or pending ChangeRequests aren't synced, a
+    sync would discard the edits; they are edited as they are.
+
+    : returns: report of the client, a JSON serializable dict
+    """
+    from .eviction import local_changes
+    from .models import ChangeRequest, ClientRequest
+    from .push import push_change_requests
+
+    started = time.monotonic()
+    client_request = ClientRequest.objects.get(pk=pk)
+    path = workspace_path(client_request)
+    report = {'url': client_request.url, 'status': '', 'pages': {}, 'changes': 0,
+              'change_request': None, 'pushed': None, 'error': ''}
+
+    try:
+        pending = client_request.change_request.filter(success=False).exists()
+        if pending or (os.path.isdir(path) and local_changes(path)):
+            report['status'] = 'kept'
+        else:
+            # tables are extracted when an editor opens the client, not for every batch
+            sync_workspace(client_request, extract=False)
+            report['status'] = 'synced'
+
+        report['pages'] = edit_workspace(path, edits, dry_run)
+        report['changes'] = sum(report['pages'].values())
+
+        if report['pages'] and not dry_run:
+            change_request = ChangeRequest.objects.create(client_request=client_request, repo=path,
+                                                          files=sorted(report['pages']))
+            report['change_request'] = change_request.pk
+
+            if push:
+                push_change_requests(ChangeRequest.objects.filter(pk=change_request.pk))
+                change_request.refresh_from_db()
+                report['pushed'] = change_request.success
+                if not change_request.success:
+                    report['error'] = change_request.error
+
+    except Exception as e:
+        report['status'] = 'failed'
+        report['error'] = str(e)
+
+    report['seconds'] = round(time.monotonic() - started, 3)
+
+    return report
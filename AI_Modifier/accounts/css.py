@@ -0,0 +1,158 @@
+"""
+Inline CSS (style attribute) helpers.
+
+Declarations are kept as (name, value, important) tuples in their original
+order. Splitting respects quotes, parentheses and comments, so values such as
+url(data:image/png;base64,...) or font-family: "a;b" survive a round trip.
+"""
+import re
+
+# Colours written differently but meaning the same, e.g. #333 and #333333
+SHORT_HEX = re.compile(r'^#([0-9a-f])([0-9a-f])([0-9a-f])([0-9a-f])?$')
+
+
+def split_declarations(style: str) -> list:
+    """
+    Split style attribute at ';' outside of quotes, parentheses and comments.
+    """
+    parts = []
+    current = []
+    quote = None
+    depth = 0
+    i = 0
+    style = style or ''
+
+    while i < len(style):
+        char = style[i]
+
+        # drop comments
+        if quote is None and style.startswith('/*', i):
+            end = style.find('*/', i + 2)
+            i = len(style) if end == -1 else end + 2
+            continue
+
+        if quote:
+            if char == '\\':
+                current.append(style[i:i + 2])
+                i += 2
+                continue
+            if char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')' and depth:
+            depth -= 1
+        elif char == ';' and depth == 0:
+            parts.append(''.join(current))
+            current = []
+            i += 1
+            continue
+
+        current.append(char)
+        i += 1
+
+    parts.append(''.join(current))
+
+    return parts
+
+
+def parse_declarations(style: str) -> list:
+    """
+    Parse style attribute into a list of (name, value, important) declarations.
+
+    : args: style: value of style attribute, e.g. "color:#333; font-size:14px !important"
+
+    : returns: declarations in order, names in lower case
+    """
+    declarations = []
+
+    for declaration in split_declarations(style):
+        name, colon, value = declaration.partition(':')
+        name = name.strip().lower()
+        value = value.strip()
+        if not colon or not name:
+            continue
+
+        important = value.lower().endswith('!important')
+        if important:
+            value = value[:-len('!important')].rstrip()
+
+        declarations.append((name, value, important))
+
+    return declarations
+
+
+def serialize_declarations(declarations: list) -> str:
+    """
+    Build style attribute from (name, value, important) declarations.
+    """
+    return ''.join(f"{name}:{value}{' !important' if important else ''};" for name, value, important in declarations)
+
+
+def parse_style(style: str) -> dict:
+    """
+    Parse declarations of a style attribute.
+
+    : args: style: value of style attribute, e.g. "color:#333; font-size:14px"
+
+    : returns: dict of property (lower case) to value, later declarations win
+    """
+    return {name: value for name, value, important in parse_declarations(style)}
+
+
+def set_declarations(style: str, changes: dict) -> str:
+    """
+    Set values of properties within style attribute, adding missing ones at the end.
+
+    : args: style: value of style attribute
+          : changes: dict of property to new value
+
+    : returns: new value of style attribute
+    """
+    declarations = []
+    missing = dict(changes)
+
+    for name, value, important in parse_declarations(style):
+        if name in changes:
+            value = changes[name]
+            missing.pop(name, None)
+        declarations.append((name, value, important))
+
+    declarations.extend((name, value, False) for name, value in missing.items())
+
+    return serialize_declarations(declarations)
+
+
+def normalize_value(value: str) -> str:
+    """
+    Normalize value for comparison: case, whitespace and short hex colours.
+    """
+    value = ' '.join(value.lower().split())
+
+    match = SHORT_HEX.match(value)
+    if match:
+        value = '#' + ''.join(digit * 2 for digit in match.groups() if digit)
+
+    return value
+
+
+def replace_value(style: str, name: str, old: str, new: str) -> tuple:
+    """
+    Replace value 'old' of property 'name' with 'new' within style attribute.
+
+    : returns: tuple of new style attribute and number of replaced declarations
+    """
+    name = name.strip().lower()
+    old = normalize_value(old)
+    declarations = []
+    count = 0
+
+    for declaration in parse_declarations(style):
+        if declaration[0] == name and normalize_value(declaration[1]) == old:
+            declaration = (name, new, declaration[2])
+            count += 1
+        declarations.append(declaration)
+
+    return (serialize_declarations(declarations) if count else style), count
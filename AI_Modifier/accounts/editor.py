@@ -0,0 +1,35 @@
+"""
+Facade of the page editor.
+
+Views use the editor through this module, e.g. editor.text_table(path). Its
+names are imported from the modules below the first time they're used, so
+importing the views doesn't load git, bs4 or PIL.
+"""
+from .lazy import lazy_exports
+
+EXPORTS = {
+    'git': 'git',
+    'BeautifulSoup': 'bs4',
+    'Image': 'PIL.Image',
+    'build_index': 'accounts.assets',
+    'load_index': 'accounts.assets',
+    'references': 'accounts.assets',
+    'replace_image': 'accounts.assets',
+    'resolve_src': 'accounts.assets',
+    'update_index': 'accounts.assets',
+    'LocatorConflict': 'accounts.extraction',
+    'find_by_locator': 'accounts.extraction',
+    'image_metadata': 'accounts.image_meta',
+    'scaled_size': 'accounts.image_meta',
+    'with_metadata': 'accounts.image_meta',
+    'restyle_workspace': 'accounts.restyle',
+    'image_table': 'accounts.table_cache',
+    'text_table': 'accounts.table_cache',
+    'sync_workspace': 'accounts.workspace',
+}
+
+__getattr__ = lazy_exports(globals(), EXPORTS)
+
+
+def __dir__():
+    return sorted(list(globals()) + list(EXPORTS))
@@ -0,0 +1,202 @@
+"""
+Disk budget of workspaces.
+
+Every use of a workspace is recorded next to its lock. When the workspaces
+under REPO_DIR use more than the budget, the least recently used clean ones
+are removed; they are synced again the next time they are opened. Workspaces
+with local changes, unpushed commits or pending ChangeRequests are never
+removed. A shared mirror is removed along with the last worktree using it.
+"""
+import os
+import shutil
+from typing import NamedTuple
+
+from django.conf import settings
+
+from .lazy import lazy_import
+from .locks import lock_path, remove_lock_files, repo_lock
+from .workspace import commits_ahead, workspace_path, workspace_paths
+
+git = lazy_import('git')
+
+# Default budget of REPO_DIR in bytes, overridden by settings.WORKSPACE_DISK_BUDGET
+DISK_BUDGET = 5 * 1024 ** 3
+
+
+class Workspace(NamedTuple):
+    """
+    Disk usage of a workspace.
+    """
+    path: str
+    size: int
+    accessed: float
+    pinned: str
+
+
+def disk_budget() -> int:
+    return getattr(settings, 'WORKSPACE_DISK_BUDGET', DISK_BUDGET)
+
+
+def touch_workspace(path: str) -> None:
+    """
+    Record that workspace at 'path' has been used.
+    """
+    stamp = lock_path(path, 'access')
+    os.makedirs(os.path.dirname(stamp), exist_ok=True)
+
+    with open(stamp, 'a'):
+        os.utime(stamp)
+
+
+def last_access(path: str) -> float:
+    """
+    Get time the workspace was last used, falling back to its modification time.
+    """
+    try:
+        return os.path.getmtime(lock_path(path, 'access'))
+    except OSError:
+        return os.path.getmtime(path)
+
+
+def disk_usage(path: str) -> int:
+    """
+    Get size of all files within 'path' in bytes, symlinks aren't followed.
+    """
+    size = 0
+    for root, dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                size += os.lstat(os.path.join(root, filename)).st_size
+            except OSError:
+                pass
+
+    return size
+
+
+def local_changes(path: str) -> str:
+    """
+    Describe changes of the workspace which would be lost by removing it, empty if there are none.
+    """
+    if os.path.exists(os.path.join(path, '.git')):
+        repo = git.Repo(path)
+        if repo.is_dirty(untracked_files=True):
+            return 'uncommitted changes'
+        if commits_ahead(repo):
+            return 'unpushed commits'
+        return ''
+
+    # FTP workspaces have no history, anything written after the last sync is a local change
+    try:
+        synced = os.path.getmtime(lock_path(path, 'generation'))
+    except OSError:
+        return ''
+
+    for root, dirnames, filenames in os.walk(path):
+        if any(os.path.getmtime(os.path.join(root, filename)) > synced for filename in filenames):
+            return 'changed since sync'
+
+    return ''
+
+
+def pending_workspaces() -> set:
+    """
+    Get paths of workspaces with ChangeRequests which aren't pushed yet.
+    """
+    from .models import ClientRequest
+
+    client_requests = ClientRequest.objects.filter(change_request__success=False).distinct()
+
+    return {workspace_path(client_request) for client_request in client_requests}
+
+
+def list_workspaces() -> list:
+    """
+    Get usage of all workspaces within REPO_DIR, least recently used first.
+    """
+    pending = pending_workspaces()
+    workspaces = []
+
+    for path in workspace_paths():
+        pinned = 'pending change requests' if path in pending else local_changes(path)
+        workspaces.append(Workspace(path, disk_usage(path), last_access(path), pinned))
+
+    return sorted(workspaces, key=lambda workspace: workspace.accessed)
+
+
+def remove_workspace(path: str) -> None:
+    """
+    Delete workspace at 'path', must be called while holding its writer lock.
+    """
+    if os.path.exists(os.path.join(path, '.git')):
+
+        # worktree is unregistered from the shared mirror along with its files
+        mirror = git.Repo(git.Repo(path).common_dir)
+        with repo_lock(mirror.git_dir):
+            mirror.git.worktree('remove', '--force', path)
+            remove_unused_mirror(mirror)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+
+    # lock, indexes, listing and sync generation of the workspace are created again by the next sync
+    remove_lock_files(path)
+
+
+def remove_unused_mirror(mirror: 'git.Repo') -> bool:
+    """
+    Delete shared mirror once no worktree uses it, must be called while holding its writer lock.
+
+    : returns: True if the mirror was deleted
+    """
+    # worktrees deleted behind git's back don't keep the mirror
+    mirror.git.worktree('prune')
+    if any(line.startswith('worktree ') for line in mirror.git.worktree('list', '--porcelain').splitlines()[1:]):
+        return False
+
+    # the next workspace using the upstream clones it again
+    path = mirror.git_dir
+    mirror.close()
+    shutil.rmtree(path)
+    remove_lock_files(path)
+
+    return True
+
+
+def evict_workspaces(budget: int = None, dry_run: bool = False) -> list:
+    """
+    Remove least recently used clean workspaces until REPO_DIR fits into 'budget'.
+
+    Workspaces being used by somebody else right now are skipped.
+
+    : args: budget: bytes, defaults to disk_budget()
+          : dry_run: only report which workspaces would be removed
+
+    : returns: list of removed Workspace
+    """
+    budget = disk_budget() if budget is None else budget
+    workspaces = list_workspaces()
+    used = sum(workspace.size for workspace in workspaces)
+    evicted = []
+
+    for workspace in workspaces:
+        if used <= budget:
+            break
+        if workspace.pinned:
+            continue
+
+        if not dry_run:
+            try:
+                with repo_lock(workspace.path, blocking=False):
+
+                    # workspace may have been edited since it was listed
+                    if workspace.path in pending_workspaces() or local_changes(workspace.path):
+                        continue
+                    remove_workspace(workspace.path)
+
+            except BlockingIOError:
+                continue
+
+        used -= workspace.size
+        evicted.append(workspace)
+
+    return evicted
@@ -0,0 +1,169 @@
+"""
+Zip export of a client workspace.
+
+The archive is generated while it is sent: every file is read in chunks and
+each chunk is handed to the response as soon as zipfile has written it, so
+memory stays constant and nothing is written to disk. Stored (uncompressed)
+archives have a size known before the first byte, deflated ones are sent
+with chunked transfer encoding.
+"""
+import os
+import zipfile
+
+from .lazy import lazy_import
+from .locks import lock_path, repo_lock
+
+git = lazy_import('git')
+
+# Bytes read from a file at once
+CHUNK_SIZE = 64 * 1024
+
+# Sizes of zip records without their file names (no zip64 extra fields)
+LOCAL_HEADER_SIZE = 30
+DATA_DESCRIPTOR_SIZE = 16
+CENTRAL_HEADER_SIZE = 46
+END_RECORD_SIZE = 22
+
+# Beyond these, zip64 records of varying size are needed
+ZIP_MAX_ENTRIES = 0xFFFF
+ZIP_MAX_SIZE = 0xFFFFFFFF
+
+
+class ZipStream:
+    """
+    Write-only, unseekable file collecting what zipfile writes until it is taken.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def exportable(path: str, file: str) -> bool:
+    """
+    Check if 'file' (relative to workspace 'path') is a regular file within the workspace.
+
+    Client repos may commit symlinks, which must not export files of the server.
+    """
+    file_path = os.path.join(path, file)
+    if os.path.islink(file_path) or not os.path.isfile(file_path):
+        return False
+
+    workspace = os.path.realpath(path)
+    return os.path.commonpath([workspace, os.path.realpath(file_path)]) == workspace
+
+
+def workspace_files(path: str) -> list:
+    """
+    Get all files of the workspace (relative paths), git metadata and symlinks excluded.
+    """
+    files = []
+    for root, dirnames, filenames in os.walk(path):
+        dirnames[:] = sorted(dirname for dirname in dirnames if dirname != '.git')
+        files.extend(os.path.relpath(os.path.join(root, filename), path) for filename in sorted(filenames))
+
+    return [file for file in files if exportable(path, file)]
+
+
+def changed_files(path: str) -> list:
+    """
+    Get files of the workspace (relative paths) changed since it was synced.
+
+    Git workspaces list uncommitted, untracked and unpushed files, FTP
+    workspaces list files written after the last sync.
+    """
+    if os.path.exists(os.path.join(path, '.git')):
+        repo = git.Repo(path)
+        files = set(repo.git.diff('--name-only', 'HEAD').splitlines())
+        files.update(repo.untracked_files)
+        try:
+            files.update(repo.git.diff('--name-only', '@{u}', 'HEAD').splitlines())
+        except git.GitCommandError:
+            pass
+    else:
+        try:
+            synced = os.path.getmtime(lock_path(path, 'generation'))
+        except OSError:
+            synced = 0
+        files = {file for file in workspace_files(path) if os.path.getmtime(os.path.join(path, file)) > synced}
+
+    # deleted files and symlinks can't be exported
+    return sorted(file for file in files if exportable(path, file))
+
+
+def export_sizes(path: str, changed_only: bool = False) -> dict:
+    """
+    Get files to export (relative to 'path') with their sizes, in archive order.
+
+    : args: path: path of the workspace
+          : changed_only: only files changed since the workspace was synced
+    """
+    with repo_lock(path, shared=True):
+        files = changed_files(path) if changed_only else workspace_files(path)
+        return {file: os.path.getsize(os.path.join(path, file)) for file in files}
+
+
+def archive_size(sizes: dict) -> int:
+    """
+    Get exact size of the stored (uncompressed) archive of files of 'sizes', None if it needs zip64.
+    """
+    size = END_RECORD_SIZE
+    for file, file_size in sizes.items():
+        name = len(file.replace(os.sep, '/').encode('utf-8'))
+        size += LOCAL_HEADER_SIZE + DATA_DESCRIPTOR_SIZE + CENTRAL_HEADER_SIZE + 2 * name + file_size
+
+    if len(sizes) > ZIP_MAX_ENTRIES or size > ZIP_MAX_SIZE:
+        return None
+
+    return size
+
+
+def stream_zip(path: str, sizes: dict, compress: bool = False):
+    """
+    Yield a zip archive of files of 'sizes' (relative to 'path') chunk by chunk.
+
+    The reader lock of the workspace is held until the last chunk is sent, so
+    editors can't change files halfway through the download. A file edited
+    between listing and sending fails the download instead of sending an
+    archive which doesn't match its announced length.
+    """
+    stream = ZipStream()
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+
+    with repo_lock(path, shared=True):
+        with zipfile.ZipFile(stream, 'w', compression, strict_timestamps=False) as archive:
+            for file, size in sizes.items():
+                file_path = os.path.join(path, file)
+
+                # checked again, a file may have been replaced by a symlink since it was listed
+                if not exportable(path, file):
+                    raise RuntimeError(f'{file} changed during export')
+
+                info = zipfile.ZipInfo.from_file(file_path, file, strict_timestamps=False)
+                info.compress_type = compression
+
+                if info.file_size != size:
+                    raise RuntimeError(f'{file} changed during export')
+
+                with open(file_path, 'rb') as source, archive.open(info, 'w') as target:
+                    for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                        target.write(chunk)
+                        data = stream.take()
+                        if data:
+                            yield data
+
+                yield stream.take()
+
+        # central directory is written when the archive is closed
+        yield stream.take()
@@ -0,0 +1,260 @@
+"""
+Extraction of editable content from html pages.
+
+Every extracted element carries a locator: the path of tag positions from
+the document root plus a fingerprint of the element's text with whitespace
+normalised. Locators survive edits elsewhere on the page and re-formatting
+by prettify, and are resolved by walking the path instead of listing every
+element again.
+"""
+import hashlib
+import os
+import posixpath
+from typing import NamedTuple
+
+from bs4 import BeautifulSoup, Tag
+from bs4.element import NavigableString, PreformattedString
+
+from .css import parse_style
+
+# Bumped whenever extracted tables change, cached tables of older versions are ignored
+EXTRACTION_VERSION = 3
+
+# Tags whose text isn't visible content
+SKIPPED_TAGS = {'style', 'script', 'head', 'meta', '[document]'}
+
+
+class TextElement(NamedTuple):
+    """
+    Editable text of a page.
+    """
+    tag: str
+    text: str
+    size: str
+    color: str
+    locator: str
+
+
+class ImageElement(NamedTuple):
+    """
+    Image of a page with the images it can be replaced with.
+    """
+    name: str
+    src: str
+    available_images: list
+    index: int
+    locator: str
+    # header metadata of the current image (ImageMeta), attached by the view
+    meta: tuple = None
+
+
+class LocatorConflict(Exception):
+    """
+    Element referred to by a locator isn't on the page anymore.
+    """
+
+
+def fingerprint(tag: Tag) -> str:
+    """
+    Short hash of tag's name and content (its normalised text, or source of images).
+    """
+    return content_fingerprint(tag.name, normalised_text(tag), tag.attrs)
+
+
+def normalised_text(tag: Tag) -> str:
+    """
+    Get all text within 'tag', every string stripped, so that re-formatting (e.g. by prettify) doesn't change it.
+
+    Comments, doctypes and other preformatted strings aren't text.
+    """
+    return ''.join(string.strip() for string in tag.descendants
+                   if isinstance(string, NavigableString) and not isinstance(string, PreformattedString))
+
+
+def content_fingerprint(name: str, text: str, attrs: dict) -> str:
+    """
+    Fingerprint of a tag given its name, normalised text and attributes.
+
+    Same as sha1 of name, a NUL and the text, which lets streaming extraction hash text as it arrives.
+    """
+    content = text or attrs.get('src', '').strip()
+    return hashlib.sha1(f'{name}\0{content}'.encode()).hexdigest()[:12]
+
+
+def walk(soup: BeautifulSoup):
+    """
+    Yield all tags of 'soup' in document order along with their locator path.
+
+    Path is the position of the tag among its parent's child tags, for every
+    level from the root, e.g. '1.0.3'.
+    """
+    stack = [(soup, '')]
+
+    while stack:
+        tag, path = stack.pop()
+
+        children = [child for child in tag.children if isinstance(child, Tag)]
+        prefix = f'{path}.' if path else ''
+
+        # pushed in reverse so that first child is visited first
+        for position in range(len(children) - 1, -1, -1):
+            stack.append((children[position], f'{prefix}{position}'))
+
+        if tag is not soup:
+            yield tag, path
+
+
+def find_by_locator(soup: BeautifulSoup, locator: str) -> Tag:
+    """
+    Find element referred to by 'locator' within 'soup'.
+
+    : args: soup: BeautifulSoup object loaded with html file, parsed using html parser
+          : locator: locator of an extracted element
+
+    : raises: LocatorConflict if the page changed and the element isn't there anymore
+    """
+    path, _, expected = locator.rpartition(':')
+
+    tag = soup
+    for position in path.split('.'):
+        children = (child for child in tag.children if isinstance(child, Tag))
+        tag = next((child for index, child in enumerate(children) if index == int(position)), None)
+
+        if tag is None:
+            raise LocatorConflict(f'Element at {path} no longer exists, the page has changed.')
+
+    if fingerprint(tag) != expected:
+        raise LocatorConflict(f'Element <{tag.name}> at {path} has changed, the page has changed.')
+
+    return tag
+
+
+def editable_string(tag: Tag):
+    """
+    Get the string of 'tag' if it is editable text, i.e. a visible tag holding
+    a single string without template variables such as {{ some variable }}.
+
+    : returns: the string, or None if the tag isn't editable
+    """
+    return editable_text(tag.name, tag.string, tag.attrs)
+
+
+def editable_text(name: str, string, attrs: dict):
+    """
+    Same as editable_string, given tag's name, string (None if it has none) and attributes.
+    """
+    if name in SKIPPED_TAGS or string is None or attrs.get('tag', ''):
+        return None
+
+    string = str(string)
+    if "{{" in string and "}}" in string:
+        return None
+
+    return string
+
+
+def text_element(name: str, string: str, attrs: dict, locator: str) -> TextElement:
+    """
+    Build TextElement of an editable tag.
+    """
+
+    # style is read from element's own attribute, never from its serialised subtree
+    style = parse_style(attrs.get('style'))
+
+    # font-size is shown in px only
+    size = style.get('font-size', '')
+    size = size[:-len('px')].strip() if size.endswith('px') else ''
+
+    return TextElement(name, string.strip(), size, style.get('color', ''), locator)
+
+
+def get_all_web_elements(soup: BeautifulSoup) -> list:
+    """
+    Find all static text and their style property if exists.
+
+    : args: soup: BeautifulSoup object loaded with html file, parsed using html parser
+
+    : returns: list of TextElement found in soup.
+    """
+
+    # Initialize results
+    response_Table = []
+
+    for x, path in walk(soup):
+
+        # only tags holding a single, static string are editable
+        soup_string = editable_string(x)
+        if soup_string is None:
+            continue
+
+        response_Table.append(text_element(x.name, soup_string, x.attrs, f'{path}:{fingerprint(x)}'))
+
+    return response_Table
+
+
+def sibling_images(image: str, img_list: list) -> list:
+    """
+    Get names of all images within the directory of 'image'.
+
+    Siblings come from 'img_list' rather than the disk, so images of lazy FTP
+    workspaces which weren't downloaded yet are offered too, and tables
+    cached by img_list only depend on it.
+
+    : args: image: image path relative to REPO_DIR
+          : img_list: list of all images within the repo.
+    """
+    folder = posixpath.dirname(image)
+    return [posixpath.basename(other) for other in img_list if posixpath.dirname(other) == folder]
+
+
+def image_elements(attrs: dict, idx: int, locator: str, img_list: list) -> list:
+    """
+    Build ImageElements of an img tag, one for every image of 'img_list' its source points to.
+
+    : args: attrs: attributes of the img tag
+          : idx: position of the img tag among all img tags of the page
+          : locator: locator of the img tag
+          : img_list: list of all images within the repo.
+    """
+    elements = []
+
+    # get image path from img_list
+    for img_list_element in img_list:
+
+        # check if img_list_element ends with 'image source'
+        if img_list_element.endswith(attrs['src']):
+
+            # found image location and adding 'tag', 'current image source',
+            # 'all other images in that directory' and locator of img soup element.
+            elements.append(ImageElement(img_list_element.split('/')[-1].split('.')[0],
+                                         os.path.join('All_Repo', img_list_element),
+                                         sibling_images(img_list_element, img_list),
+                                         idx,
+                                         locator))
+
+    return elements
+
+
+def get_all_images(soup: BeautifulSoup, img_list: list) -> list:
+    """
+    Get all images from 'soup' object and find all other images at the same level
+
+    :args: soup: BeautifulSoup object loaded with html file, parsed using html parser
+         : img_list: list of all images within the repo.
+
+    : returns: list of ImageElement found in soup
+    """
+
+    # Initialize results
+    response_table = []
+
+    # find all 'img' Tags and index them
+    images = ((img, path) for img, path in walk(soup) if img.name == 'img')
+    for idx, (img, path) in enumerate(images):
+        try:
+            response_table.extend(image_elements(img.attrs, idx, f'{path}:{fingerprint(img)}', img_list))
+        except Exception as e:
+            print(e)
+
+    # return response table
+    return response_table
@@ -0,0 +1,206 @@
+"""
+Remote-lazy editing of FTP sites.
+
+Mirroring a whole FTP site before the first page can be opened takes long on
+large sites, though an editing session only touches a few pages. In lazy mode
+the remote tree is listed once instead, the listing is kept next to the
+workspace's lock for LISTING_TTL seconds and the page list is built from it.
+A page is downloaded (along with the images it references) the first time
+the editor opens it, so the workspace only holds what was opened. Pushes
+upload the changed files recorded on change requests, as for mirrored sites.
+
+Paths within the listing are relative to the workspace.
+"""
+import json
+import os
+import shutil
+import time
+
+from django.conf import settings
+
+from .ftp_transfer import SYNCED_EXTENSIONS, download_file, with_session
+from .lazy import lazy_import
+from .locks import lock_path, repo_lock
+from .workspace import REPO_DIR, is_ftp, list_workspace
+
+ftplib = lazy_import('ftplib')
+
+# Seconds a listing of the remote tree is used before the server is listed again
+LISTING_TTL = 600
+
+
+def lazy_mode(client_request) -> bool:
+    """
+    Check if client request's site is edited without mirroring it first.
+    """
+    return is_ftp(client_request) and getattr(settings, 'FTP_LAZY_SYNC', False)
+
+
+def listing_ttl() -> int:
+    return getattr(settings, 'FTP_LISTING_TTL', LISTING_TTL)
+
+
+def list_remote(ftp, prefix: str = '') -> list:
+    """
+    List synced files of the current remote directory and below.
+
+    : returns: list of paths relative to the directory listed first
+    """
+    files = []
+
+    for name in ftp.nlst():
+        if name in ('.', '..'):
+            continue
+
+        # same as download_files, a name is a folder if the server lets us change into it
+        try:
+            ftp.cwd(name)
+        except ftplib.error_perm:
+            if name.endswith(SYNCED_EXTENSIONS):
+                files.append(f'{prefix}{name}')
+            continue
+
+        files.extend(list_remote(ftp, f'{prefix}{name}/'))
+        ftp.cwd('..')
+
+    return files
+
+
+def read_listing(path: str) -> dict:
+    """
+    Get the saved listing of workspace 'path', None if there is none.
+    """
+    try:
+        with open(lock_path(path, 'listing')) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def save_listing(path: str, files: list) -> None:
+    temp = lock_path(path, f'listing.{os.getpid()}')
+    os.makedirs(os.path.dirname(temp), exist_ok=True)
+
+    # written aside and moved in place, readers never see half a listing
+    with open(temp, 'w') as fp:
+        json.dump({'listed': time.time(), 'files': files}, fp)
+    os.replace(temp, lock_path(path, 'listing'))
+
+
+def remote_listing(client_request, path: str, refresh: bool = False) -> list:
+    """
+    Get synced files of client request's FTP site, listing the server only if the saved listing expired.
+
+    : args: client_request: ClientRequest object
+          : path: path of the workspace
+          : refresh: list the server even if the saved listing is recent
+
+    : returns: sorted list of paths relative to the workspace
+    """
+    listing = read_listing(path)
+    if not refresh and listing is not None and time.time() - listing['listed'] < listing_ttl():
+        return listing['files']
+
+    def list_site(ftp):
+        ftp.cwd(client_request.branch)
+        return list_remote(ftp)
+
+    # connection to the client's host is reused from earlier syncs and pushes
+    files = sorted(with_session(client_request, list_site))
+    save_listing(path, files)
+
+    return files
+
+
+def sync_lazy(client_request, path: str) -> None:
+    """
+    Start workspace at 'path' empty, with the remote tree listed.
+
+    Like a full sync, local changes are discarded; pages are downloaded again when opened.
+    """
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+
+    # a sync always sees what's on the server now
+    remote_listing(client_request, path, refresh=True)
+
+
+def lazy_listing(client_request, path: str) -> tuple:
+    """
+    Same as list_workspace, with pages and images of the remote listing which weren't downloaded yet.
+
+    : returns: tuple of Html_List ([filename, path relative to REPO_DIR]) and img_list (paths relative to REPO_DIR)
+    """
+    Html_List, img_list = list_workspace(path) if os.path.isdir(path) else ([], [])
+
+    pages = {page: filename for filename, page in Html_List}
+    images = set(img_list)
+
+    for file in remote_listing(client_request, path):
+        relative = os.path.relpath(os.path.join(path, file), REPO_DIR)
+        if file.endswith('.html'):
+            pages.setdefault(relative, os.path.basename(file))
+        else:
+            images.add(relative)
+
+    return [[filename, page] for page, filename in sorted(pages.items())], sorted(images)
+
+
+def fetch_page(client_request, path: str, page: str) -> list:
+    """
+    Download 'page' (relative to workspace) and the images it references, unless already downloaded.
+
+    Takes the writer lock of the workspace, callers holding its reader lock call it before taking that.
+
+    : returns: list of files downloaded (relative to workspace)
+    """
+    # imported here, the assets index needs bs4
+    from .assets import page_references, read_page, update_index
+
+    with repo_lock(path):
+        if os.path.exists(os.path.join(path, page)):
+            return []
+
+        listing = set(remote_listing(client_request, path))
+        if page not in listing:
+            return []
+
+        fetched = []
+
+        def fetch(ftp, file):
+            local = os.path.join(path, file)
+            os.makedirs(os.path.dirname(local), exist_ok=True)
+            download_file(ftp, file, local)
+            fetched.append(file)
+
+        def download(ftp):
+            ftp.cwd(client_request.branch)
+
+            # SIZE is only reliable in binary mode
+            ftp.voidcmd('TYPE I')
+
+            # a retry skips files downloaded by an earlier attempt, images
+            # downloaded (and maybe changed) with another page are kept
+            if page not in fetched:
+                fetch(ftp, page)
+            images = sorted({image for image, locator in page_references(read_page(path, page), page)
+                             if image in listing and not os.path.exists(os.path.join(path, image))})
+            for image in images:
+                fetch(ftp, image)
+
+        with_session(client_request, download)
+
+        # downloaded files are as on the server, so they date from the sync; a later
+        # mtime would be taken for a local change by eviction and changed-file exports
+        try:
+            synced = os.path.getmtime(lock_path(path, 'generation'))
+        except OSError:
+            synced = None
+        if synced is not None:
+            for file in fetched:
+                os.utime(os.path.join(path, file), (synced, synced))
+
+        update_index(path, [os.path.join(path, file) for file in fetched])
+
+    return fetched
@@ -0,0 +1,224 @@
+"""
+Pool of logged in FTP sessions shared by syncs and pushes of this process.
+
+Connecting and logging in to a far away client host can take seconds, so
+sessions are kept open after use, keyed by (host, port, user). Idle sessions
+are kept alive with NOOP and closed once idle for too long. A session is
+checked by changing back to its home directory before it is handed out
+again, which also undoes any cwd of its previous user. Sessions per server
+are bounded; callers wait for one to be released when the bound is reached.
+"""
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+from .lazy import lazy_import
+
+ftplib = lazy_import('ftplib')
+
+# Idle sessions are closed after this many seconds
+MAX_IDLE = 300
+
+# Idle sessions are sent NOOP this often (seconds), so that servers don't drop them
+KEEPALIVE_INTERVAL = 60
+
+# Open sessions per server (host, port), idle or in use
+MAX_PER_HOST = 4
+
+# Seconds to wait for the server on connect and every command
+TIMEOUT = 60
+
+_idle = []
+_open = {}
+_condition = threading.Condition()
+_keeper = None
+
+
+class Session:
+    """
+    Logged in FTP connection along with what the pool knows about it.
+    """
+
+    def __init__(self, key: tuple, secret: str, ftp) -> None:
+        self.key = key
+        self.secret = secret
+        self.ftp = ftp
+        self.home = ftp.pwd()
+        self.last_used = self.last_noop = time.monotonic()
+
+    @property
+    def server(self) -> tuple:
+        return self.key[:2]
+
+
+def digest(password: str) -> str:
+    # sessions are only reused with the password they logged in with
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def close_session(session: Session) -> None:
+    """
+    Close a session taken out of the pool and free its place.
+    """
+    try:
+        session.ftp.quit()
+    except Exception:
+        session.ftp.close()
+
+    with _condition:
+        _open[session.server] -= 1
+        _condition.notify_all()
+
+
+def acquire(host: str, port: int, user: str, password: str) -> Session:
+    """
+    Take an idle session of (host, port, user) out of the pool, or open a new one.
+
+    Waits while the server already has MAX_PER_HOST sessions open and none of them is idle.
+    """
+    key = (host, int(port), user)
+    secret = digest(password)
+
+    while True:
+        session = evicted = None
+
+        with _condition:
+            while True:
+                # most recently used sessions are the least likely to have been dropped by the server
+                session = next((session for session in reversed(_idle) if session.key == key and session.secret == secret), None)
+                if session is not None:
+                    _idle.remove(session)
+                    break
+
+                if _open.get(key[:2], 0) < MAX_PER_HOST:
+                    _open[key[:2]] = _open.get(key[:2], 0) + 1
+                    break
+
+                # make room by closing an idle session of another user of the same server
+                evicted = next((session for session in _idle if session.server == key[:2]), None)
+                if evicted is not None:
+                    _idle.remove(evicted)
+                    break
+
+                _condition.wait()
+
+        if evicted is not None:
+            close_session(evicted)
+            continue
+
+        if session is not None:
+            try:
+                session.ftp.cwd(session.home)
+                return session
+            except ftplib.all_errors:
+                # dropped by the server, try the next one
+                close_session(session)
+                continue
+
+        try:
+            ftp = ftplib.FTP(timeout=TIMEOUT)
+            ftp.connect(host=host, port=int(port))
+            ftp.login(user, password)
+            return Session(key, secret, ftp)
+        except BaseException:
+            with _condition:
+                _open[key[:2]] -= 1
+                _condition.notify_all()
+            raise
+
+
+def release(session: Session) -> None:
+    """
+    Put a session back into the pool for the next user.
+    """
+    session.last_used = time.monotonic()
+
+    with _condition:
+        _idle.append(session)
+        _condition.notify_all()
+
+    start_keeper()
+
+
+def keep_alive() -> None:
+    """
+    Close sessions idle longer than MAX_IDLE and send NOOP to the others when due.
+    """
+    now = time.monotonic()
+
+    with _condition:
+        expired = [session for session in _idle if now - session.last_used > MAX_IDLE]
+        due = [session for session in _idle
+               if session not in expired and now - session.last_noop > KEEPALIVE_INTERVAL]
+
+        # taken out while talking to the server, so nobody else uses them meanwhile
+        for session in expired + due:
+            _idle.remove(session)
+
+    for session in expired:
+        close_session(session)
+
+    for session in due:
+        try:
+            session.ftp.voidcmd('NOOP')
+        except ftplib.all_errors:
+            close_session(session)
+            continue
+
+        session.last_noop = time.monotonic()
+        with _condition:
+            _idle.append(session)
+            _condition.notify_all()
+
+
+def run_keeper() -> None:
+    while True:
+        time.sleep(min(KEEPALIVE_INTERVAL, MAX_IDLE) / 2)
+        try:
+            keep_alive()
+        except Exception as e:
+            print(f'FTP keep-alive failed: {e}')
+
+
+def start_keeper() -> None:
+    """
+    Start the keep-alive thread of this process if it isn't running.
+    """
+    global _keeper
+
+    with _condition:
+        if _keeper is None or not _keeper.is_alive():
+            _keeper = threading.Thread(target=run_keeper, name='ftp-keepalive', daemon=True)
+            _keeper.start()
+
+
+def close_all() -> None:
+    """
+    Close every idle session of the pool.
+    """
+    with _condition:
+        sessions = list(_idle)
+        _idle.clear()
+
+    for session in sessions:
+        close_session(session)
+
+
+@contextmanager
+def ftp_session(client_request):
+    """
+    Use a pooled session logged in to client request's FTP server.
+
+    The session starts in the login directory. If the block raises, the
+    session is closed instead of being put back, its state is unknown.
+    """
+    session = acquire(client_request.code_link, client_request.port, client_request.username, client_request.token)
+
+    try:
+        yield session.ftp
+    except BaseException:
+        close_session(session)
+        raise
+
+    release(session)
@@ -0,0 +1,234 @@
+"""
+Resumable FTP transfers.
+
+Files are downloaded into '<name>.part' and renamed once their size matches
+the server's, so an interrupted download resumes from the bytes already
+received (REST + RETR). Uploads record which files they started in a
+checkpoint next to the workspace's lock; a retried upload of an unchanged
+file appends the missing bytes (APPE) instead of sending it again. Servers
+without REST, APPE or SIZE get whole files, as before.
+
+Operations are retried on a fresh pooled session after transient failures,
+so a dropped connection costs only the bytes which didn't arrive.
+"""
+import json
+import os
+import socket
+import time
+
+from .ftp_pool import ftp_session
+from .lazy import lazy_import
+from .locks import lock_path
+
+ftplib = lazy_import('ftplib')
+
+# Attempts of an operation before giving up
+RETRIES = 5
+
+# Seconds to wait before the first retry, doubled for every further one
+RETRY_DELAY = 2
+
+# Files synced from FTP sites, everything else is left on the server
+SYNCED_EXTENSIONS = ('.html', '.png', '.jpg', '.jpeg')
+
+
+class TransferError(Exception):
+    """
+    Transferred file doesn't have the size it should have.
+    """
+
+
+def with_session(client_request, operation):
+    """
+    Run operation(ftp) with a pooled session of client request's server.
+
+    Transient failures (dropped connections, timeouts, 4xx replies, short
+    transfers) are retried on a fresh session, 'operation' has to pick up
+    where it stopped by itself. Local errors, like a changed file which no
+    longer exists, are raised right away.
+
+    : returns: result of 'operation'
+    """
+    transient = (socket.timeout, ConnectionError, EOFError, ftplib.error_temp, ftplib.error_reply, TransferError)
+
+    for attempt in range(RETRIES):
+        try:
+            with ftp_session(client_request) as ftp:
+                return operation(ftp)
+        except transient as e:
+            if attempt == RETRIES - 1:
+                raise
+            print(f'FTP transfer failed ({e}), retrying')
+            time.sleep(RETRY_DELAY * 2 ** attempt)
+
+
+def remote_size(ftp, name: str) -> int:
+    """
+    Get size of remote file 'name', None if the server doesn't tell.
+    """
+    try:
+        return ftp.size(name)
+    except ftplib.error_perm:
+        return None
+
+
+def download_file(ftp, name: str, local: str) -> None:
+    """
+    Download remote file 'name' to 'local', resuming a partial download.
+    """
+    size = remote_size(ftp, name)
+
+    # finished by an earlier attempt
+    if size is not None and os.path.exists(local) and os.path.getsize(local) == size:
+        return
+
+    part = f'{local}.part'
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    if size is None or offset > size:
+        offset = 0
+
+    with open(part, 'ab' if offset else 'wb') as fp:
+        try:
+            ftp.retrbinary(f'RETR {name}', fp.write, rest=offset or None)
+        except ftplib.error_perm:
+            if not offset:
+                raise
+
+            # server doesn't support REST, start over
+            fp.seek(0)
+            fp.truncate()
+            ftp.retrbinary(f'RETR {name}', fp.write)
+
+    if size is not None and os.path.getsize(part) != size:
+        raise TransferError(f'{name}: received {os.path.getsize(part)} of {size} bytes')
+
+    os.replace(part, local)
+
+
+def download_files(ftp, path, destination):
+    """
+    Download FTP directory 'path' (the current remote directory) into 'destination'.
+
+    : returns: local directory the files were downloaded into
+    """
+    path = path[:-1] if path[-1] == '/' else path
+
+    folder = path[path.rfind('/')+1:]
+    destination = os.path.join(destination, folder)
+    if not os.path.exists(destination):
+        os.makedirs(destination)
+
+    # SIZE is only reliable in binary mode
+    ftp.voidcmd('TYPE I')
+
+    for file in ftp.nlst():
+        try:
+            #this will check if file is folder:
+            new_dest = f'{path}/{file}'
+            ftp.cwd(file)
+            #if so, explore it:
+            download_files(ftp, new_dest, destination)
+            ftp.cwd('..')
+        except ftplib.error_perm:
+            if file.endswith(SYNCED_EXTENSIONS):
+                download_file(ftp, file, os.path.join(destination, file))
+
+    return destination
+
+
+def load_checkpoint(path: str) -> dict:
+    """
+    Get uploads started from workspace 'path': file to [size, mtime] of the local file when started.
+    """
+    try:
+        with open(lock_path(path, 'upload')) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_checkpoint(path: str, checkpoint: dict) -> None:
+    temp = lock_path(path, f'upload.{os.getpid()}')
+    os.makedirs(os.path.dirname(temp), exist_ok=True)
+    with open(temp, 'w') as fp:
+        json.dump(checkpoint, fp)
+    os.replace(temp, lock_path(path, 'upload'))
+
+
+def clear_checkpoint(path: str) -> None:
+    """
+    Forget uploads of workspace 'path', called once everything is uploaded.
+    """
+    try:
+        os.remove(lock_path(path, 'upload'))
+    except OSError:
+        pass
+
+
+def upload_file(ftp, local: str, name: str, checkpoint: dict, path: str) -> None:
+    """
+    Upload 'local' to remote file 'name', appending to it if an earlier attempt uploaded part of it.
+    """
+    stat = os.stat(local)
+    state = [stat.st_size, stat.st_mtime_ns]
+
+    offset = 0
+    if checkpoint.get(name) == state:
+
+        # started before with the same content, the server has its beginning
+        offset = remote_size(ftp, name) or 0
+        if offset == stat.st_size:
+            return
+        if offset > stat.st_size:
+            offset = 0
+
+    else:
+        checkpoint[name] = state
+        save_checkpoint(path, checkpoint)
+
+    with open(local, 'rb') as fh:
+        if offset:
+            fh.seek(offset)
+            try:
+                ftp.storbinary(f'APPE {name}', fh)
+            except ftplib.error_perm:
+                # server doesn't support APPE, send whole file
+                fh.seek(0)
+                ftp.storbinary(f'STOR {name}', fh)
+        else:
+            ftp.storbinary(f'STOR {name}', fh)
+
+    size = remote_size(ftp, name)
+    if size is not None and size != stat.st_size:
+        raise TransferError(f'{name}: server has {size} of {stat.st_size} bytes')
+
+
+def upload_files(ftp, path, files):
+    """
+    Upload only 'files' (relative to 'path') to the current remote directory.
+    """
+    checkpoint = load_checkpoint(path)
+    ftp.voidcmd('TYPE I')
+
+    for file in files:
+        
+        # create missing remote directories of the file
+        remote_dir = ''
+        for folder in file.split('/')[:-1]:
+            remote_dir = f'{remote_dir}{folder}/'
+            try:
+                ftp.mkd(remote_dir)
+            except ftplib.error_perm:
+                pass
+        
+        upload_file(ftp, os.path.join(path, file), file, checkpoint, path)
+
+
+def uploadThis(ftp, path):
+    """
+    Upload whole directory 'path' to the current remote directory.
+    """
+    files = [os.path.relpath(os.path.join(root, filename), path)
+             for root, dirnames, filenames in os.walk(path) for filename in filenames]
+
+    upload_files(ftp, path, files)
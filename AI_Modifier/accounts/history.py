@@ -0,0 +1,150 @@
+"""
+History of pushes and syncs.
+
+Every push and sync is recorded as a TransferAttempt with its queue, start
+and finish times, duration, files and bytes transferred and outcome. The
+admin dashboard reads percentiles of these per transport and per client.
+"""
+import datetime as dt
+import os
+import time
+from contextlib import contextmanager
+from typing import NamedTuple
+
+from django.utils import timezone
+
+# Percentiles shown on the dashboard
+PERCENTILES = (50, 95, 99)
+
+# Dashboard looks at this many days of history by default
+DEFAULT_DAYS = 7
+
+
+class LatencyRow(NamedTuple):
+    """
+    Latency of one group (transport or client) of pushes or syncs, in seconds.
+    """
+    kind: str
+    group: str
+    count: int
+    failures: int
+    p50: float
+    p95: float
+    p99: float
+    bytes: int
+
+
+def files_size(path: str, files: list = None) -> int:
+    """
+    Get size of 'files' (relative to 'path') in bytes, of everything within 'path' if files is None.
+    """
+    if files is None:
+        from .eviction import disk_usage
+        return disk_usage(path)
+
+    size = 0
+    for file in files:
+        try:
+            size += os.path.getsize(os.path.join(path, file))
+        except OSError:
+            pass
+
+    return size
+
+
+@contextmanager
+def track(client_request, kind: str, transport: str, repo: str, queued_at: dt.datetime = None):
+    """
+    Record the push or sync done within the block as a TransferAttempt.
+
+    The block may set 'files' and 'bytes' of the yielded attempt. Errors of the
+    block are recorded and raised again; failing to record never fails the block.
+
+    : args: client_request: ClientRequest object
+          : kind: 'push' or 'sync'
+          : transport: 'git' or 'ftp'
+          : repo: path of the workspace
+          : queued_at: when the work was queued, defaults to now
+    """
+    from .models import TransferAttempt
+
+    started_at = timezone.now()
+    attempt = TransferAttempt(client_request=client_request, kind=kind, transport=transport, repo=repo,
+                              created_at=queued_at or started_at, started_at=started_at)
+    started = time.monotonic()
+
+    try:
+        yield attempt
+        attempt.success = True
+    except Exception as e:
+        attempt.error = str(e)
+        raise
+    finally:
+        attempt.duration = time.monotonic() - started
+        attempt.finished_at = timezone.now()
+        try:
+            attempt.save()
+        except Exception as e:
+            print(f'Could not record {kind} of {repo}: {e}')
+
+
+def percentile(values: list, percent: float) -> float:
+    """
+    Get 'percent' percentile of sorted 'values', interpolating between neighbours.
+    """
+    if not values:
+        return 0.0
+
+    position = (len(values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def latency_report(group_by: str = 'transport', days: int = DEFAULT_DAYS) -> list:
+    """
+    Get push and sync latency percentiles of the last 'days' days.
+
+    : args: group_by: 'transport' or 'client'
+          : days: length of the window
+
+    : returns: list of LatencyRow, slowest p95 first within every kind
+    """
+    from .models import TransferAttempt
+
+    field = 'client_request__url' if group_by == 'client' else 'transport'
+    since = timezone.now() - dt.timedelta(days=days)
+
+    # only durations of the window are read, finished_at is indexed
+    groups = {}
+    attempts = TransferAttempt.objects.filter(finished_at__gte=since).values_list('kind', field, 'duration', 'success', 'bytes')
+    for kind, group, duration, success, size in attempts.iterator():
+        stats = groups.setdefault((kind, group), {'durations': [], 'failures': 0, 'bytes': 0})
+        stats['durations'].append(duration)
+        stats['failures'] += not success
+        stats['bytes'] += size or 0
+
+    rows = []
+    for (kind, group), stats in groups.items():
+        durations = sorted(stats['durations'])
+        rows.append(LatencyRow(kind, group, len(durations), stats['failures'],
+                               *(round(percentile(durations, percent), 3) for percent in PERCENTILES),
+                               stats['bytes']))
+
+    rows.sort(key=lambda row: (row.kind, -row.p95))
+
+    return rows
+
+
+def push_backlog() -> dict:
+    """
+    Get number of change requests waiting to be pushed and age of the oldest one in seconds.
+    """
+    from django.db.models import Count, Min
+    from .models import ChangeRequest
+
+    backlog = ChangeRequest.objects.filter(success=False).aggregate(pending=Count('pk'), oldest=Min('created_at'))
+    oldest = (timezone.now() - backlog['oldest']).total_seconds() if backlog['oldest'] else 0
+
+    return {'pending': backlog['pending'], 'oldest': round(oldest)}
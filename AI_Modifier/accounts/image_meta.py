@@ -0,0 +1,281 @@
+"""
+Metadata index of the images of a workspace.
+
+Format and pixel dimensions are read from the first bytes of every image, no
+pixel is decoded and PIL isn't loaded. Byte size and a content hash are kept
+along with them. The index is built when the workspace is synced, images
+which didn't change since the last build (same size and mtime) keep their
+entry, and it is updated whenever the editor uploads an image. Like the
+assets index it is kept next to the workspace's lock.
+
+Paths within the index are relative to the workspace.
+"""
+import hashlib
+import json
+import os
+import struct
+from typing import NamedTuple
+
+from .locks import lock_path
+
+# Bumped whenever the layout of the index changes
+IMAGE_META_VERSION = 1
+
+# Bytes read looking for the dimensions of JPEGs with large metadata segments
+MAX_HEADER = 512 * 1024
+
+
+class ImageMeta(NamedTuple):
+    """
+    Header metadata of an image, format and dimensions are None if the header isn't recognized.
+    """
+    format: str
+    width: int
+    height: int
+    size: int
+    sha1: str
+
+
+def jpeg_size(fp) -> tuple:
+    """
+    Find dimensions within the start of frame segment of a JPEG, 'fp' positioned after SOI.
+    """
+    read = 2
+    while read < MAX_HEADER:
+        marker = fp.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None, None
+
+        # fill bytes before a marker
+        while len(marker) == 2 and marker[1] == 0xFF:
+            marker = marker[1:] + fp.read(1)
+        if len(marker) < 2:
+            return None, None
+
+        code = marker[1]
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+            read += 2
+            continue
+
+        length = fp.read(2)
+        if len(length) < 2:
+            return None, None
+        length, = struct.unpack('>H', length)
+
+        # SOF0..SOF15, except DHT, JPG and DAC which share the range
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>xHH', fp.read(5))
+            return width, height
+
+        fp.seek(length - 2, os.SEEK_CUR)
+        read += 2 + length
+
+    return None, None
+
+
+def read_header(fp) -> tuple:
+    """
+    Read format and pixel dimensions of an image from its header.
+
+    : args: fp: image file opened in binary mode, positioned at its start
+
+    : returns: tuple of format, width and height, all None if the format isn't recognized
+    """
+    head = fp.read(30)
+
+    if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+        return ('PNG',) + struct.unpack('>II', head[16:24])
+
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return ('GIF',) + struct.unpack('<HH', head[6:10])
+
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        chunk = head[12:16]
+        if chunk == b'VP8 ':
+            width, height = struct.unpack('<HH', head[26:30])
+            return 'WEBP', width & 0x3FFF, height & 0x3FFF
+        if chunk == b'VP8L':
+            bits, = struct.unpack('<I', head[21:25])
+            return 'WEBP', (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b'VP8X':
+            return 'WEBP', int.from_bytes(head[24:27], 'little') + 1, int.from_bytes(head[27:30], 'little') + 1
+
+    if head.startswith(b'\xFF\xD8'):
+        fp.seek(2)
+        return ('JPEG',) + jpeg_size(fp)
+
+    return None, None, None
+
+
+def image_meta(path: str) -> ImageMeta:
+    """
+    Get metadata of the image at 'path' without decoding it.
+    """
+    size = os.path.getsize(path)
+
+    with open(path, 'rb') as fp:
+        try:
+            image_format, width, height = read_header(fp)
+        except struct.error:
+            image_format, width, height = None, None, None
+
+        # content hash, read in chunks
+        fp.seek(0)
+        digest = hashlib.sha1()
+        for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+            digest.update(chunk)
+
+    return ImageMeta(image_format, width, height, size, digest.hexdigest())
+
+
+def entry(repo_name: str, image: str, old: list = None) -> list:
+    """
+    Build index entry of 'image', reusing 'old' if the file didn't change since.
+
+    : returns: [mtime_ns, *ImageMeta], None if the image doesn't exist
+    """
+    path = os.path.join(repo_name, image)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    if old is not None and old[0] == stat.st_mtime_ns and old[4] == stat.st_size:
+        return old
+
+    return [stat.st_mtime_ns, *image_meta(path)]
+
+
+def save_image_index(repo_name: str, index: dict) -> None:
+    path = lock_path(repo_name, 'images')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # written aside and moved in place, readers never see half an index
+    temp = lock_path(repo_name, f'images.{os.getpid()}')
+    with open(temp, 'w') as fp:
+        json.dump(index, fp)
+    os.replace(temp, path)
+
+
+def read_image_index(repo_name: str) -> dict:
+    """
+    Get the saved index of the workspace, None if it's missing or outdated.
+    """
+    try:
+        with open(lock_path(repo_name, 'images')) as fp:
+            index = json.load(fp)
+        if index.get('version') == IMAGE_META_VERSION:
+            return index
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+
+def build_image_index(repo_name: str, images: list, save: bool = True) -> dict:
+    """
+    Build metadata index of 'images' (relative to workspace), reusing entries of unchanged files.
+
+    Must be called while holding the writer lock of the workspace, unless not
+    'save', in which case the index is only returned.
+    """
+    old = (read_image_index(repo_name) or {}).get('images', {})
+
+    index = {'version': IMAGE_META_VERSION, 'images': {}}
+    for image in images:
+        meta = entry(repo_name, image, old.get(image))
+        if meta is not None:
+            index['images'][image] = meta
+
+    if save:
+        save_image_index(repo_name, index)
+
+    return index
+
+
+def update_image_index(repo_name: str, images: list) -> None:
+    """
+    Refresh entries of changed images (relative to workspace) within the index.
+    """
+    index = load_image_index(repo_name)
+
+    for image in images:
+        meta = entry(repo_name, image)
+        if meta is None:
+            index['images'].pop(image, None)
+        else:
+            index['images'][image] = meta
+
+    save_image_index(repo_name, index)
+
+
+def load_image_index(repo_name: str, save: bool = True) -> dict:
+    """
+    Get the metadata index of the workspace, building it if it's missing or outdated.
+
+    : args: repo_name: path of the workspace
+          : save: save an index built here, only with the writer lock of the workspace held
+    """
+    index = read_image_index(repo_name)
+    if index is not None:
+        return index
+
+    # imported here, the assets index updates this one; building a missing
+    # assets index builds this one along with it
+    from .assets import load_index
+    images = load_index(repo_name, save)['images']
+
+    return read_image_index(repo_name) or build_image_index(repo_name, images, save)
+
+
+def image_metadata(repo_name: str, image: str, index: dict = None) -> ImageMeta:
+    """
+    Get metadata of 'image' (relative to workspace) from the index, None if it isn't indexed.
+
+    Nothing is written, only the reader lock of the workspace is needed.
+    """
+    index = index or load_image_index(repo_name, save=False)
+    meta = index['images'].get(image)
+
+    return ImageMeta(*meta[1:]) if meta is not None else None
+
+
+def with_metadata(repo_name: str, table: list, repo_dir: str) -> list:
+    """
+    Attach metadata of every image of an image table.
+
+    Nothing is written, only the reader lock of the workspace is needed.
+
+    : args: repo_name: path of the workspace
+          : table: list of ImageElement
+          : repo_dir: directory ImageElement.src is relative to (as 'All_Repo/...')
+
+    : returns: list of ImageElement with 'meta' set
+    """
+    if not table:
+        return table
+
+    index = load_image_index(repo_name, save=False)
+    rows = []
+
+    for element in table:
+        path = os.path.join(repo_dir, element.src.split('/', 1)[-1])
+        image = os.path.relpath(path, repo_name).replace(os.sep, '/')
+        rows.append(element._replace(meta=image_metadata(repo_name, image, index)))
+
+    return rows
+
+
+def scaled_size(meta: ImageMeta, width: int = None, height: int = None) -> tuple:
+    """
+    Fill in the missing one of 'width' and 'height' keeping the image's aspect ratio.
+
+    : returns: tuple of width and height, unchanged if both or none are given or the size isn't known
+    """
+    if meta is None or not meta.width or not meta.height or (width is None) == (height is None):
+        return width, height
+
+    if width is None:
+        return max(1, round(height * meta.width / meta.height)), height
+
+    return width, max(1, round(width * meta.height / meta.width))
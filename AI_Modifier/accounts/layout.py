@@ -0,0 +1,128 @@
+"""
+Migration of workspaces from the flat All_Repo layout to the hashed fan-out.
+
+Workspaces used to be named after the last segment of the code link (git)
+or of the remote directory (FTP) directly within REPO_DIR, so FTP clients
+with the same directory name shared one workspace. Every client request now
+gets its own workspace at workspace_path(). Git worktrees are moved with git,
+so the shared mirror keeps track of them; files next to the workspace's lock
+(sync generation, indexes, upload checkpoint) move along, and pending change
+requests are pointed at the new path.
+"""
+import os
+import shutil
+from typing import NamedTuple
+
+from .lazy import lazy_import
+from .locks import lock_path, repo_lock
+from .workspace import legacy_workspace_path, workspace_path
+
+git = lazy_import('git')
+
+# Files kept next to the lock of a workspace which stay valid when it moves
+WORKSPACE_FILES = ('generation', 'access', 'assets', 'images', 'upload', 'listing')
+
+
+class Migration(NamedTuple):
+    """
+    Outcome of migrating the workspace of one client request.
+    """
+    url: str
+    old: str
+    new: str
+    status: str
+
+
+def move_workspace_files(old: str, new: str, copy: bool = False) -> None:
+    """
+    Move (or copy) files kept next to the lock of workspace 'old' to those of 'new'.
+    """
+    for suffix in WORKSPACE_FILES:
+        if os.path.exists(lock_path(old, suffix)):
+            if copy:
+                shutil.copy2(lock_path(old, suffix), lock_path(new, suffix))
+            else:
+                os.replace(lock_path(old, suffix), lock_path(new, suffix))
+
+    # page report holds paths within REPO_DIR, it is written again by the next extraction
+    if not copy:
+        try:
+            os.remove(lock_path(old, 'pages'))
+        except OSError:
+            pass
+
+
+def move_workspace(old: str, new: str) -> None:
+    """
+    Move workspace 'old' to 'new', both locks must be held.
+    """
+    os.makedirs(os.path.dirname(new), exist_ok=True)
+
+    if os.path.isfile(os.path.join(old, '.git')):
+
+        # worktree is registered within the shared mirror, git updates both sides
+        mirror = git.Repo(git.Repo(old).common_dir)
+        with repo_lock(mirror.git_dir):
+            mirror.git.worktree('move', old, new)
+    else:
+        shutil.move(old, new)
+
+    move_workspace_files(old, new)
+
+
+def copy_workspace(old: str, new: str) -> None:
+    """
+    Copy FTP workspace 'old' to 'new', for client requests which shared it.
+    """
+    os.makedirs(os.path.dirname(new), exist_ok=True)
+    shutil.copytree(old, new, symlinks=True)
+    move_workspace_files(old, new, copy=True)
+
+
+def migrate_workspaces(dry_run: bool = False) -> list:
+    """
+    Move workspaces of all client requests from the flat layout to the fan-out.
+
+    : args: dry_run: only report what would be moved
+
+    : returns: list of Migration, one for every client request with a workspace in the flat layout
+    """
+    from .models import ChangeRequest, ClientRequest
+
+    # FTP client requests with the same remote directory name shared a workspace
+    sharing = {}
+    for client_request in ClientRequest.objects.order_by('pk'):
+        sharing.setdefault(legacy_workspace_path(client_request), []).append(client_request)
+
+    migrations = []
+
+    for old, client_requests in sharing.items():
+        if not os.path.isdir(old):
+            continue
+
+        for position, client_request in enumerate(client_requests):
+            new = workspace_path(client_request)
+
+            # every client request but the last gets a copy, the last one takes the original
+            moving = position == len(client_requests) - 1
+            if os.path.exists(new):
+                status = 'already migrated'
+            elif dry_run:
+                status = 'would move' if moving else 'would copy'
+            else:
+                try:
+                    with repo_lock(old), repo_lock(new):
+                        if moving:
+                            move_workspace(old, new)
+                        else:
+                            copy_workspace(old, new)
+
+                    ChangeRequest.objects.filter(client_request=client_request, repo=old).update(repo=new)
+                    status = 'moved' if moving else 'copied'
+
+                except Exception as e:
+                    status = f'failed: {e}'
+
+            migrations.append(Migration(client_request.url, old, new, status))
+
+    return migrations
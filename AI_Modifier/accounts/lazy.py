@@ -0,0 +1,67 @@
+"""
+Modules imported on first use.
+
+git, bs4 and PIL take longer to import than the rest of the app together,
+and most requests (login, password reset, admin lists) and management
+commands never need them. Code using them refers to them through a lazy
+module, or through the facade of accounts.editor, instead of importing them
+at module load.
+"""
+import importlib
+
+
+class LazyModule:
+    """
+    Stand-in for a module, importing it the first time one of its attributes is used.
+
+    Importing goes through the import system's locks, so threads using a lazy
+    module for the first time at once still import it only once.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.__dict__['name'] = name
+        self.__dict__['module'] = None
+
+    def __getattr__(self, attr: str):
+        module = self.__dict__['module']
+        if module is None:
+            module = self.__dict__['module'] = importlib.import_module(self.__dict__['name'])
+
+        return getattr(module, attr)
+
+    def __repr__(self) -> str:
+        return f"<lazy module '{self.__dict__['name']}'>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    Get module 'name', imported when one of its attributes is first used.
+    """
+    return LazyModule(name)
+
+
+def lazy_exports(namespace: dict, exports: dict):
+    """
+    Build module level __getattr__ (PEP 562) of a facade module.
+
+    : args: namespace: globals() of the facade, resolved names are stored there
+          : exports: dict of name to the module it's imported from, a name equal
+                   to the last part of its module exports the module itself,
+                   e.g. {'BeautifulSoup': 'bs4', 'git': 'git', 'Image': 'PIL.Image'}
+
+    : returns: __getattr__ function of the facade
+    """
+
+    def __getattr__(name: str):
+        if name not in exports:
+            raise AttributeError(f"module {namespace['__name__']!r} has no attribute {name!r}")
+
+        module = importlib.import_module(exports[name])
+        value = module if module.__name__.rpartition('.')[2] == name else getattr(module, name)
+
+        # later uses find it without calling __getattr__
+        namespace[name] = value
+
+        return value
+
+    return __getattr__
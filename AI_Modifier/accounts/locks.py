@@ -0,0 +1,151 @@
+"""
+Locks of workspaces shared by threads and worker processes.
+
+Workspaces are guarded by reader/writer file locks, so requests on different
+repositories never wait for each other. Concurrent syncs of the same
+workspace are collapsed into a single operation.
+
+Locks are re-entrant within a thread: a thread holding the writer lock may
+take either lock of the same workspace again. Taking the writer lock while
+holding only the reader lock can't be granted without a deadlock and raises.
+"""
+import fcntl
+import glob
+import hashlib
+import os
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+
+# Lock files live outside the workspaces, so they are never pushed or evicted with them
+LOCK_DIR = os.path.join(Path(__file__).resolve().parent, 'locks')
+
+# Syncs running in this process
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+# Lock files held by the current thread, mapped to True if held shared
+_held = threading.local()
+
+
+def lock_path(path: str, suffix: str = 'lock') -> str:
+    """
+    Get path of the lock file of 'path'.
+    """
+    key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return os.path.join(LOCK_DIR, f'{key}.{suffix}')
+
+
+@contextmanager
+def repo_lock(path: str, shared: bool = False, blocking: bool = True):
+    """
+    Hold reader (shared) or writer lock of 'path' for the duration of the block.
+
+    : args: path: path of the workspace or mirror
+          : shared: True for readers, False for writers
+          : blocking: False to raise BlockingIOError instead of waiting for the lock
+    """
+    key = lock_path(path)
+
+    # forked children start with a copy of the forking thread's locks, which they don't hold
+    if getattr(_held, 'pid', None) != os.getpid():
+        _held.pid, _held.locks = os.getpid(), {}
+    held = _held.locks
+
+    # nested in a block of the same thread holding the lock already
+    if key in held:
+        if held[key] and not shared:
+            raise RuntimeError(f'writer lock of {path} requested while holding its reader lock')
+        yield
+        return
+
+    os.makedirs(LOCK_DIR, exist_ok=True)
+
+    while True:
+
+        # every thread opens its own file, so threads of the same process exclude each other too
+        fd = os.open(key, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB))
+
+            # lock file was removed (see remove_lock_files) while waiting, others lock a new one
+            try:
+                current = os.stat(key)
+            except FileNotFoundError:
+                current = None
+            if current is not None and os.path.samestat(os.fstat(fd), current):
+                break
+        except BaseException:
+            os.close(fd)
+            raise
+        os.close(fd)
+
+    try:
+        held[key] = shared
+        try:
+            yield
+        finally:
+            del held[key]
+    finally:
+        # closing the file releases the lock
+        os.close(fd)
+
+
+def remove_lock_files(path: str) -> None:
+    """
+    Remove the lock of 'path' along with every file kept next to it, must be called while holding its writer lock.
+    """
+    for file in glob.glob(glob.escape(lock_path(path, '')) + '*'):
+        try:
+            os.remove(file)
+        except OSError:
+            pass
+
+
+def generation(path: str) -> int:
+    """
+    Get how many times 'path' has been synced, used to notice syncs done by other workers.
+    """
+    try:
+        with open(lock_path(path, 'generation')) as fp:
+            return int(fp.read() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def bump_generation(path: str) -> None:
+    """
+    Record a completed sync of 'path', must be called while holding its writer lock.
+    """
+    os.makedirs(LOCK_DIR, exist_ok=True)
+
+    temp = lock_path(path, f'generation.{os.getpid()}')
+    with open(temp, 'w') as fp:
+        fp.write(str(generation(path) + 1))
+    os.replace(temp, lock_path(path, 'generation'))
+
+
+def single_flight(key, func):
+    """
+    Run 'func' once for all concurrent callers with the same 'key'.
+
+    Callers arriving while 'func' is running wait for it and share its result
+    (or exception) instead of running it again.
+    """
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight[key] = Future()
+
+    if leader:
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with _in_flight_lock:
+                del _in_flight[key]
+
+    return future.result()
@@ -0,0 +1,52 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.assets import build_index, load_index, references, replace_image, unreferenced_images
+from accounts.locks import repo_lock
+from accounts.models import ClientRequest
+from accounts.workspace import workspace_path
+
+
+class Command(BaseCommand):
+    help = 'Report which pages of a client\'s workspace use which images, or replace an image everywhere.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Url of the client request.')
+        parser.add_argument('--unreferenced', action='store_true', help='Only list images no page uses.')
+        parser.add_argument('--replace', nargs=2, metavar=('OLD', 'NEW'),
+                            help='Point every page using image OLD to image NEW (paths relative to workspace).')
+        parser.add_argument('--dry-run', action='store_true', help='Only count tags --replace would change.')
+        parser.add_argument('--rebuild', action='store_true', help='Scan the whole workspace again first.')
+
+    def handle(self, *args, **options):
+        try:
+            client_request = ClientRequest.objects.get(url=options['url'])
+        except ClientRequest.DoesNotExist:
+            raise CommandError(f'No client request for {options["url"]}')
+
+        path = workspace_path(client_request)
+        if not os.path.isdir(path):
+            raise CommandError(f'Workspace {path} does not exist, open the site in the editor first.')
+
+        writing = options['rebuild'] or (options['replace'] and not options['dry_run'])
+
+        with repo_lock(path, shared=not writing):
+            if options['rebuild']:
+                build_index(path)
+
+            if options['replace']:
+                old, new = options['replace']
+                changed = replace_image(path, old, new, dry_run=options['dry_run'])
+                for page, count in sorted(changed.items()):
+                    self.stdout.write(f'{page}: {count}')
+                verb = 'Found' if options['dry_run'] else 'Replaced'
+                self.stdout.write(f'{verb} {sum(changed.values())} images on {len(changed)} pages')
+
+            elif options['unreferenced']:
+                for image in unreferenced_images(path):
+                    self.stdout.write(image)
+
+            else:
+                for image, pages in sorted(references(load_index(path, save=False)).items()):
+                    self.stdout.write(f'{image}: {", ".join(sorted({page for page, locator in pages})) or "unused"}')
@@ -0,0 +1,59 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.batch import edit_client, load_spec
+from accounts.models import ClientRequest
+
+
+class Command(BaseCommand):
+    help = 'Apply a JSON edit spec to many client workspaces and record a change request for each.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('spec', help='JSON file with the edits, see accounts/batch.py.')
+        parser.add_argument('--url', action='append', help='Only this client request, may be repeated.')
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count()),
+                            help='Workspaces edited at once.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change.')
+        parser.add_argument('--push', action='store_true', help='Push the change requests right away.')
+        parser.add_argument('--report', help='Write the JSON report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        try:
+            spec = load_spec(options['spec'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read {options["spec"]}: {e}')
+
+        client_requests = ClientRequest.objects.order_by('pk')
+        urls = options['url'] or spec['clients']
+        if urls:
+            client_requests = client_requests.filter(url__in=urls)
+        pks = list(client_requests.values_list('pk', flat=True))
+
+        if options['workers'] <= 1 or len(pks) < 2:
+            results = [edit_client(pk, spec['edits'], options['dry_run'], options['push']) for pk in pks]
+        else:
+            # spawned processes have to set up django themselves and open their own database connections
+            with ProcessPoolExecutor(max_workers=options['workers'], mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=django.setup) as executor:
+                futures = [executor.submit(edit_client, pk, spec['edits'], options['dry_run'], options['push'])
+                           for pk in pks]
+                results = [future.result() for future in as_completed(futures)]
+
+        results.sort(key=lambda result: result['url'])
+        report = {'dry_run': options['dry_run'],
+                  'clients': results,
+                  'changed': sum(bool(result['pages']) for result in results),
+                  'failed': sum(result['status'] == 'failed' for result in results)}
+
+        if options['report']:
+            with open(options['report'], 'w') as fp:
+                json.dump(report, fp, indent=2)
+            self.stdout.write(f'Changed {report["changed"]} of {len(results)} workspaces, '
+                              f'{report["failed"]} failed, report written to {options["report"]}')
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
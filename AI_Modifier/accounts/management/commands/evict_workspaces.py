@@ -0,0 +1,36 @@
+import datetime as dt
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from accounts.eviction import disk_budget, evict_workspaces, list_workspaces
+
+
+class Command(BaseCommand):
+    help = 'Remove least recently used clean workspaces until they fit into the disk budget. Meant to run periodically.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budget', type=int, help='Bytes workspaces may use, defaults to WORKSPACE_DISK_BUDGET.')
+        parser.add_argument('--usage', action='store_true', help='Only show disk usage of workspaces.')
+        parser.add_argument('--dry-run', action='store_true', help='Only show which workspaces would be removed.')
+
+    def handle(self, *args, **options):
+        budget = disk_budget() if options['budget'] is None else options['budget']
+        workspaces = list_workspaces()
+
+        for workspace in workspaces:
+            accessed = dt.datetime.fromtimestamp(workspace.accessed).strftime('%Y-%m-%d %H:%M')
+            self.stdout.write(f'{workspace.path}  {filesizeformat(workspace.size)}  {accessed}'
+                              f'{"  kept: " + workspace.pinned if workspace.pinned else ""}')
+
+        self.stdout.write(f'Using {filesizeformat(sum(workspace.size for workspace in workspaces))} '
+                          f'of {filesizeformat(budget)} in {len(workspaces)} workspaces')
+
+        if options['usage']:
+            return
+
+        evicted = evict_workspaces(budget, dry_run=options['dry_run'])
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        for workspace in evicted:
+            self.stdout.write(f'{verb} {workspace.path}')
+        self.stdout.write(f'{verb} {len(evicted)} workspaces, {filesizeformat(sum(workspace.size for workspace in evicted))}')
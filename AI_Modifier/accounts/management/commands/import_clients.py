@@ -0,0 +1,118 @@
+import csv
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.models import ClientRequest
+from modifier_admin import outbox
+from modifier_admin.models import Profile, OutgoingEmail, welcome_email
+from modifier_admin.password import random_password
+
+REQUEST_FIELDS = ('code_link', 'username', 'token', 'version_control', 'branch', 'port')
+
+
+def read_rows(path):
+    """
+    Read clients from CSV or JSON file as flat rows, one row per client request.
+
+    CSV columns and JSON keys: email, name, url, code_link, username, token,
+    version_control, branch, port. JSON clients may instead list their
+    requests under 'requests'. Rows without url only create the client.
+    """
+    with open(path, newline='') as fp:
+        if path.endswith('.json'):
+            rows = []
+            for client in json.load(fp):
+                requests = client.pop('requests', None)
+                if requests is None:
+                    rows.append(client)
+                else:
+                    rows.append({'email': client['email'], 'name': client.get('name', '')})
+                    rows.extend({**request, 'email': client['email'], 'name': client.get('name', '')} for request in requests)
+            return rows
+
+        return list(csv.DictReader(fp))
+
+
+class Command(BaseCommand):
+    help = 'Import clients and their requests from a CSV or JSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON file with clients.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows inserted per query.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Processes hashing passwords.')
+        parser.add_argument('--send', action='store_true',
+                            help='Send the welcome emails before exiting instead of leaving them to send_queued_mail.')
+
+    def handle(self, *args, **options):
+        try:
+            rows = read_rows(options['path'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read {options["path"]}: {e}')
+
+        # clients by email, existing ones are left untouched
+        names = {}
+        for row in rows:
+            if not row.get('email'):
+                raise CommandError(f'Row without email: {row}')
+            names.setdefault(Profile.objects.normalize_email(row['email'].strip()), row.get('name', '').strip())
+
+        existing = set(Profile.objects.filter(email__in=names).values_list('email', flat=True))
+        new_emails = [email for email in names if email not in existing]
+
+        # hashing is the slow part, spread it over processes
+        passwords = [random_password() for _ in new_emails]
+        hashes = self.hash_passwords(passwords, options['workers'])
+
+        profiles = [Profile(email=email, name=names[email], password=hashed, auto_generated=True)
+                    for email, hashed in zip(new_emails, hashes)]
+
+        with transaction.atomic():
+            Profile.objects.bulk_create(profiles, batch_size=options['batch_size'])
+            profile_ids = dict(Profile.objects.filter(email__in=names).values_list('email', 'pk'))
+
+            # requests for urls which are already registered are skipped
+            requests = {}
+            for row in rows:
+                if row.get('url'):
+                    requests.setdefault(row['url'].strip(), row)
+            existing_urls = set(ClientRequest.objects.filter(url__in=requests).values_list('url', flat=True))
+
+            client_requests = [
+                ClientRequest(url=url,
+                              profile_id=profile_ids[Profile.objects.normalize_email(row['email'].strip())],
+                              **{field: row[field] for field in REQUEST_FIELDS if row.get(field) not in (None, '')})
+                for url, row in requests.items() if url not in existing_urls
+            ]
+            ClientRequest.objects.bulk_create(client_requests, batch_size=options['batch_size'])
+
+            # welcome emails are queued with the clients
+            emails = OutgoingEmail.objects.bulk_create([welcome_email(profile, password) for profile, password in zip(profiles, passwords)],
+                                                       batch_size=options['batch_size'])
+
+        self.stdout.write(f'Created {len(profiles)} clients ({len(existing)} already existed) '
+                          f'and {len(client_requests)} requests ({len(existing_urls)} already existed)')
+
+        # only this import's emails, the rest of the outbox is left to send_queued_mail
+        if options['send']:
+            sent = outbox.send_all_queued_mail(emails=OutgoingEmail.objects.filter(pk__in=[email.pk for email in emails]))
+            self.stdout.write(f'Sent {sent} of {len(emails)} welcome emails')
+        else:
+            self.stdout.write(f'Queued {len(emails)} welcome emails')
+
+    def hash_passwords(self, passwords, workers):
+        if workers <= 1 or len(passwords) < 2:
+            return [make_password(password) for password in passwords]
+
+        # spawned processes have to set up django themselves
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=django.setup) as executor:
+            return list(executor.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from accounts.layout import migrate_workspaces
+
+
+class Command(BaseCommand):
+    help = 'Move workspaces from the flat All_Repo layout into the hashed fan-out keyed by client request.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only show which workspaces would be moved.')
+
+    def handle(self, *args, **options):
+        migrations = migrate_workspaces(options['dry_run'])
+
+        for migration in migrations:
+            self.stdout.write(f'{migration.url}: {migration.status}, {migration.old} -> {migration.new}')
+
+        failed = sum(migration.status.startswith('failed') for migration in migrations)
+        self.stdout.write(f'Migrated {len(migrations) - failed} of {len(migrations)} workspaces')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import ClientRequest
+from accounts.pipeline import load_report, run_pipeline
+from accounts.workspace import workspace_path
+
+
+class Command(BaseCommand):
+    help = 'Show how long extracting each page of a client\'s workspace took, slowest first.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Url of the client request.')
+        parser.add_argument('--top', type=int, default=20, help='Pages shown.')
+        parser.add_argument('--run', action='store_true', help='Run the extraction pipeline first.')
+
+    def handle(self, *args, **options):
+        try:
+            client_request = ClientRequest.objects.get(url=options['url'])
+        except ClientRequest.DoesNotExist:
+            raise CommandError(f'No client request for {options["url"]}')
+
+        path = workspace_path(client_request)
+        stats = run_pipeline(path) if options['run'] else load_report(path)
+        if not stats:
+            raise CommandError('No pages extracted yet, sync the workspace or pass --run.')
+
+        for page in stats[:options['top']]:
+            self.stdout.write(f'{page.seconds:8.3f}s  {page.texts:5} texts  {page.images:4} images  {page.page}'
+                              f'{"  failed: " + page.error if page.error else ""}')
@@ -0,0 +1,45 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+
+from accounts.models import ClientRequest
+from accounts.prewarm import warm_client
+
+
+class Command(BaseCommand):
+    help = 'Sync every client workspace and extract tables of all its pages, meant to run from cron.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', help='Only this client request, may be repeated.')
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count()),
+                            help='Workspaces warmed at once.')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON lines.')
+
+    def handle(self, *args, **options):
+        client_requests = ClientRequest.objects.order_by('pk')
+        if options['url']:
+            client_requests = client_requests.filter(url__in=options['url'])
+        pks = list(client_requests.values_list('pk', flat=True))
+
+        if options['workers'] <= 1 or len(pks) < 2:
+            results = [warm_client(pk) for pk in pks]
+        else:
+            # spawned processes have to set up django themselves and open their own database connections
+            with ProcessPoolExecutor(max_workers=options['workers'], mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=django.setup) as executor:
+                results = [future.result() for future in as_completed(executor.submit(warm_client, pk) for pk in pks)]
+
+        for result in results:
+            if options['json']:
+                self.stdout.write(json.dumps(result._asdict()))
+            else:
+                self.stdout.write(f'{result.url}: {result.status}, {result.pages} pages in {result.seconds:.1f}s'
+                                  f'{", slowest " + result.slowest if result.slowest else ""}')
+
+        failed = sum(result.status.startswith('failed') for result in results)
+        if not options['json']:
+            self.stdout.write(f'Warmed {len(results) - failed} of {len(results)} workspaces')
@@ -0,0 +1,43 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.locks import repo_lock
+from accounts.models import ClientRequest
+from accounts.restyle import restyle_workspace
+from accounts.workspace import workspace_path
+
+
+class Command(BaseCommand):
+    help = 'Replace a value of an inline style property on every page of a client\'s workspace.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Url of the client request.')
+        parser.add_argument('--property', required=True, help='Style property, e.g. color or font-size.')
+        parser.add_argument('--from', dest='old', required=True, help='Value to replace, e.g. #333.')
+        parser.add_argument('--to', dest='new', required=True, help='New value, e.g. #1a1a1a.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count matching declarations, don\'t write anything.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Processes rewriting pages.')
+
+    def handle(self, *args, **options):
+        try:
+            client_request = ClientRequest.objects.get(url=options['url'])
+        except ClientRequest.DoesNotExist:
+            raise CommandError(f'No client request for {options["url"]}')
+
+        path = workspace_path(client_request)
+        if not os.path.isdir(path):
+            raise CommandError(f'Workspace {path} does not exist, open the site in the editor first.')
+
+        changes = [(options['property'], options['old'], options['new'])]
+
+        with repo_lock(path, shared=options['dry_run']):
+            changed = restyle_workspace(path, changes, dry_run=options['dry_run'], workers=options['workers'])
+
+        for page, count in sorted(changed.items()):
+            self.stdout.write(f'{page}: {count}')
+
+        verb = 'Found' if options['dry_run'] else 'Replaced'
+        self.stdout.write(f'{verb} {sum(changed.values())} declarations on {len(changed)} pages')
@@ -0,0 +1,40 @@
+import datetime as dt
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.startup import heavy_modules, measure_startup, startup_budget, total_time
+
+
+class Command(BaseCommand):
+    help = 'Measure import time of a worker boot with python -X importtime and fail if it exceeds the budget.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budget', type=float, help='Milliseconds, defaults to STARTUP_IMPORT_BUDGET.')
+        parser.add_argument('--repeat', type=int, default=3, help='Boots measured, the fastest one counts.')
+        parser.add_argument('--top', type=int, default=10, help='Slowest top level imports shown.')
+        parser.add_argument('--record', help='Append the result as a JSON line to this file.')
+
+    def handle(self, *args, **options):
+        budget = startup_budget() if options['budget'] is None else options['budget']
+
+        # the fastest boot has the least noise from the rest of the machine
+        imports = min((measure_startup() for _ in range(max(1, options['repeat']))), key=total_time)
+        total = total_time(imports)
+        heavy = heavy_modules(imports)
+
+        slowest = sorted((module for module in imports if module.level == 0), key=lambda module: -module.cumulative)
+        for module in slowest[:options['top']]:
+            self.stdout.write(f'{module.cumulative / 1000:8.1f} ms  {module.name}')
+        self.stdout.write(f'Startup imports took {total:.1f} ms of {budget:.0f} ms budget')
+
+        if options['record']:
+            with open(options['record'], 'a') as fp:
+                fp.write(json.dumps({'time': dt.datetime.now().isoformat(timespec='seconds'), 'total_ms': round(total, 1),
+                                     'budget_ms': budget, 'heavy_modules': heavy,
+                                     'slowest': {module.name: module.cumulative for module in slowest[:options['top']]}}) + '\n')
+
+        if heavy:
+            raise CommandError(f'Startup imports editor dependencies: {", ".join(heavy)}')
+        if total > budget:
+            raise CommandError(f'Startup imports took {total:.1f} ms, over the budget of {budget:.0f} ms')
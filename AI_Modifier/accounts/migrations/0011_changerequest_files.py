@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-19 14:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_clientrequest_port'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changerequest',
+            name='files',
+            field=models.JSONField(blank=True, default=list, verbose_name='Files'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.0.5 on 2026-10-19 15:21
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_changerequest_files'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='clientrequest',
+            name='version_control',
+            field=models.CharField(db_index=True, max_length=50, verbose_name='Version Control'),
+        ),
+        migrations.AddIndex(
+            model_name='changerequest',
+            index=models.Index(fields=['repo', '-id'], name='changerequest_repo_id'),
+        ),
+        migrations.AddIndex(
+            model_name='changerequest',
+            index=models.Index(fields=['success', 'repo', '-id'], name='changerequest_success_repo_id'),
+        ),
+        migrations.AddIndex(
+            model_name='changerequest',
+            index=models.Index(django.db.models.functions.text.Upper('repo'), name='changerequest_upper_repo'),
+        ),
+        migrations.AddIndex(
+            model_name='clientrequest',
+            index=models.Index(fields=['profile', '-id'], name='clientrequest_profile_id'),
+        ),
+        migrations.AddIndex(
+            model_name='clientrequest',
+            index=models.Index(django.db.models.functions.text.Upper('url'), name='clientrequest_upper_url'),
+        ),
+        migrations.AddIndex(
+            model_name='clientrequest',
+            index=models.Index(django.db.models.functions.text.Upper('code_link'), name='clientrequest_upper_code'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.0.5 on 2026-10-19 15:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changerequest',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Created'),
+        ),
+        migrations.CreateModel(
+            name='TransferAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('push', 'Push'), ('sync', 'Sync')], max_length=10, verbose_name='Kind')),
+                ('transport', models.CharField(choices=[('git', 'Git'), ('ftp', 'FTP')], max_length=10, verbose_name='Transport')),
+                ('repo', models.CharField(max_length=150, verbose_name='Repository')),
+                ('created_at', models.DateTimeField(db_index=True, verbose_name='Queued')),
+                ('started_at', models.DateTimeField(db_index=True, verbose_name='Started')),
+                ('finished_at', models.DateTimeField(db_index=True, verbose_name='Finished')),
+                ('duration', models.FloatField(verbose_name='Seconds')),
+                ('files', models.PositiveIntegerField(blank=True, null=True, verbose_name='Files')),
+                ('bytes', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Bytes')),
+                ('success', models.BooleanField(default=False, verbose_name='Succeeded')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Message')),
+                ('client_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transfer_attempt', to='accounts.clientrequest', verbose_name='Client')),
+            ],
+            options={
+                'verbose_name': 'Transfer Attempt',
+                'verbose_name_plural': 'Transfer Attempts',
+                'ordering': ('-finished_at',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='transferattempt',
+            index=models.Index(fields=['kind', 'finished_at'], name='transferattempt_kind_finished'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0.5 on 2026-10-19 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_transfer_history'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='changerequest',
+            name='repo',
+            field=models.CharField(max_length=500, verbose_name='Repository'),
+        ),
+        migrations.AlterField(
+            model_name='transferattempt',
+            name='repo',
+            field=models.CharField(max_length=500, verbose_name='Repository'),
+        ),
+    ]
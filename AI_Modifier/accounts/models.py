@@ -1,5 +1,7 @@
 from tabnanny import verbose
 from django.db import models
+from django.db.models.functions import Upper
+from django.utils import timezone
 from modifier_admin.models import Profile
 
 # Create your models here.
@@ -8,7 +10,7 @@ class ClientRequest(models.Model):
     code_link = models.TextField(verbose_name='Code')
     username = models.CharField(max_length=150, verbose_name='Username')
     token = models.CharField(max_length=200, verbose_name='Access Token')
-    version_control = models.CharField(max_length=50, verbose_name='Version Control')
+    version_control = models.CharField(max_length=50, db_index=True, verbose_name='Version Control')
     branch = models.CharField(max_length=50, null=True, blank=True, verbose_name='Branch')
     port = models.PositiveIntegerField(default=0, verbose_name='Port')
     profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='client_request')
@@ -19,17 +21,69 @@ class ClientRequest(models.Model):
     class Meta:
         verbose_name = "Request"
         verbose_name_plural = "Requests"
+        indexes = [
+            # admin changelist order, admin adds -pk to make it deterministic
+            models.Index(fields=['profile', '-id'], name='clientrequest_profile_id'),
+            # admin's exact searches compare in upper case
+            models.Index(Upper('url'), name='clientrequest_upper_url'),
+            models.Index(Upper('code_link'), name='clientrequest_upper_code'),
+        ]
     
     
 class ChangeRequest(models.Model):
     client_request = models.ForeignKey(ClientRequest, on_delete=models.CASCADE, related_name='change_request', verbose_name='Client')
-    repo = models.CharField(max_length=150, verbose_name='Repository')
+    # absolute path of the workspace, see workspace_path
+    repo = models.CharField(max_length=500, verbose_name='Repository')
     success = models.BooleanField(default=False, verbose_name='Pushed')
     error = models.TextField(default='', verbose_name='Message')
+    files = models.JSONField(default=list, blank=True, verbose_name='Files')
+    created_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name='Created')
     
     def __str__(self):
         return self.repo
     
     class Meta:
         verbose_name = "Change Request"
-        verbose_name_plural = "Change Requests"
\ No newline at end of file
+        verbose_name_plural = "Change Requests"
+        indexes = [
+            # admin changelist order, unfiltered and filtered by pushed
+            models.Index(fields=['repo', '-id'], name='changerequest_repo_id'),
+            models.Index(fields=['success', 'repo', '-id'], name='changerequest_success_repo_id'),
+            # admin's exact searches compare in upper case
+            models.Index(Upper('repo'), name='changerequest_upper_repo'),
+        ]
+
+
+class TransferAttempt(models.Model):
+    """
+    One push or sync of a workspace, kept for latency and throughput analytics.
+    """
+    KINDS = (('push', 'Push'), ('sync', 'Sync'))
+    TRANSPORTS = (('git', 'Git'), ('ftp', 'FTP'))
+
+    client_request = models.ForeignKey(ClientRequest, on_delete=models.CASCADE, related_name='transfer_attempt', verbose_name='Client')
+    kind = models.CharField(max_length=10, choices=KINDS, verbose_name='Kind')
+    transport = models.CharField(max_length=10, choices=TRANSPORTS, verbose_name='Transport')
+    # absolute path of the workspace, see workspace_path
+    repo = models.CharField(max_length=500, verbose_name='Repository')
+    # when the work was queued (oldest change request of a push), started and finished
+    created_at = models.DateTimeField(db_index=True, verbose_name='Queued')
+    started_at = models.DateTimeField(db_index=True, verbose_name='Started')
+    finished_at = models.DateTimeField(db_index=True, verbose_name='Finished')
+    duration = models.FloatField(verbose_name='Seconds')
+    files = models.PositiveIntegerField(null=True, blank=True, verbose_name='Files')
+    bytes = models.PositiveBigIntegerField(null=True, blank=True, verbose_name='Bytes')
+    success = models.BooleanField(default=False, verbose_name='Succeeded')
+    error = models.TextField(blank=True, default='', verbose_name='Message')
+
+    def __str__(self):
+        return f'{self.kind} {self.repo}'
+
+    class Meta:
+        ordering = ('-finished_at',)
+        verbose_name = "Transfer Attempt"
+        verbose_name_plural = "Transfer Attempts"
+        indexes = [
+            # dashboard reads a window of recent attempts per kind
+            models.Index(fields=['kind', 'finished_at'], name='transferattempt_kind_finished'),
+        ]
@@ -0,0 +1,67 @@
+"""
+Pagination of large admin changelists.
+
+Counting every row of a six-figure table and skipping thousands of full rows
+with OFFSET are what makes deep changelist pages slow. Unfiltered lists take
+their count from the planner's estimate on PostgreSQL, and pages first pick
+their primary keys from the index and only then load those rows.
+"""
+from django.core.paginator import Page, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Tables estimated to have fewer rows than this are counted exactly
+APPROXIMATE_COUNT_THRESHOLD = 10000
+
+
+def estimated_count(queryset):
+    """
+    Get the planner's estimate of the number of rows of the queryset's table.
+
+    : returns: estimate, or None if the database doesn't keep one
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+
+    # tables which have never been analyzed report -1
+    return int(row[0]) if row and row[0] >= 0 else None
+
+
+class LargeTablePaginator(Paginator):
+    """
+    Paginator for admin changelists of large tables.
+
+    Unfiltered querysets of big tables are counted approximately, and every page
+    is loaded by primary key after its keys are selected, so OFFSET only walks
+    the index instead of whole rows.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+
+        # filtered lists use indexed filters and are counted exactly
+        if not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None and estimate >= APPROXIMATE_COUNT_THRESHOLD:
+                return estimate
+
+        return super().count
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+
+        # keys of the page in order, then only those rows with their related objects
+        keys = list(self.object_list.values_list('pk', flat=True)[bottom:top])
+        by_key = {row.pk: row for row in self.object_list.filter(pk__in=keys)} if keys else {}
+
+        return Page([by_key[key] for key in keys if key in by_key], number, self)
@@ -0,0 +1,143 @@
+"""
+Extraction pipeline run after a workspace is synced.
+
+Every page of the workspace is parsed in a process pool and its text
+elements, image references and sibling images are stored in the shared
+table cache, so editors' clicks find them ready. How long each page took is
+recorded next to the workspace's lock; pathological pages show up in that
+report (and in the log) before an editor opens them.
+"""
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import NamedTuple
+
+import django
+from django.conf import settings
+
+from .locks import lock_path, repo_lock
+from .workspace import REPO_DIR, list_workspace
+
+# Pages taking longer than this many seconds are reported as slow
+SLOW_PAGE_SECONDS = 2
+
+# Below this many pages a process pool costs more than it saves
+MIN_PARALLEL_PAGES = 8
+
+# Workspaces being extracted in the background by this process
+_running = set()
+_running_lock = threading.Lock()
+
+
+class PageStats(NamedTuple):
+    """
+    Extraction of one page, path relative to REPO_DIR.
+    """
+    page: str
+    seconds: float
+    texts: int
+    images: int
+    error: str
+
+
+def pipeline_workers() -> int:
+    return getattr(settings, 'PIPELINE_WORKERS', max(1, (os.cpu_count() or 2) // 2))
+
+
+def extract_page(path: str, img_list: list) -> PageStats:
+    """
+    Extract text and image tables of page at 'path' into the table cache.
+    """
+    from .table_cache import image_table, text_table
+
+    started = time.perf_counter()
+
+    try:
+        texts = len(text_table(path))
+        images = len(image_table(path, img_list))
+    except Exception as e:
+        return PageStats(path, time.perf_counter() - started, 0, 0, str(e))
+
+    return PageStats(path, time.perf_counter() - started, texts, images, '')
+
+
+def run_pipeline(repo_name: str, workers: int = None) -> list:
+    """
+    Extract every page of the workspace, in parallel processes when there are enough pages.
+
+    : args: repo_name: path of the workspace
+          : workers: number of processes, defaults to PIPELINE_WORKERS
+
+    : returns: list of PageStats, slowest first
+    """
+    workers = pipeline_workers() if workers is None else workers
+
+    with repo_lock(repo_name, shared=True):
+        Html_List, img_list = list_workspace(repo_name)
+    pages = [os.path.join(REPO_DIR, page) for filename, page in Html_List]
+
+    # pages are read without holding the lock, so that edits don't wait for the whole site;
+    # a page read mid-write is cached under a content hash no complete page has
+    if workers <= 1 or len(pages) < MIN_PARALLEL_PAGES:
+        stats = [extract_page(page, img_list) for page in pages]
+    else:
+        # spawned, forking a threaded web worker isn't safe; the children set django up themselves
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=django.setup) as executor:
+            stats = list(executor.map(extract_page, pages, repeat(img_list),
+                                      chunksize=max(1, len(pages) // (workers * 4))))
+
+    stats = sorted((page._replace(page=os.path.relpath(page.page, REPO_DIR)) for page in stats), key=lambda page: -page.seconds)
+    save_report(repo_name, stats)
+
+    for page in stats:
+        if page.error:
+            print(f'Extracting {page.page} failed: {page.error}')
+        elif page.seconds > SLOW_PAGE_SECONDS:
+            print(f'Extracting {page.page} took {page.seconds:.1f}s')
+
+    return stats
+
+
+def save_report(repo_name: str, stats: list) -> None:
+    temp = lock_path(repo_name, f'pages.{os.getpid()}')
+    os.makedirs(os.path.dirname(temp), exist_ok=True)
+    with open(temp, 'w') as fp:
+        json.dump([page._asdict() for page in stats], fp)
+    os.replace(temp, lock_path(repo_name, 'pages'))
+
+
+def load_report(repo_name: str) -> list:
+    """
+    Get PageStats of the last extraction of the workspace, slowest first.
+    """
+    try:
+        with open(lock_path(repo_name, 'pages')) as fp:
+            return [PageStats(**page) for page in json.load(fp)]
+    except (OSError, ValueError, TypeError):
+        return []
+
+
+def run_in_background(repo_name: str) -> None:
+    """
+    Run the pipeline of the workspace in a background thread, unless it is already running there.
+    """
+    with _running_lock:
+        if repo_name in _running:
+            return
+        _running.add(repo_name)
+
+    def run():
+        try:
+            run_pipeline(repo_name)
+        except Exception as e:
+            print(f'Extraction pipeline of {repo_name} failed: {e}')
+        finally:
+            with _running_lock:
+                _running.discard(repo_name)
+
+    threading.Thread(target=run, name='extraction', daemon=True).start()
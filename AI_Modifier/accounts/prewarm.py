@@ -0,0 +1,61 @@
+"""
+Pre-warming of client workspaces.
+
+Meant to run from cron before editors start their day: every client's
+workspace is synced and run through the extraction pipeline, so opening a
+client finds its pages and tables hot.
+"""
+import os
+import time
+from typing import NamedTuple
+
+from .pipeline import run_pipeline
+from .workspace import sync_workspace, workspace_path
+
+
+class WarmResult(NamedTuple):
+    """
+    Outcome of pre-warming one client request.
+    """
+    url: str
+    status: str
+    pages: int
+    slowest: str
+    seconds: float
+
+
+def warm_client(pk: int) -> WarmResult:
+    """
+    Sync workspace of client request 'pk' and warm its tables.
+
+    Workspaces with local edits or pending ChangeRequests aren't synced, a
+    sync would discard the edits; their tables are warmed as they are.
+    """
+    from .eviction import local_changes
+    from .models import ClientRequest
+
+    started = time.monotonic()
+    client_request = ClientRequest.objects.get(pk=pk)
+    path = workspace_path(client_request)
+
+    try:
+        if client_request.change_request.filter(success=False).exists():
+            keep = 'pending change requests'
+        else:
+            keep = local_changes(path) if os.path.isdir(path) else ''
+
+        if keep:
+            status = f'kept: {keep}'
+        else:
+            sync_workspace(client_request, extract=False)
+            status = 'synced'
+
+        # workspaces are already warmed in parallel, their pages are extracted one after another
+        stats = run_pipeline(path, workers=1)
+
+    except Exception as e:
+        return WarmResult(client_request.url, f'failed: {e}', 0, '', time.monotonic() - started)
+
+    slowest = f'{stats[0].page} ({stats[0].seconds:.1f}s)' if stats else ''
+
+    return WarmResult(client_request.url, status, len(stats), slowest, time.monotonic() - started)
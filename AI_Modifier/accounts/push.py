@@ -0,0 +1,124 @@
+"""
+Pushing change requests to client's git remotes and FTP servers.
+"""
+import uuid
+
+from .ftp_transfer import clear_checkpoint, upload_files, uploadThis, with_session
+from .history import files_size, track
+from .lazy import lazy_import
+from .locks import repo_lock
+from .models import ChangeRequest
+from .workspace import commits_ahead, upstream_url
+
+ftplib = lazy_import('ftplib')
+git = lazy_import('git')
+
+
+def push_ftp(client_request, path, files):
+    """
+    Upload changed files of 'path' to the client's FTP server.
+    
+    Returns commit message.
+    """
+    def upload(ftp):
+        try:
+            ftp.mkd(client_request.branch)
+        except ftplib.error_perm:
+            pass
+        
+        # change to location to source
+        ftp.cwd(client_request.branch)
+        
+        # legacy change requests don't record files, so whole directory is uploaded
+        if files is None:
+            uploadThis(ftp, path)
+        else:
+            upload_files(ftp, path, files)
+    
+    # connection to the client's host is reused from earlier syncs and pushes,
+    # a retry after a dropped connection resumes the files it was uploading
+    with_session(client_request, upload)
+    clear_checkpoint(path)
+    
+    return f"AI_MODIFIER_{uuid.uuid4().hex}"
+
+
+def push_git(client_request, path, files):
+    """
+    Commit changed files of 'path' and push them to client request's branch.
+    
+    Returns commit message or None if there was nothing to push.
+    """
+    repo = git.Repo(path)
+    
+    # limit staging to changed files, legacy change requests stage the whole tree
+    pathspec = ['--', *files] if files is not None else []
+    
+    # skip empty commits and pushes
+    changed = repo.git.status('--porcelain', *pathspec)
+    if not changed and not commits_ahead(repo):
+        return None
+    
+    commit_message = f"AI_MODIFIER_{uuid.uuid4().hex}"
+    
+    if changed:
+        repo.git.add('--all', *pathspec)
+        repo.index.commit(commit_message)
+    
+    # worktree branches are private, so push explicitly to the upstream branch
+    branch = client_request.branch
+    repo.git.push(upstream_url(client_request), f'HEAD:refs/heads/{branch}')
+    repo.git.update_ref(f'refs/remotes/origin/{branch}', 'HEAD')
+    
+    return commit_message
+
+
+def push_change_requests(queryset) -> None:
+    """
+    Push pending change requests of 'queryset' and record the outcome on them.
+    
+    Change requests of the same repository and branch are pushed together, with one commit and one push.
+    """
+    
+    # Group pending change requests, every repository and branch gets one commit and one push
+    pending = {}
+    for query in queryset.select_related('client_request'):
+        if not query.success:
+            key = (query.repo, query.client_request.version_control.lower(), query.client_request.branch)
+            pending.setdefault(key, []).append(query)
+    
+    for (repo, version_control, branch), queries in pending.items():
+        
+        # union of files changed by all change requests, None if any of them didn't record files
+        files = []
+        for query in queries:
+            if not query.files:
+                files = None
+                break
+            for file in query.files:
+                if file not in files:
+                    files.append(file)
+        
+        client_request = queries[0].client_request
+        transport = 'ftp' if version_control == 'ftp' else 'git'
+        
+        try:
+            # editors can't change the workspace while it is being pushed
+            with repo_lock(repo), track(client_request, 'push', transport, repo,
+                                        min(query.created_at for query in queries)) as attempt:
+                attempt.files = len(files) if files is not None else None
+                attempt.bytes = files_size(repo, files)
+                
+                if transport == 'ftp':
+                    commit_message = push_ftp(client_request, repo, files)
+                else:
+                    commit_message = push_git(client_request, repo, files)
+            
+            success = True
+            error = f'Successfully Pushed comment: {commit_message}' if commit_message else 'Nothing to push'
+            
+        except Exception as e:
+            success = False
+            error = f'Error: {e}'
+        
+        ChangeRequest.objects.filter(pk__in=[query.pk for query in queries]).update(success=success, error=error)
@@ -0,0 +1,95 @@
+"""
+Site-wide refactoring of inline styles.
+
+A change is a (property, old value, new value) tuple, e.g.
+('color', '#333', '#1a1a1a'). Pages of a workspace are rewritten in parallel
+processes and every page is written at most once.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from bs4 import BeautifulSoup
+
+from .css import replace_value
+
+# Below this many pages a process pool costs more than it saves
+MIN_PARALLEL_PAGES = 8
+
+
+def restyle_html(html: str, changes: list) -> tuple:
+    """
+    Apply 'changes' to inline styles of an html page.
+
+    : args: html: content of the page
+          : changes: list of (property, old value, new value)
+
+    : returns: tuple of soup (None if nothing changed) and number of replaced declarations
+    """
+
+    # pages not mentioning any of the properties can't match
+    lowered = html.lower()
+    if not any(name.lower() in lowered for name, old, new in changes):
+        return None, 0
+
+    soup = BeautifulSoup(html, 'html.parser')
+    count = 0
+
+    for tag in soup.find_all(style=True):
+        style = tag['style']
+        for name, old, new in changes:
+            style, replaced = replace_value(style, name, old, new)
+            count += replaced
+        tag['style'] = style
+
+    return (soup if count else None), count
+
+
+def restyle_page(path: str, changes: list, dry_run: bool = False) -> int:
+    """
+    Apply 'changes' to the page at 'path', writing it only if something changed.
+
+    : returns: number of replaced declarations
+    """
+    with open(path) as fp:
+        soup, count = restyle_html(fp.read(), changes)
+
+    if soup is not None and not dry_run:
+        with open(path, "w") as fp:
+            fp.write(soup.prettify())
+
+    return count
+
+
+def html_pages(repo_name: str) -> list:
+    """
+    Get paths of all html pages within workspace.
+    """
+    return [os.path.join(root, filename)
+            for root, dirnames, filenames in os.walk(repo_name)
+            for filename in filenames if filename.endswith('.html')]
+
+
+def restyle_workspace(repo_name: str, changes: list, dry_run: bool = False, workers: int = None) -> dict:
+    """
+    Apply 'changes' to every page of the workspace.
+
+    : args: repo_name: path of the workspace
+          : changes: list of (property, old value, new value)
+          : dry_run: only count matching declarations, don't write anything
+          : workers: number of processes, defaults to number of CPUs
+
+    : returns: dict of changed page (relative to workspace) to number of replaced declarations
+    """
+    pages = html_pages(repo_name)
+
+    if len(pages) < MIN_PARALLEL_PAGES or workers == 1:
+        counts = [restyle_page(page, changes, dry_run) for page in pages]
+    else:
+        # spawned, forking a threaded web worker isn't safe; restyling doesn't need django
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            counts = list(executor.map(restyle_page, pages, repeat(changes), repeat(dry_run),
+                                       chunksize=max(1, len(pages) // ((workers or os.cpu_count()) * 4))))
+
+    return {os.path.relpath(page, repo_name): count for page, count in zip(pages, counts) if count}
@@ -0,0 +1,91 @@
+"""
+Import time of a worker boot, measured with python -X importtime.
+
+A fresh interpreter sets django up and loads the URLconf, as a worker does
+before serving its first request. Startup must stay within a budget and
+must not load the editor's heavy dependencies.
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import NamedTuple
+
+from django.conf import settings
+
+# Modules only the page editor needs, see accounts.lazy
+HEAVY_MODULES = ('git', 'bs4', 'PIL')
+
+# Default budget in milliseconds, overridden by settings.STARTUP_IMPORT_BUDGET
+STARTUP_IMPORT_BUDGET = 400
+
+BOOT = 'import django; django.setup(); from django.urls import get_resolver; get_resolver().url_patterns'
+
+
+def startup_budget() -> int:
+    return getattr(settings, 'STARTUP_IMPORT_BUDGET', STARTUP_IMPORT_BUDGET)
+
+
+class Import(NamedTuple):
+    """
+    A module imported at startup, times in microseconds.
+    """
+    name: str
+    self_time: int
+    cumulative: int
+    level: int
+
+
+def parse_importtime(output: str) -> list:
+    """
+    Parse stderr of python -X importtime into a list of Import.
+
+    Modules are listed after everything they import; level 0 modules are the
+    ones imported by the boot itself, their cumulative times add up to the total.
+    """
+    imports = []
+
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+
+        # nested imports are indented by two spaces per level
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append(Import(name.strip(), int(self_time), int(cumulative), level))
+
+    return imports
+
+
+def measure_startup() -> list:
+    """
+    Boot django in a fresh interpreter and measure what it imports.
+
+    : returns: list of Import
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', BOOT],
+                            cwd=Path(__file__).resolve().parent.parent,
+                            env={**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE},
+                            capture_output=True, text=True)
+
+    if result.returncode:
+        raise RuntimeError(f'Booting django failed: {result.stderr[-2000:]}')
+
+    return parse_importtime(result.stderr)
+
+
+def total_time(imports: list) -> float:
+    """
+    Get import time of the whole startup in milliseconds.
+    """
+    return sum(module.cumulative for module in imports if module.level == 0) / 1000
+
+
+def heavy_modules(imports: list) -> list:
+    """
+    Get heavy modules imported at startup, directly or by any other module.
+    """
+    names = {module.name.partition('.')[0] for module in imports}
+
+    return [name for name in HEAVY_MODULES if name in names]
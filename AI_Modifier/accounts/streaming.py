@@ -0,0 +1,218 @@
+"""
+Tree-free extraction of editable text and images.
+
+Listing a page only needs one pass over it, yet BeautifulSoup keeps the whole
+tree in memory. Here the same html.parser events BeautifulSoup builds its
+tree from are folded into a stack of open tags instead: a tag is forgotten as
+soon as it is closed, once its row (if any) is produced. Memory depends on
+nesting depth and on the rows found, not on the size of the page.
+
+BeautifulSoup's own HTMLParser subclass drives the events, so void elements,
+stray end tags, entities and whitespace are handled exactly as in the tree,
+and rows (including locators) equal those of get_all_web_elements and
+get_all_images.
+"""
+import hashlib
+from collections import Counter
+
+from bs4.builder import HTMLParserTreeBuilder
+from bs4.builder._htmlparser import BeautifulSoupHTMLParser
+
+from .extraction import content_fingerprint, editable_text, image_elements, text_element
+
+# Page is fed to the parser in chunks of this many characters
+CHUNK_SIZE = 64 * 1024
+
+# Whitespace collapsed by BeautifulSoup outside of <pre> and <textarea>
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+
+class OpenTag:
+    """
+    Tag which hasn't been closed yet.
+    """
+    __slots__ = ('name', 'attrs', 'path', 'order', 'image_index', 'tags', 'contents', 'only', 'string', 'text', 'has_text')
+
+    def __init__(self, name: str, attrs: dict, path: str, order: int, image_index: int = None):
+        self.name = name
+        self.attrs = attrs
+        self.path = path
+        # position in document order, rows are sorted by it
+        self.order = order
+        self.image_index = image_index
+        # number of child tags and of all children (tags and strings)
+        self.tags = 0
+        self.contents = 0
+        # the only child so far, a string or an OpenTag
+        self.only = None
+        self.string = None
+        # hash of the normalised text so far, see content_fingerprint
+        self.text = hashlib.sha1(f'{name}\0'.encode())
+        self.has_text = False
+
+    def fingerprint(self) -> str:
+        if self.has_text:
+            return self.text.hexdigest()[:12]
+        return content_fingerprint(self.name, '', self.attrs)
+
+    @property
+    def is_empty_element(self) -> bool:
+        return self.contents == 0 and self.name in HTMLParserTreeBuilder.empty_element_tags
+
+
+class ExtractionSink:
+    """
+    Receives the tree building calls of BeautifulSoupHTMLParser and produces rows instead of a tree.
+    """
+    original_encoding = None
+
+    def __init__(self, texts: bool = True, img_list: list = None):
+        self.texts = texts
+        self.img_list = img_list
+        self.stack = [OpenTag('[document]', {}, '', -1)]
+        self.open_tags = Counter()
+        self.preserving = 0
+        self.current_data = []
+        self.started = 0
+        self.images = 0
+        self.text_rows = []
+        self.image_rows = []
+
+    def add_child(self, child) -> None:
+        parent = self.stack[-1]
+        parent.contents += 1
+        parent.only = child
+
+    def handle_starttag(self, name, namespace, nsprefix, attrs, sourceline=None, sourcepos=None, namespaces=None):
+        self.endData()
+
+        parent = self.stack[-1]
+        path = f'{parent.path}.{parent.tags}' if parent.path else str(parent.tags)
+        parent.tags += 1
+
+        tag = OpenTag(name, attrs, path, self.started, self.images if name == 'img' else None)
+        self.started += 1
+        if name == 'img':
+            self.images += 1
+
+        self.add_child(tag)
+        self.stack.append(tag)
+        self.open_tags[name] += 1
+        if name in HTMLParserTreeBuilder.DEFAULT_PRESERVE_WHITESPACE_TAGS:
+            self.preserving += 1
+
+        return tag
+
+    def handle_endtag(self, name, nsprefix=None):
+        self.endData()
+
+        # pop up to and including the most recent open tag of that name, stray end tags are ignored
+        for i in range(len(self.stack) - 1, 0, -1):
+            if not self.open_tags.get(name):
+                break
+            found = self.stack[i].name == name
+            self.pop()
+            if found:
+                break
+
+    def handle_data(self, data):
+        self.current_data.append(data)
+
+    def endData(self, containerClass=None):
+        if not self.current_data:
+            return
+
+        data = ''.join(self.current_data)
+        self.current_data = []
+
+        # whitespace-only strings collapse to a single newline or space
+        if not self.preserving and not data.strip(ASCII_SPACES):
+            data = '\n' if '\n' in data else ' '
+
+        self.add_child(data)
+
+        # comments, doctypes and the like aren't text of the enclosing tags
+        stripped = data.strip() if containerClass is None else ''
+        if stripped:
+            for tag in self.stack[1:]:
+                tag.text.update(stripped.encode())
+                tag.has_text = True
+
+    def pop(self) -> None:
+        tag = self.stack.pop()
+        self.open_tags[tag.name] -= 1
+        if tag.name in HTMLParserTreeBuilder.DEFAULT_PRESERVE_WHITESPACE_TAGS:
+            self.preserving -= 1
+
+        # same as Tag.string: the only child string, or the string of the only child tag
+        if tag.contents == 1:
+            tag.string = tag.only if isinstance(tag.only, str) else tag.only.string
+
+        # children aren't needed anymore
+        tag.only = None
+
+        locator = None
+
+        if self.texts:
+            string = editable_text(tag.name, tag.string, tag.attrs)
+            if string is not None:
+                locator = f'{tag.path}:{tag.fingerprint()}'
+                self.text_rows.append((tag.order, text_element(tag.name, string, tag.attrs, locator)))
+
+        if self.img_list is not None and tag.image_index is not None:
+            locator = locator or f'{tag.path}:{tag.fingerprint()}'
+            try:
+                self.image_rows.extend((tag.order, element)
+                                       for element in image_elements(tag.attrs, tag.image_index, locator, self.img_list))
+            except Exception as e:
+                print(e)
+
+    def close(self) -> None:
+        self.endData()
+        while len(self.stack) > 1:
+            self.pop()
+
+
+def stream_extract(html: str, texts: bool = True, img_list: list = None) -> ExtractionSink:
+    """
+    Run 'html' through the parser without building a tree.
+
+    : args: html: content of the page
+          : texts: collect text rows
+          : img_list: list of all images within the repo, None to skip image rows
+    """
+    sink = ExtractionSink(texts, img_list)
+
+    args, kwargs = HTMLParserTreeBuilder().parser_args
+    parser = BeautifulSoupHTMLParser(*args, **kwargs)
+    parser.soup = sink
+
+    for start in range(0, len(html), CHUNK_SIZE):
+        parser.feed(html[start:start + CHUNK_SIZE])
+    parser.close()
+    sink.close()
+
+    return sink
+
+
+def stream_web_elements(html: str) -> list:
+    """
+    Same as get_all_web_elements, without building a tree.
+
+    : returns: list of TextElement found in html.
+    """
+    rows = stream_extract(html, texts=True).text_rows
+
+    # rows are produced when tags close, listing is in the order tags open
+    return [element for order, element in sorted(rows, key=lambda row: row[0])]
+
+
+def stream_images(html: str, img_list: list) -> list:
+    """
+    Same as get_all_images, without building a tree.
+
+    : returns: list of ImageElement found in html
+    """
+    rows = stream_extract(html, texts=False, img_list=img_list).image_rows
+
+    return [element for order, element in sorted(rows, key=lambda row: row[0])]
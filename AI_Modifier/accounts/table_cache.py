@@ -0,0 +1,186 @@
+"""
+On-disk cache of extracted element and image tables, shared by all workers.
+
+Tables are stored as pickled blobs in a directory, keyed by a hash of the
+page's content, the image list it was extracted against and the version of
+the extraction code. Blobs are written aside and moved in place, so
+concurrent writers never produce a torn entry; the same key always maps to
+the same value, so whichever writer wins is correct. The directory is kept
+under a size cap by removing least recently used blobs.
+
+Missing tables are extracted by the streaming parser, which never holds the
+page's tree in memory.
+"""
+import hashlib
+import os
+import pickle
+import threading
+import time
+from pathlib import Path
+
+import bs4
+from django.conf import settings
+
+from .extraction import EXTRACTION_VERSION, ImageElement, TextElement
+from .streaming import stream_images, stream_web_elements
+
+CACHE_DIR = os.path.join(Path(__file__).resolve().parent, 'table_cache')
+
+# Default size cap in bytes, overridden by settings.TABLE_CACHE_SIZE
+CACHE_SIZE = 64 * 1024 ** 2
+
+# The cache is pruned after this many writes of a process
+PRUNE_INTERVAL = 100
+
+# Blobs being written end in this, prune leaves them to their writer unless they are this old (seconds)
+TEMP_SUFFIX = '.tmp'
+STALE_TEMP = 3600
+
+_writes = 0
+_writes_lock = threading.Lock()
+
+
+def cache_key(kind: str, content: bytes, *extra: str) -> str:
+    """
+    Hash everything an extracted table depends on.
+    """
+    digest = hashlib.sha256(f'{kind}\0{EXTRACTION_VERSION}\0{bs4.__version__}\0'.encode())
+    for value in extra:
+        digest.update(value.encode())
+        digest.update(b'\0')
+    digest.update(content)
+
+    return digest.hexdigest()
+
+
+def blob_path(key: str) -> str:
+    # fanned out so that no directory gets too large
+    return os.path.join(CACHE_DIR, key[:2], key[2:])
+
+
+def cache_get(key: str):
+    """
+    Get cached value of 'key', None if it isn't cached.
+    """
+    path = blob_path(key)
+    try:
+        with open(path, 'rb') as fp:
+            value = pickle.load(fp)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+    # hits keep the blob from being pruned
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+    return value
+
+
+def cache_put(key: str, value) -> None:
+    """
+    Store 'value' under 'key', pruning the cache every PRUNE_INTERVAL writes.
+    """
+    global _writes
+
+    path = blob_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    temp = f'{path}.{os.getpid()}.{threading.get_ident()}{TEMP_SUFFIX}'
+    with open(temp, 'wb') as fp:
+        pickle.dump(value, fp, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp, path)
+
+    with _writes_lock:
+        _writes += 1
+        prune = _writes % PRUNE_INTERVAL == 0
+
+    if prune:
+        prune_cache()
+
+
+def prune_cache(max_size: int = None) -> int:
+    """
+    Remove least recently used blobs until the cache fits into 'max_size' bytes.
+
+    : returns: number of removed blobs
+    """
+    max_size = getattr(settings, 'TABLE_CACHE_SIZE', CACHE_SIZE) if max_size is None else max_size
+
+    blobs = []
+    now = time.time()
+    for root, dirnames, filenames in os.walk(CACHE_DIR):
+        for filename in filenames:
+            try:
+                stat = os.stat(os.path.join(root, filename))
+            except OSError:
+                continue
+
+            # another writer is about to move it in place; leftovers of crashed writers go
+            if filename.endswith(TEMP_SUFFIX) and now - stat.st_mtime < STALE_TEMP:
+                continue
+
+            blobs.append((stat.st_mtime, stat.st_size, os.path.join(root, filename)))
+
+    used = sum(size for mtime, size, path in blobs)
+    removed = 0
+
+    for mtime, size, path in sorted(blobs):
+        if used <= max_size:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            # removed by another worker already
+            pass
+        used -= size
+
+    return removed
+
+
+def read_page(path: str) -> bytes:
+    with open(path, 'rb') as fp:
+        return fp.read()
+
+
+def decode_page(content: bytes) -> str:
+    """
+    Decode a page, guessing the encoding of pages which aren't utf-8 (declared charset first).
+    """
+    try:
+        return content.decode()
+    except UnicodeDecodeError:
+        return bs4.UnicodeDammit(content, is_html=True).unicode_markup or content.decode(errors='replace')
+
+
+def text_table(path: str) -> list:
+    """
+    Get TextElements of the page at 'path', extracting them only if the page isn't cached.
+    """
+    content = read_page(path)
+    key = cache_key('text', content)
+
+    rows = cache_get(key)
+    if rows is None:
+        rows = [tuple(element) for element in stream_web_elements(decode_page(content))]
+        cache_put(key, rows)
+
+    return [TextElement(*row) for row in rows]
+
+
+def image_table(path: str, img_list: list) -> list:
+    """
+    Get ImageElements of the page at 'path', extracting them only if the page and images aren't cached.
+    """
+    content = read_page(path)
+    # rows list available images in the order of 'img_list', so order is part of the key
+    key = cache_key('images', content, *img_list)
+
+    rows = cache_get(key)
+    if rows is None:
+        rows = [tuple(element) for element in stream_images(decode_page(content), img_list)]
+        cache_put(key, rows)
+
+    return [ImageElement(*row) for row in rows]
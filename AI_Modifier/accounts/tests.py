@@ -1,3 +1,1575 @@
-from django.test import TestCase
+import contextlib
+import ftplib
+import glob
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import git
+from bs4 import BeautifulSoup
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.assets import build_index, load_index, replace_image, unreferenced_images
+from accounts.css import parse_declarations, replace_value, set_declarations
+from accounts.batch import apply_edits, load_spec
+from accounts.image_meta import build_image_index, image_metadata, scaled_size, with_metadata
+from accounts.export import changed_files
+from accounts.history import latency_report, percentile
+from accounts.eviction import evict_workspaces, list_workspaces, local_changes, remove_workspace, touch_workspace
+from accounts import ftp_pool
+from accounts.ftp_lazy import fetch_page, lazy_listing
+from accounts.ftp_transfer import download_file, upload_files, with_session
+from accounts import image_meta
+from accounts.extraction import (ImageElement, LocatorConflict, TextElement, find_by_locator, fingerprint,
+                                 get_all_images, get_all_web_elements, walk)
+from accounts.locks import bump_generation, generation, lock_path, remove_lock_files, repo_lock, single_flight
+from accounts import pipeline
+from accounts.pipeline import load_report, run_pipeline
+from accounts.models import ClientRequest, ChangeRequest, TransferAttempt
+from accounts.push import push_change_requests, push_git
+from accounts.restyle import restyle_workspace
+from accounts import streaming
+from accounts.streaming import stream_images, stream_web_elements
+from accounts.startup import heavy_modules, measure_startup
+from accounts.table_cache import blob_path, cache_get, cache_put, image_table, prune_cache, text_table
+from accounts.workspace import (legacy_workspace_path, list_workspace, mirror_path, sync_git, sync_locked, sync_mirror,
+                                sync_workspace, workspace_path)
+from modifier_admin.models import Profile, OutgoingEmail
+
+
+def create_profile(email, **fields):
+    # bulk_create skips the signals which generate passwords and send emails
+    profile, = Profile.objects.bulk_create([Profile(email=email, name=email.split('@')[0], auto_generated=True, **fields)])
+    return profile
+
+
+def create_client_requests(profile, count, start=0):
+    return ClientRequest.objects.bulk_create([
+        ClientRequest(url=f'https://site{i}.example.com', code_link=f'https://git.example.com/site{i}.git',
+                      username='user', token='token', version_control='git', branch='main', profile=profile)
+        for i in range(start, start + count)
+    ])
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Every view declares how many queries it may run, growing data must not change that number.
+    """
+
+    def assertQueryBudget(self, budget, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = func(*args, **kwargs)
+
+        self.assertLessEqual(len(queries), budget,
+                             f'{len(queries)} queries exceed budget of {budget}:\n' + '\n'.join(query['sql'] for query in queries))
+
+        return response
+
+    def assertQueryBudgetScales(self, budget, func, grow, sizes=(1, 25)):
+        # run the view with small and large data, both have to stay within budget
+        created = 0
+        for size in sizes:
+            grow(created, size - created)
+            created = size
+            self.assertQueryBudget(budget, func)
+
+
+class IndexQueryTest(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.profile = create_profile('client@example.com')
+        self.client.force_login(self.profile)
+
+    def test_index(self):
+        # session, user and urls
+        self.assertQueryBudgetScales(3,
+                                     lambda: self.client.get(reverse('index')),
+                                     lambda start, count: create_client_requests(self.profile, count, start))
+
+    def test_index_lists_urls(self):
+        create_client_requests(self.profile, 2)
+        response = self.client.get(reverse('index'))
+        self.assertEqual(sorted(response.context['urls']), ['https://site0.example.com', 'https://site1.example.com'])
+
+
+class AddRequestQueryTest(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.profile = create_profile('client@example.com')
+        self.client.force_login(self.profile)
+        self.data = {'url': 'https://site.example.com', 'link': 'https://git.example.com/site.git', 'username': 'user',
+                     'token': 'token', 'version_control': 'git', 'branch': 'main', 'port': 0, 'email': self.profile.email}
+
+    def test_create(self):
+        # session, user, update and insert (savepoint statements are logged by some backends)
+        self.assertQueryBudget(6, self.client.post, reverse('add_request'), self.data)
+        self.assertEqual(ClientRequest.objects.get(url=self.data['url']).profile, self.profile)
+
+    def test_update(self):
+        # session, user and update (savepoint statements are logged by some backends)
+        self.client.post(reverse('add_request'), self.data)
+        self.assertQueryBudget(5, self.client.post, reverse('add_request'), {**self.data, 'branch': 'dev'})
+        self.assertEqual(ClientRequest.objects.get(url=self.data['url']).branch, 'dev')
+
+    def test_unknown_profile(self):
+        response = self.client.post(reverse('add_request'), {**self.data, 'email': 'nobody@example.com'})
+        self.assertEqual(response.context['message'], 'Could not add request. Try Again!')
+        self.assertFalse(ClientRequest.objects.exists())
+
+
+class AdminQueryTest(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.admin = create_profile('admin@example.com', is_staff=True, is_superuser=True)
+        self.profile = create_profile('client@example.com')
+        self.client.force_login(self.admin)
+
+    def grow_change_requests(self, start, count):
+        ChangeRequest.objects.bulk_create([
+            ChangeRequest(client_request=client_request, repo=client_request.code_link)
+            for client_request in create_client_requests(self.profile, count, start)
+        ])
+
+    def test_client_request_changelist(self):
+        self.assertQueryBudgetScales(8,
+                                     lambda: self.client.get(reverse('admin:accounts_clientrequest_changelist')),
+                                     lambda start, count: create_client_requests(self.profile, count, start))
+
+    def test_change_request_changelist(self):
+        self.assertQueryBudgetScales(6,
+                                     lambda: self.client.get(reverse('admin:accounts_changerequest_changelist')),
+                                     self.grow_change_requests)
+
+    def test_change_request_changelist_filtered_by_client(self):
+        self.grow_change_requests(0, 3)
+        client_request = ClientRequest.objects.order_by('pk').first()
+
+        response = self.assertQueryBudget(7, self.client.get, reverse('admin:accounts_changerequest_changelist'),
+                                          {'client_request': client_request.pk, 'success__exact': 0, 'q': client_request.url})
+        self.assertEqual([change_request.client_request for change_request in response.context['cl'].result_list],
+                         [client_request])
+
+    def test_large_tables_are_counted_approximately(self):
+        self.grow_change_requests(0, 3)
+        url = reverse('admin:accounts_changerequest_changelist')
+
+        with mock.patch('accounts.pagination.estimated_count', return_value=500000):
+            cl = self.client.get(url).context['cl']
+            self.assertEqual((cl.result_count, len(cl.result_list)), (500000, 3))
+
+            # filtered lists are counted exactly
+            self.assertEqual(self.client.get(url, {'success__exact': 0}).context['cl'].result_count, 3)
+
+
+class ImportClientsTest(TestCase):
+
+    def import_clients(self, clients, suffix='.json', **options):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as fp:
+            if suffix == '.json':
+                json.dump(clients, fp)
+            else:
+                fp.write(clients)
+        self.addCleanup(os.remove, fp.name)
+
+        call_command('import_clients', fp.name, workers=2, stdout=StringIO(), **options)
+
+    def test_import_json(self):
+        clients = [
+            {'email': 'one@example.com', 'name': 'One', 'requests': [
+                {'url': 'https://one.example.com', 'code_link': 'https://git.example.com/one.git', 'username': 'one',
+                 'token': 'token', 'version_control': 'git', 'branch': 'main'},
+                {'url': 'https://ftp.one.example.com', 'code_link': 'ftp.one.example.com', 'username': 'one',
+                 'token': 'token', 'version_control': 'ftp', 'branch': '/public_html', 'port': 21},
+            ]},
+            {'email': 'two@example.com', 'name': 'Two'},
+        ]
+        self.import_clients(clients)
+
+        one = Profile.objects.get(email='one@example.com')
+        self.assertTrue(one.auto_generated)
+        self.assertTrue(one.has_usable_password())
+        self.assertEqual(sorted(one.client_request.values_list('url', flat=True)),
+                         ['https://ftp.one.example.com', 'https://one.example.com'])
+        self.assertEqual(sorted(OutgoingEmail.objects.values_list('to', flat=True)), ['one@example.com', 'two@example.com'])
+
+        # welcome emails are left to the outbox
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutgoingEmail.objects.filter(sent_at__isnull=True).count(), 2)
+
+        # importing again doesn't duplicate anything
+        self.import_clients(clients)
+        self.assertEqual(Profile.objects.count(), 2)
+        self.assertEqual(ClientRequest.objects.count(), 2)
+        self.assertEqual(OutgoingEmail.objects.count(), 2)
+
+    def test_send_only_imported_emails(self):
+        OutgoingEmail.objects.create(to='other@example.com', subject='Other', body='Other')
+        self.import_clients([{'email': 'one@example.com', 'name': 'One'}], send=True)
+
+        self.assertEqual([message.to for message in mail.outbox], [['one@example.com']])
+        self.assertEqual(list(OutgoingEmail.objects.filter(sent_at__isnull=True).values_list('to', flat=True)),
+                         ['other@example.com'])
+
+    def test_import_csv(self):
+        self.import_clients('email,name,url,code_link,username,token,version_control,branch,port\n'
+                            'one@example.com,One,https://one.example.com,https://git.example.com/one.git,one,token,git,main,0\n'
+                            'one@example.com,One,https://two.example.com,https://git.example.com/two.git,one,token,git,main,0\n',
+                            suffix='.csv')
+
+        self.assertEqual(Profile.objects.get().client_request.count(), 2)
+
+
+class LocatorTest(SimpleTestCase):
+
+    html = ('<html><head><title>Site</title></head><body>'
+            '<div><p style="color:#333;font-size:14px">First</p><p>Second</p></div>'
+            '<footer><span>2022</span></footer></body></html>')
+
+    def test_locator_survives_other_edits(self):
+        soup = BeautifulSoup(self.html, 'html.parser')
+        elements = get_all_web_elements(soup)
+        first, second = [element for element in elements if element.tag == 'p']
+        year, = [element for element in elements if element.tag == 'span']
+        self.assertEqual((first.text, first.size, first.color), ('First', '14', '#333'))
+
+        # another element is edited and the page re-formatted
+        find_by_locator(soup, first.locator).string = 'Changed'
+        soup = BeautifulSoup(soup.prettify(), 'html.parser')
+
+        self.assertEqual(find_by_locator(soup, year.locator).string.strip(), '2022')
+        self.assertEqual(find_by_locator(soup, second.locator).string.strip(), 'Second')
+
+    def test_locators_survive_prettify(self):
+        soup = BeautifulSoup('<html><body><p><b>x</b><!-- note --></p></body></html>', 'html.parser')
+        locators = [f'{path}:{fingerprint(tag)}' for tag, path in walk(soup)]
+
+        soup = BeautifulSoup(soup.prettify(), 'html.parser')
+        self.assertEqual([find_by_locator(soup, locator).name for locator in locators], ['html', 'body', 'p', 'b'])
+
+        # streaming extraction finds the same locators
+        self.assertEqual([element.locator for element in stream_web_elements(str(soup))],
+                         [element.locator for element in get_all_web_elements(soup)])
+
+    def test_changed_element_conflicts(self):
+        soup = BeautifulSoup(self.html, 'html.parser')
+        first = get_all_web_elements(soup)[1]
+
+        find_by_locator(soup, first.locator).string = 'Changed'
+        with self.assertRaises(LocatorConflict):
+            find_by_locator(soup, first.locator)
+
+        soup.footer.decompose()
+        with self.assertRaises(LocatorConflict):
+            find_by_locator(soup, get_all_web_elements(BeautifulSoup(self.html, 'html.parser'))[-1].locator)
+
+
+class TextElementTest(SimpleTestCase):
+
+    def test_records_use_own_style(self):
+        html = ('<div style="color:red"><p style="font-size:1.5em">Em</p></div>'
+                '<p style="font-size: 12px ; color:#111">Px</p>'
+                '<span><b style="color:blue;font-size:20px">Inner</b></span>')
+        elements = get_all_web_elements(BeautifulSoup(html, 'html.parser'))
+
+        # tag, text, px size, color; nothing is read from parents or from the serialised subtree
+        self.assertEqual([tuple(element[:4]) for element in elements], [('div', 'Em', '', 'red'),
+                                                                        ('p', 'Em', '', ''),
+                                                                        ('p', 'Px', '12', '#111'),
+                                                                        ('span', 'Inner', '', ''),
+                                                                        ('b', 'Inner', '20', 'blue')])
+        self.assertTrue(all(isinstance(element, TextElement) for element in elements))
+        self.assertEqual(stream_web_elements(html), elements)
+
+
+class RestyleTest(SimpleTestCase):
+
+    def test_declarations_round_trip(self):
+        style = 'COLOR: #333 !important; background:url(data:image/png;base64,AA==); font-family:"a;b"'
+        self.assertEqual(parse_declarations(style), [('color', '#333', True),
+                                                     ('background', 'url(data:image/png;base64,AA==)', False),
+                                                     ('font-family', '"a;b"', False)])
+        self.assertEqual(set_declarations(style, {'color': 'red', 'font-size': '16px'}),
+                         'color:red !important;background:url(data:image/png;base64,AA==);font-family:"a;b";font-size:16px;')
+
+    def test_replace_value(self):
+        self.assertEqual(replace_value('color:#333333;border-color:#333', 'color', '#333', '#1a1a1a'),
+                         ('color:#1a1a1a;border-color:#333;', 1))
+        self.assertEqual(replace_value('color: red', 'color', '#333', '#1a1a1a'), ('color: red', 0))
+
+    def test_restyle_workspace(self):
+        repo_name = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, repo_name)
+        os.makedirs(os.path.join(repo_name, 'blog'))
+        pages = {'index.html': '<p style="color:#333">One</p><p style="color:#333;font-size:14px">Two</p>',
+                 'blog/post.html': '<p style="color:#333333">Three</p>',
+                 'about.html': '<p style="color:red">Four</p>'}
+        for page, html in pages.items():
+            with open(os.path.join(repo_name, page), 'w') as fp:
+                fp.write(html)
+
+        changes = [('color', '#333', '#1a1a1a')]
+        expected = {'index.html': 2, os.path.join('blog', 'post.html'): 1}
+        self.assertEqual(restyle_workspace(repo_name, changes, dry_run=True), expected)
+        with open(os.path.join(repo_name, 'index.html')) as fp:
+            self.assertEqual(fp.read(), pages['index.html'])
+
+        # same result from spawned processes
+        with mock.patch('accounts.restyle.MIN_PARALLEL_PAGES', 1):
+            self.assertEqual(restyle_workspace(repo_name, changes, dry_run=True, workers=2), expected)
+
+        self.assertEqual(restyle_workspace(repo_name, changes, workers=2), expected)
+        self.assertEqual(restyle_workspace(repo_name, changes, dry_run=True), {})
+        with open(os.path.join(repo_name, 'about.html')) as fp:
+            self.assertEqual(fp.read(), pages['about.html'])
+
+
+class AssetIndexTest(SimpleTestCase):
+
+    def setUp(self):
+        self.repo_name = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.repo_name)
+        self.addCleanup(os.remove, lock_path(self.repo_name, 'assets'))
+        self.addCleanup(os.remove, lock_path(self.repo_name, 'images'))
+
+        os.makedirs(os.path.join(self.repo_name, 'blog'))
+        os.makedirs(os.path.join(self.repo_name, 'img'))
+        files = {'index.html': '<img src="img/logo.png"><img src="https://cdn.example.com/x.png">',
+                 'blog/post.html': '<img src="../img/logo.png"><img src="/img/photo.jpg">',
+                 'about.html': '<p>About</p>',
+                 'img/logo.png': '', 'img/logo-new.png': '', 'img/photo.jpg': '', 'img/unused.jpg': ''}
+        for name, content in files.items():
+            with open(os.path.join(self.repo_name, name), 'w') as fp:
+                fp.write(content)
+
+        build_index(self.repo_name)
+
+    def read(self, page):
+        with open(os.path.join(self.repo_name, page)) as fp:
+            return BeautifulSoup(fp, 'html.parser')
+
+    def test_unreferenced_images(self):
+        self.assertEqual(unreferenced_images(self.repo_name), ['img/logo-new.png', 'img/unused.jpg'])
+
+    def test_replace_image_everywhere(self):
+        self.assertEqual(replace_image(self.repo_name, 'img/logo.png', 'img/logo-new.png', dry_run=True),
+                         {'index.html': 1, 'blog/post.html': 1})
+        self.assertEqual(self.read('index.html').img['src'], 'img/logo.png')
+
+        replace_image(self.repo_name, 'img/logo.png', 'img/logo-new.png')
+        self.assertEqual(self.read('index.html').img['src'], 'img/logo-new.png')
+        self.assertEqual(self.read('blog/post.html').img['src'], '../img/logo-new.png')
+
+        # index is updated with the edited pages
+        self.assertEqual(unreferenced_images(self.repo_name), ['img/logo.png', 'img/unused.jpg'])
+
+    def test_readers_dont_save_index(self):
+        os.remove(lock_path(self.repo_name, 'assets'))
+
+        # listing only holds the reader lock, the index is built but not written
+        self.assertEqual(unreferenced_images(self.repo_name), ['img/logo-new.png', 'img/unused.jpg'])
+        self.assertFalse(os.path.exists(lock_path(self.repo_name, 'assets')))
+
+        load_index(self.repo_name)
+        self.assertTrue(os.path.exists(lock_path(self.repo_name, 'assets')))
+
+
+def try_lock(path, shared):
+    # run in a forked process, exit code tells whether the lock was free
+    try:
+        with repo_lock(path, shared=shared, blocking=False):
+            pass
+    except BlockingIOError:
+        os._exit(1)
+    os._exit(0)
+
+
+class LocksTest(SimpleTestCase):
+
+    def setUp(self):
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir)
+        patcher = mock.patch('accounts.locks.LOCK_DIR', lock_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.path = os.path.join(lock_dir, 'site')
+
+    def free_in_other_process(self, shared):
+        process = multiprocessing.get_context('fork').Process(target=try_lock, args=(self.path, shared))
+        process.start()
+        process.join()
+        return process.exitcode == 0
+
+    def free_in_other_thread(self):
+        free = []
+
+        def attempt():
+            try:
+                with repo_lock(self.path, blocking=False):
+                    free.append(True)
+            except BlockingIOError:
+                free.append(False)
+
+        thread = threading.Thread(target=attempt)
+        thread.start()
+        thread.join()
+        return free[0]
+
+    def test_readers_share_and_writers_exclude_across_processes(self):
+        with repo_lock(self.path, shared=True):
+            self.assertTrue(self.free_in_other_process(shared=True))
+            self.assertFalse(self.free_in_other_process(shared=False))
+
+        with repo_lock(self.path):
+            self.assertFalse(self.free_in_other_process(shared=True))
+
+        self.assertTrue(self.free_in_other_process(shared=False))
+
+    def test_nested_locks(self):
+        with repo_lock(self.path):
+            with repo_lock(self.path), repo_lock(self.path, shared=True):
+                pass
+
+            # other threads still wait for it
+            self.assertFalse(self.free_in_other_thread())
+
+        # a reader can't become a writer
+        with repo_lock(self.path, shared=True):
+            with self.assertRaises(RuntimeError):
+                with repo_lock(self.path):
+                    pass
+
+        self.assertTrue(self.free_in_other_process(shared=False))
+
+    def test_lock_removed_while_waiting(self):
+        acquired, release = threading.Event(), threading.Event()
+
+        def hold():
+            with repo_lock(self.path):
+                acquired.set()
+                release.wait()
+
+        with repo_lock(self.path):
+            thread = threading.Thread(target=hold)
+            thread.start()
+            time.sleep(0.1)
+
+            # evicted meanwhile, the waiting thread locks the new lock file others open
+            remove_lock_files(self.path)
+
+        acquired.wait()
+        self.assertFalse(self.free_in_other_process(shared=False))
+        release.set()
+        thread.join()
+
+    def test_concurrent_calls_share_one_run(self):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def sync():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return 'synced'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(single_flight(('sync', self.path), sync)))
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=lambda: results.append(single_flight(('sync', self.path), sync)))
+        follower.start()
+        release.set()
+        leader.join()
+        follower.join()
+
+        self.assertEqual((calls, results), ([1], ['synced', 'synced']))
+
+        # a later call runs again
+        self.assertEqual(single_flight(('sync', self.path), sync), 'synced')
+        self.assertEqual(len(calls), 2)
+
+    def test_sync_done_while_waiting_is_skipped(self):
+        client_request = ClientRequest(pk=1, code_link='ftp.example.com', version_control='ftp', branch='/site')
+        waiting = threading.Event()
+        os.makedirs(self.path)
+
+        def read_generation(path):
+            value = generation(path)
+            waiting.set()
+            return value
+
+        with mock.patch('accounts.workspace.generation', side_effect=read_generation), \
+                mock.patch('accounts.workspace.sync_ftp') as sync:
+            with repo_lock(self.path):
+                thread = threading.Thread(target=sync_locked, args=(client_request, self.path))
+                thread.start()
+                waiting.wait()
+
+                # another worker finishes a sync meanwhile
+                bump_generation(self.path)
+
+            thread.join()
+
+        self.assertFalse(sync.called)
+        self.assertEqual(generation(self.path), 1)
+
+
+class GitWorkspaceTest(TestCase):
+
+    def setUp(self):
+        repo_dir, mirror_dir, lock_dir, upstream_dir = (tempfile.mkdtemp() for i in range(4))
+        for directory in (repo_dir, mirror_dir, lock_dir, upstream_dir):
+            self.addCleanup(shutil.rmtree, directory)
+        for target, value in (('accounts.workspace.REPO_DIR', repo_dir), ('accounts.workspace.MIRROR_DIR', mirror_dir),
+                              ('accounts.locks.LOCK_DIR', lock_dir)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.mirror_dir = mirror_dir
+
+        # bare upstream with one page on main, changed through a clone of it
+        self.upstream = os.path.join(upstream_dir, 'site.git')
+        git.Repo.init(self.upstream, bare=True, mkdir=True)
+        self.clone = git.Repo.init(os.path.join(upstream_dir, 'clone'), mkdir=True)
+        self.clone.create_remote('origin', self.upstream)
+        self.commit('<p>First</p>')
+
+        # the same upstream, written differently
+        profile = create_profile('client@example.com')
+        self.client_requests = ClientRequest.objects.bulk_create([
+            ClientRequest(url=f'https://site{i}.example.com', code_link=code_link, username='user', token='token',
+                          version_control='git', branch='main', profile=profile)
+            for i, code_link in enumerate((self.upstream, f'{self.upstream}/'))
+        ])
+
+    def commit(self, content):
+        with open(os.path.join(self.clone.working_dir, 'index.html'), 'w') as fp:
+            fp.write(content)
+        self.clone.index.add(['index.html'])
+        author = git.Actor('Upstream', 'upstream@example.com')
+        self.clone.index.commit(content, author=author, committer=author)
+        self.clone.git.push('origin', 'HEAD:refs/heads/main')
+
+    def read(self, path):
+        with open(os.path.join(path, 'index.html')) as fp:
+            return fp.read()
+
+    def test_worktrees_share_one_mirror(self):
+        paths = [sync_workspace(client_request, extract=False) for client_request in self.client_requests]
+
+        self.assertEqual(len(os.listdir(self.mirror_dir)), 1)
+        for client_request, path in zip(self.client_requests, paths):
+            repo = git.Repo(path)
+            self.assertEqual(os.path.dirname(os.path.abspath(repo.common_dir)), self.mirror_dir)
+            self.assertEqual(repo.active_branch.name, f'ai_modifier/{client_request.pk}-main')
+            self.assertEqual(self.read(path), '<p>First</p>')
+
+    def test_upstream_changes_and_deleted_worktrees(self):
+        path = sync_workspace(self.client_requests[0], extract=False)
+
+        self.commit('<p>Second</p>')
+        sync_workspace(self.client_requests[0], extract=False)
+        self.assertEqual(self.read(path), '<p>Second</p>')
+
+        # worktree deleted behind git's back is added again
+        shutil.rmtree(path)
+        sync_workspace(self.client_requests[0], extract=False)
+        self.assertEqual(self.read(path), '<p>Second</p>')
+        self.assertEqual(git.Repo(path).active_branch.name, f'ai_modifier/{self.client_requests[0].pk}-main')
+
+    def test_branch_change_gets_its_own_worktree(self):
+        client_request = self.client_requests[0]
+        old = sync_workspace(client_request, extract=False)
+
+        self.clone.git.push('origin', 'HEAD:refs/heads/staging')
+        client_request.branch = 'staging'
+        client_request.save()
+
+        # worktree of the previous branch is still registered with the mirror
+        new = sync_workspace(client_request, extract=False)
+        self.assertNotEqual(new, old)
+        self.assertEqual(git.Repo(new).active_branch.name, f'ai_modifier/{client_request.pk}-staging')
+        self.assertEqual(git.Repo(old).active_branch.name, f'ai_modifier/{client_request.pk}-main')
+        self.assertEqual(self.read(new), '<p>First</p>')
+
+    def test_mirror_is_removed_with_its_last_worktree(self):
+        paths = [sync_workspace(client_request, extract=False) for client_request in self.client_requests]
+        mirror = mirror_path(self.upstream)
+
+        with repo_lock(paths[0]):
+            remove_workspace(paths[0])
+        self.assertTrue(os.path.exists(mirror))
+
+        with repo_lock(paths[1]):
+            remove_workspace(paths[1])
+        self.assertFalse(os.path.exists(mirror))
+        self.assertEqual(glob.glob(lock_path(mirror, '*')), [])
+
+        # cloned again by the next sync
+        sync_workspace(self.client_requests[0], extract=False)
+        self.assertEqual(self.read(paths[0]), '<p>First</p>')
+
+    def test_fetch_is_skipped_when_mirror_was_fetched_meanwhile(self):
+        sync_workspace(self.client_requests[0], extract=False)
+        mirror = mirror_path(self.upstream)
+        waiting = threading.Event()
+
+        def read_generation(path):
+            value = generation(path)
+            waiting.set()
+            return value
+
+        path = workspace_path(self.client_requests[1])
+        with mock.patch('accounts.workspace.generation', side_effect=read_generation), \
+                mock.patch('accounts.workspace.sync_mirror', wraps=sync_mirror) as sync:
+            with repo_lock(mirror):
+                thread = threading.Thread(target=sync_git, args=(self.client_requests[1], path))
+                thread.start()
+                waiting.wait()
+
+                # another workspace fetches the mirror meanwhile
+                bump_generation(mirror)
+
+            thread.join()
+
+        self.assertEqual(sync.call_args.kwargs, {'fetch': False})
+        self.assertEqual(self.read(path), '<p>First</p>')
+
+    def write(self, path, files):
+        for name, content in files.items():
+            with open(os.path.join(path, name), 'w') as fp:
+                fp.write(content)
+
+    def upstream_files(self):
+        return git.Repo(self.upstream).git.ls_tree('--name-only', 'main').splitlines()
+
+    def test_push_stages_only_recorded_files(self):
+        path = sync_workspace(self.client_requests[0], extract=False)
+        self.write(path, {'index.html': '<p>Edited</p>', 'draft.html': '<p>Draft</p>'})
+
+        ChangeRequest.objects.create(client_request=self.client_requests[0], repo=path, files=['index.html'])
+        push_change_requests(ChangeRequest.objects.all())
+
+        self.assertTrue(ChangeRequest.objects.get().success)
+        self.assertEqual(git.Repo(self.upstream).git.show('main:index.html'), '<p>Edited</p>')
+        self.assertEqual(self.upstream_files(), ['index.html'])
+        self.assertEqual(git.Repo(path).untracked_files, ['draft.html'])
+
+    def test_nothing_to_push(self):
+        path = sync_workspace(self.client_requests[0], extract=False)
+        head = git.Repo(self.upstream).commit('main')
+
+        ChangeRequest.objects.create(client_request=self.client_requests[0], repo=path, files=['index.html'])
+        push_change_requests(ChangeRequest.objects.all())
+
+        self.assertEqual(ChangeRequest.objects.get().error, 'Nothing to push')
+        self.assertEqual(git.Repo(self.upstream).commit('main'), head)
+
+    def test_pending_change_requests_are_pushed_together(self):
+        path = sync_workspace(self.client_requests[0], extract=False)
+        self.write(path, {'index.html': '<p>Edited</p>', 'about.html': '<p>About</p>'})
+        head = git.Repo(self.upstream).commit('main')
+
+        for files in (['index.html'], ['about.html', 'index.html']):
+            ChangeRequest.objects.create(client_request=self.client_requests[0], repo=path, files=files)
+        with mock.patch('accounts.push.push_git', wraps=push_git) as push:
+            push_change_requests(ChangeRequest.objects.all())
+
+        self.assertEqual(push.call_count, 1)
+        self.assertEqual(push.call_args.args[2], ['index.html', 'about.html'])
+        self.assertEqual(list(ChangeRequest.objects.values_list('success', flat=True)), [True, True])
+
+        # one commit on top of what was there
+        commit = git.Repo(self.upstream).commit('main')
+        self.assertEqual(commit.parents, (head,))
+        self.assertEqual(sorted(commit.stats.files), ['about.html', 'index.html'])
+
+
+class EvictionTest(TestCase):
+
+    def setUp(self):
+        repo_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, repo_dir)
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir)
+        for target, value in (('accounts.workspace.REPO_DIR', repo_dir), ('accounts.locks.LOCK_DIR', lock_dir)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        profile = create_profile('client@example.com')
+        self.client_requests = ClientRequest.objects.bulk_create([
+            ClientRequest(url=f'https://site{i}.example.com', code_link='ftp.example.com', username='user', token='token',
+                          version_control='ftp', branch=f'/site{i}', port=21, profile=profile)
+            for i in range(3)
+        ])
+
+        # workspaces of 1000 bytes each, used in order
+        self.paths = [workspace_path(client_request) for client_request in self.client_requests]
+        for accessed, path in enumerate(self.paths):
+            os.makedirs(path)
+            with open(os.path.join(path, 'index.html'), 'w') as fp:
+                fp.write('x' * 1000)
+            touch_workspace(path)
+            os.utime(lock_path(path, 'access'), (accessed, accessed))
+
+    def test_evicts_least_recently_used(self):
+        self.assertEqual([workspace.size for workspace in list_workspaces()], [1000, 1000, 1000])
+
+        evicted = evict_workspaces(budget=1500)
+        self.assertEqual([workspace.path for workspace in evicted], self.paths[:2])
+        self.assertEqual([os.path.exists(path) for path in self.paths], [False, False, True])
+
+    def test_removes_files_next_to_lock(self):
+        for path in self.paths:
+            bump_generation(path)
+            with open(lock_path(path, 'listing'), 'w') as fp:
+                fp.write('{}')
+
+        evict_workspaces(budget=1500)
+        self.assertEqual([len(glob.glob(lock_path(path, '*'))) for path in self.paths], [0, 0, 3])
+
+    def test_keeps_pending_workspaces(self):
+        ChangeRequest.objects.create(client_request=self.client_requests[0], repo=self.paths[0], files=['index.html'])
+
+        evicted = evict_workspaces(budget=1500)
+        self.assertEqual([workspace.path for workspace in evicted], self.paths[1:])
+        self.assertTrue(os.path.exists(self.paths[0]))
+
+
+class WorkspaceLayoutTest(TestCase):
+
+    def setUp(self):
+        repo_dir, lock_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+        for directory in (repo_dir, lock_dir):
+            self.addCleanup(shutil.rmtree, directory)
+        for target, value in (('accounts.workspace.REPO_DIR', repo_dir), ('accounts.locks.LOCK_DIR', lock_dir)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # both FTP sites were downloaded into All_Repo/site
+        profile = create_profile('client@example.com')
+        self.client_requests = ClientRequest.objects.bulk_create([
+            ClientRequest(url=f'https://{name}.example.com', code_link='ftp.example.com', username='user', token='token',
+                          version_control='ftp', branch=f'/{name}/site', port=21, profile=profile)
+            for name in ('shop', 'blog')
+        ])
+
+        self.old = legacy_workspace_path(self.client_requests[0])
+        os.makedirs(self.old)
+        with open(os.path.join(self.old, 'index.html'), 'w') as fp:
+            fp.write('<p>Hello</p>')
+        touch_workspace(self.old)
+
+    def test_paths_are_fanned_out(self):
+        path = workspace_path(self.client_requests[0])
+        self.assertEqual(os.path.basename(path), f'{self.client_requests[0].pk}-shop-site')
+        self.assertEqual([len(part) for part in os.path.relpath(path, os.path.dirname(self.old)).split(os.sep)[:2]], [2, 2])
+        self.assertNotEqual(path, workspace_path(self.client_requests[1]))
+
+    def test_migrates_shared_workspace(self):
+        ChangeRequest.objects.create(client_request=self.client_requests[1], repo=self.old, files=['index.html'])
+
+        call_command('migrate_workspaces', dry_run=True, stdout=StringIO())
+        self.assertTrue(os.path.exists(self.old))
+
+        call_command('migrate_workspaces', stdout=StringIO())
+        self.assertFalse(os.path.exists(self.old))
+
+        # every client request got its own copy, found by eviction
+        paths = [workspace_path(client_request) for client_request in self.client_requests]
+        for path in paths:
+            with open(os.path.join(path, 'index.html')) as fp:
+                self.assertEqual(fp.read(), '<p>Hello</p>')
+            self.assertTrue(os.path.exists(lock_path(path, 'access')))
+        self.assertEqual(sorted(workspace.path for workspace in list_workspaces()), sorted(paths))
+        self.assertEqual(ChangeRequest.objects.get().repo, paths[1])
+
+
+class TableCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        patcher = mock.patch('accounts.table_cache.CACHE_DIR', cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        page_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, page_dir)
+        self.page = os.path.join(page_dir, 'index.html')
+        with open(self.page, 'w') as fp:
+            fp.write('<p style="color:#333">First</p>')
+
+    def test_extracts_each_content_once(self):
+        with mock.patch('accounts.table_cache.stream_web_elements', wraps=stream_web_elements) as extract:
+            first = text_table(self.page)
+            self.assertEqual(text_table(self.page), first)
+            self.assertEqual(extract.call_count, 1)
+            self.assertEqual((first[0].text, first[0].color), ('First', '#333'))
+
+            # changed page is a different key
+            with open(self.page, 'w') as fp:
+                fp.write('<p>Second</p>')
+            self.assertEqual(text_table(self.page)[0].text, 'Second')
+            self.assertEqual(extract.call_count, 2)
+
+    def test_image_rows_follow_img_list_order(self):
+        with open(self.page, 'w') as fp:
+            fp.write('<img src="img/a.png">')
+        img_list = ['site/img/a.png', 'site/img/b.png']
+
+        row, = image_table(self.page, img_list)
+        self.assertEqual(row.available_images, ['a.png', 'b.png'])
+        row, = image_table(self.page, img_list[::-1])
+        self.assertEqual(row.available_images, ['b.png', 'a.png'])
+
+    def test_prune_removes_least_recently_used(self):
+        for used, key in enumerate(('aa01', 'bb02', 'cc03')):
+            cache_put(key, b'x' * 100)
+            os.utime(blob_path(key), (used, used))
+
+        # a hit makes the oldest blob the most recently used
+        self.assertEqual(cache_get('aa01'), b'x' * 100)
+
+        prune_cache(max_size=os.path.getsize(blob_path('aa01')) * 2)
+        self.assertEqual([cache_get(key) is not None for key in ('aa01', 'bb02', 'cc03')], [True, False, True])
+
+    def test_prune_leaves_blobs_being_written(self):
+        cache_put('aa01', b'x' * 100)
+        writing, crashed = f'{blob_path("bb02")}.1.2.tmp', f'{blob_path("cc03")}.3.4.tmp'
+        for temp in (writing, crashed):
+            os.makedirs(os.path.dirname(temp), exist_ok=True)
+            with open(temp, 'wb') as fp:
+                fp.write(b'x' * 100)
+        os.utime(crashed, (0, 0))
+
+        self.assertEqual(prune_cache(max_size=0), 2)
+        self.assertEqual([os.path.exists(path) for path in (blob_path('aa01'), writing, crashed)], [False, True, False])
+
+    def test_legacy_encoded_page(self):
+        with open(self.page, 'wb') as fp:
+            fp.write('<meta charset="iso-8859-1"><p>Caf\xe9 \xa9 2023</p>'.encode('latin-1'))
+        self.assertEqual(text_table(self.page)[0].text, 'Caf\xe9 \xa9 2023')
+
+
+class StartupTest(SimpleTestCase):
+
+    def test_editor_dependencies_are_imported_lazily(self):
+        # login pages, admin and management commands must not pay for git, bs4 and PIL
+        imports = measure_startup()
+        self.assertEqual(heavy_modules(imports), [])
+        self.assertIn('accounts.views', {module.name for module in imports})
+
+
+class FakeFTP:
+    """
+    Stands in for ftplib.FTP, remembering what every connection was asked to do.
+    """
+    connections = []
+
+    def __init__(self, timeout=None):
+        self.commands = []
+        self.broken = False
+        FakeFTP.connections.append(self)
+
+    def connect(self, host, port):
+        self.commands.append(('connect', host, port))
+
+    def login(self, user, password):
+        self.commands.append(('login', user))
+
+    def pwd(self):
+        return '/home'
+
+    def cwd(self, path):
+        if self.broken:
+            raise EOFError
+        self.commands.append(('cwd', path))
+
+    def voidcmd(self, command):
+        self.commands.append((command,))
+
+    def quit(self):
+        self.commands.append(('quit',))
+
+    def close(self):
+        pass
+
+
+class FtpPoolTest(SimpleTestCase):
+
+    def setUp(self):
+        FakeFTP.connections = []
+        patcher = mock.patch('ftplib.FTP', FakeFTP)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(ftp_pool.close_all)
+
+        self.site = ClientRequest(code_link='ftp.example.com', port=21, username='one', token='secret')
+        self.other_user = ClientRequest(code_link='ftp.example.com', port=21, username='two', token='secret')
+
+    def test_session_is_reused(self):
+        with ftp_pool.ftp_session(self.site) as ftp:
+            ftp.cwd('/public_html')
+        with ftp_pool.ftp_session(self.site) as ftp:
+            pass
+
+        self.assertEqual(len(FakeFTP.connections), 1)
+        self.assertEqual(ftp.commands[-1], ('cwd', '/home'))
+
+        # other credentials never get the session
+        self.site.token = 'changed'
+        with ftp_pool.ftp_session(self.site):
+            pass
+        self.assertEqual(len(FakeFTP.connections), 2)
+
+    def test_dropped_session_is_replaced(self):
+        with ftp_pool.ftp_session(self.site) as ftp:
+            pass
+        ftp.broken = True
+
+        with ftp_pool.ftp_session(self.site) as new_ftp:
+            self.assertIsNot(new_ftp, ftp)
+        self.assertEqual(ftp.commands[-1], ('quit',))
+
+    def test_sessions_per_host_are_bounded(self):
+        def use_other_user():
+            with ftp_pool.ftp_session(self.other_user):
+                pass
+
+        with mock.patch('accounts.ftp_pool.MAX_PER_HOST', 1):
+            with ftp_pool.ftp_session(self.site):
+
+                # second user of the same host waits for the first session
+                waiting = threading.Thread(target=use_other_user)
+                waiting.start()
+                waiting.join(0.2)
+                self.assertEqual(len(FakeFTP.connections), 1)
+
+            waiting.join(5)
+
+        # idle session of the first user was closed to make room
+        self.assertEqual(len(FakeFTP.connections), 2)
+        self.assertEqual(FakeFTP.connections[0].commands[-1], ('quit',))
+
+    def test_keep_alive(self):
+        with ftp_pool.ftp_session(self.site) as ftp:
+            pass
+
+        with mock.patch('accounts.ftp_pool.KEEPALIVE_INTERVAL', -1):
+            ftp_pool.keep_alive()
+        self.assertEqual(ftp.commands[-1], ('NOOP',))
+
+        with mock.patch('accounts.ftp_pool.MAX_IDLE', -1):
+            ftp_pool.keep_alive()
+        self.assertEqual(ftp.commands[-1], ('quit',))
+
+
+class FlakyFTP:
+    """
+    FTP server holding files in memory, every transfer breaks after 'chunk' bytes until 'failures' run out.
+    """
+
+    def __init__(self, files=None, chunk=4, failures=1):
+        self.files = dict(files or {})
+        self.chunk = chunk
+        self.failures = failures
+        self.commands = []
+
+    def transfer(self, data, write):
+        if self.failures:
+            self.failures -= 1
+            write(data[:self.chunk])
+            raise EOFError
+        write(data)
+
+    def size(self, name):
+        return len(self.files[name])
+
+    def voidcmd(self, command):
+        pass
+
+    def mkd(self, name):
+        pass
+
+    def retrbinary(self, command, callback, rest=None):
+        self.commands.append((command, rest))
+        self.transfer(self.files[command.split(' ', 1)[1]][rest or 0:], callback)
+
+    def storbinary(self, command, fh):
+        self.commands.append((command, fh.tell()))
+        verb, name = command.split(' ', 1)
+        if verb == 'STOR':
+            self.files[name] = b''
+
+        def append(data):
+            self.files[name] += data
+
+        self.transfer(fh.read(), append)
+
+
+class RemoteSite(FlakyFTP):
+    """
+    FlakyFTP serving a tree of folders, 'files' keyed by paths relative to the site's root.
+    """
+
+    def __init__(self, files):
+        super().__init__(files, failures=0)
+        self.folder = []
+        self.listed = 0
+
+    def cwd(self, path):
+        if path.startswith('/'):
+            self.folder = []
+        elif path == '..':
+            self.folder.pop()
+        elif any(name.startswith('/'.join(self.folder + [path, ''])) for name in self.files):
+            self.folder.append(path)
+        else:
+            raise ftplib.error_perm('550 Not a directory')
+
+    def nlst(self):
+        self.listed += 1
+        prefix = '/'.join(self.folder + [''])
+        return sorted({name[len(prefix):].split('/')[0] for name in self.files if name.startswith(prefix)})
+
+
+class ResumableTransferTest(SimpleTestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+    def test_download_resumes(self):
+        ftp = FlakyFTP({'index.html': b'0123456789'})
+        local = os.path.join(self.path, 'index.html')
+
+        with self.assertRaises(EOFError):
+            download_file(ftp, 'index.html', local)
+        self.assertFalse(os.path.exists(local))
+
+        download_file(ftp, 'index.html', local)
+        self.assertEqual(ftp.commands, [('RETR index.html', None), ('RETR index.html', 4)])
+        with open(local, 'rb') as fp:
+            self.assertEqual(fp.read(), b'0123456789')
+
+        # finished files aren't downloaded again
+        download_file(ftp, 'index.html', local)
+        self.assertEqual(len(ftp.commands), 2)
+
+    def test_upload_resumes(self):
+        self.addCleanup(os.remove, lock_path(self.path, 'upload'))
+        os.makedirs(os.path.join(self.path, 'img'))
+        for name, content in (('index.html', b'0123456789'), ('img/logo.png', b'png')):
+            with open(os.path.join(self.path, name), 'wb') as fp:
+                fp.write(content)
+
+        ftp = FlakyFTP({'index.html': b'old'})
+        with self.assertRaises(EOFError):
+            upload_files(ftp, self.path, ['index.html', 'img/logo.png'])
+
+        upload_files(ftp, self.path, ['index.html', 'img/logo.png'])
+        self.assertEqual(ftp.commands, [('STOR index.html', 0), ('APPE index.html', 4), ('STOR img/logo.png', 0)])
+        self.assertEqual(ftp.files, {'index.html': b'0123456789', 'img/logo.png': b'png'})
+
+
+    def test_only_network_errors_are_retried(self):
+        client_request = ClientRequest(code_link='ftp.example.com', username='user', token='token', port=21)
+        failures = [ConnectionResetError(), FileNotFoundError('index.html')]
+
+        def operation(ftp):
+            raise failures.pop(0)
+
+        with mock.patch('accounts.ftp_transfer.ftp_session', return_value=contextlib.nullcontext(mock.sentinel.ftp)), \
+                mock.patch('accounts.ftp_transfer.time.sleep') as sleep:
+            with self.assertRaises(FileNotFoundError):
+                with_session(client_request, operation)
+
+        self.assertEqual((failures, sleep.call_count), ([], 1))
+
+
+class LazyFtpTest(TestCase):
+
+    def setUp(self):
+        self.repo_dir, lock_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+        for directory in (self.repo_dir, lock_dir):
+            self.addCleanup(shutil.rmtree, directory)
+
+        self.ftp = RemoteSite({'index.html': b'<p>Home</p><img src="img/logo.png">', 'about/team.html': b'<p>Team</p>',
+                               'img/logo.png': b'logo', 'img/unused.jpg': b'unused', 'style.css': b'p {}'})
+        for target, value in (('accounts.workspace.REPO_DIR', self.repo_dir), ('accounts.ftp_lazy.REPO_DIR', self.repo_dir),
+                              ('accounts.locks.LOCK_DIR', lock_dir),
+                              ('accounts.ftp_lazy.with_session', lambda client_request, operation: operation(self.ftp))):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.client_request = ClientRequest.objects.create(
+            url='https://site.example.com', code_link='ftp.example.com', username='user', token='token',
+            version_control='ftp', branch='/site', port=21, profile=create_profile('client@example.com'))
+
+    def test_pages_are_downloaded_when_opened(self):
+        path = sync_workspace(self.client_request, extract=False, lazy=True)
+        self.assertEqual(os.listdir(path), [])
+
+        # pages and images are listed without downloading anything
+        Html_List, img_list = lazy_listing(self.client_request, path)
+        relative = os.path.relpath(path, self.repo_dir)
+        self.assertEqual(Html_List, [['team.html', os.path.join(relative, 'about/team.html')],
+                                     ['index.html', os.path.join(relative, 'index.html')]])
+        self.assertEqual(img_list, [os.path.join(relative, 'img/logo.png'), os.path.join(relative, 'img/unused.jpg')])
+
+        # opened page comes with the images it uses, once
+        self.assertEqual(fetch_page(self.client_request, path, 'index.html'), ['index.html', 'img/logo.png'])
+        self.assertEqual(fetch_page(self.client_request, path, 'index.html'), [])
+        self.assertEqual(sorted(os.listdir(path)), ['img', 'index.html'])
+        self.assertEqual(os.listdir(os.path.join(path, 'img')), ['logo.png'])
+
+        # images not downloaded yet are offered along with the downloaded ones
+        with open(os.path.join(path, 'index.html')) as fp:
+            logo, = stream_images(fp.read(), img_list)
+        self.assertEqual(logo.available_images, ['logo.png', 'unused.jpg'])
+
+        # opened pages aren't local changes
+        self.assertEqual((local_changes(path), changed_files(path)), ('', []))
+        with open(os.path.join(path, 'index.html'), 'a') as fp:
+            fp.write('<p>Edited</p>')
+        self.assertEqual((local_changes(path), changed_files(path)), ('changed since sync', ['index.html']))
+
+        # listing is kept until it expires
+        self.assertEqual(self.ftp.listed, 3)
+        lazy_listing(self.client_request, path)
+        self.assertEqual(self.ftp.listed, 3)
+        with self.settings(FTP_LISTING_TTL=0):
+            lazy_listing(self.client_request, path)
+        self.assertEqual(self.ftp.listed, 6)
+
+
+class PipelineTest(SimpleTestCase):
+
+    def setUp(self):
+        repo_dir, cache_dir, lock_dir = tempfile.mkdtemp(), tempfile.mkdtemp(), tempfile.mkdtemp()
+        for directory in (repo_dir, cache_dir, lock_dir):
+            self.addCleanup(shutil.rmtree, directory)
+        for target, value in (('accounts.workspace.REPO_DIR', repo_dir), ('accounts.pipeline.REPO_DIR', repo_dir),
+                              ('accounts.table_cache.CACHE_DIR', cache_dir), ('accounts.locks.LOCK_DIR', lock_dir)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.client_request = ClientRequest(pk=1, url='https://site.example.com', code_link='ftp.example.com',
+                                            version_control='ftp', branch='/site')
+        self.path = workspace_path(self.client_request)
+        os.makedirs(os.path.join(self.path, 'img'))
+        for page, html in (('index.html', '<p>Home</p><img src="img/logo.png">'), ('about.html', '<p>About</p>'),
+                           ('contact.html', '<p>Contact</p><p>Mail</p>')):
+            with open(os.path.join(self.path, page), 'w') as fp:
+                fp.write(html)
+        with open(os.path.join(self.path, 'img', 'logo.png'), 'wb') as fp:
+            fp.write(b'logo')
+
+    def test_tables_are_cached_after_sync(self):
+        with mock.patch('accounts.workspace.sync_locked'), \
+                mock.patch('accounts.pipeline.run_in_background', side_effect=run_pipeline):
+            sync_workspace(self.client_request)
+
+        # every page was extracted once and is reported
+        report = {page.page: (page.texts, page.images, page.error) for page in load_report(self.path)}
+        relative = os.path.relpath(self.path, pipeline.REPO_DIR)
+        self.assertEqual(report, {os.path.join(relative, 'index.html'): (1, 1, ''),
+                                  os.path.join(relative, 'about.html'): (1, 0, ''),
+                                  os.path.join(relative, 'contact.html'): (2, 0, '')})
+
+        Html_List, img_list = list_workspace(self.path)
+        with mock.patch('accounts.table_cache.stream_web_elements') as texts, \
+                mock.patch('accounts.table_cache.stream_images') as images:
+            for filename, page in Html_List:
+                text_table(os.path.join(pipeline.REPO_DIR, page))
+                image_table(os.path.join(pipeline.REPO_DIR, page), img_list)
+        self.assertFalse(texts.called or images.called)
+
+    def test_concurrent_triggers_are_coalesced(self):
+        release = threading.Event()
+        with mock.patch('accounts.pipeline.run_pipeline', side_effect=lambda repo_name: release.wait()) as run:
+            pipeline.run_in_background(self.path)
+            pipeline.run_in_background(self.path)
+            release.set()
+
+            # running one is done once it's forgotten
+            while self.path in pipeline._running:
+                time.sleep(0.01)
+            self.assertEqual(run.call_count, 1)
+
+            pipeline.run_in_background(self.path)
+            while self.path in pipeline._running:
+                time.sleep(0.01)
+            self.assertEqual(run.call_count, 2)
+
+
+class PrewarmTest(TestCase):
+
+    def setUp(self):
+        self.repo_dir = repo_dir = tempfile.mkdtemp()
+        cache_dir, lock_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+        for directory in (repo_dir, cache_dir, lock_dir):
+            self.addCleanup(shutil.rmtree, directory)
+        for target, value in (('accounts.workspace.REPO_DIR', repo_dir), ('accounts.pipeline.REPO_DIR', repo_dir),
+                              ('accounts.table_cache.CACHE_DIR', cache_dir), ('accounts.locks.LOCK_DIR', lock_dir)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.client_request = ClientRequest.objects.create(
+            url='https://site.example.com', code_link='ftp.example.com', username='user', token='token',
+            version_control='ftp', branch='/site', port=21, profile=create_profile('client@example.com'))
+
+        path = workspace_path(self.client_request)
+        os.makedirs(path)
+        with open(os.path.join(path, 'index.html'), 'w') as fp:
+            fp.write('<p>Hello</p><img src="logo.png">')
+
+    def test_pending_workspace_is_warmed_without_sync(self):
+        ChangeRequest.objects.create(client_request=self.client_request, repo='site', files=['index.html'])
+
+        out = StringIO()
+        with mock.patch('accounts.prewarm.sync_workspace') as sync:
+            call_command('prewarm_workspaces', workers=1, json=True, stdout=out)
+        self.assertFalse(sync.called)
+
+        result = json.loads(out.getvalue())
+        self.assertEqual((result['status'], result['pages']), ('kept: pending change requests', 1))
+
+        # time of every page is recorded
+        page, = load_report(workspace_path(self.client_request))
+        index = os.path.relpath(os.path.join(workspace_path(self.client_request), 'index.html'), self.repo_dir)
+        self.assertEqual((page.page, page.texts, page.images, page.error), (index, 1, 0, ''))
+
+        # tables are served from the cache now
+        with mock.patch('accounts.table_cache.stream_web_elements') as extract:
+            self.assertEqual(text_table(os.path.join(workspace_path(self.client_request), 'index.html'))[0].text, 'Hello')
+        self.assertFalse(extract.called)
+
+
+class BatchEditTest(TestCase):
+
+    def setUp(self):
+        repo_dir, lock_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+        for directory in (repo_dir, lock_dir):
+            self.addCleanup(shutil.rmtree, directory)
+        for target, value in (('accounts.workspace.REPO_DIR', repo_dir), ('accounts.locks.LOCK_DIR', lock_dir)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.client_request = ClientRequest.objects.create(
+            url='https://site.example.com', code_link='ftp.example.com', username='user', token='token',
+            version_control='ftp', branch='/site', port=21, profile=create_profile('client@example.com'))
+
+        self.path = workspace_path(self.client_request)
+        os.makedirs(self.path)
+        for page, footer in (('index.html', '(c) 2023 Acme'), ('about.html', 'About Acme')):
+            with open(os.path.join(self.path, page), 'w') as fp:
+                fp.write(f'<p style="color:#333">{footer}</p><p>{{{{ year }}}} 2023</p>')
+
+        self.spec = os.path.join(repo_dir, 'spec.json')
+        with open(self.spec, 'w') as fp:
+            json.dump({'edits': [{'pages': 'index*', 'match': '2023', 'replace': '2024', 'style': {'color': '#000'}},
+                                 {'restyle': [['color', '#333', '#111']]}]}, fp)
+
+    def run_batch(self, **options):
+        report = os.path.join(self.path, '..', 'report.json')
+        with mock.patch('accounts.batch.sync_workspace') as sync:
+            call_command('batch_edit', self.spec, workers=1, report=report, stdout=StringIO(), **options)
+        self.assertTrue(sync.called)
+        with open(report) as fp:
+            return json.load(fp)
+
+    def read(self, page):
+        with open(os.path.join(self.path, page)) as fp:
+            return BeautifulSoup(fp.read(), 'html.parser').find_all('p')
+
+    def test_edits_workspaces_and_records_change_requests(self):
+        report = self.run_batch()
+
+        result, = report['clients']
+        self.assertEqual(result['pages'], {'about.html': 1, 'index.html': 1})
+
+        # text and style of the matched element change, template text is left alone
+        footer, template = self.read('index.html')
+        self.assertEqual((footer.string.strip(), footer['style']), ('(c) 2024 Acme', 'color:#000;'))
+        self.assertEqual(template.string.strip(), '{{ year }} 2023')
+        self.assertEqual(self.read('about.html')[0]['style'], 'color:#111;')
+
+        change_request = ChangeRequest.objects.get(pk=result['change_request'])
+        self.assertEqual((change_request.repo, change_request.files), (self.path, ['about.html', 'index.html']))
+
+    def test_dry_run_writes_nothing(self):
+        report = self.run_batch(dry_run=True)
+
+        self.assertEqual(report['clients'][0]['pages'], {'about.html': 1, 'index.html': 1})
+        self.assertEqual(self.read('index.html')[0].string, '(c) 2023 Acme')
+        self.assertFalse(ChangeRequest.objects.exists())
+
+    def test_push(self):
+        with mock.patch('accounts.push.push_ftp', return_value='AI_MODIFIER_test') as push:
+            report = self.run_batch(push=True)
+
+        self.assertTrue(report['clients'][0]['pushed'])
+        self.assertEqual(push.call_args.args[1:], (self.path, ['about.html', 'index.html']))
+
+    def test_invalid_spec(self):
+        for edits in ([{'match': '2023'}], [{'match': '2023', 'style': 'color: red'}]):
+            with open(self.spec, 'w') as fp:
+                json.dump({'edits': edits}, fp)
+            with self.assertRaises(ValueError):
+                load_spec(self.spec)
+
+    def test_wrappers_are_kept(self):
+        edits = [{'pages': '*', 'match': '© 2023', 'replace': '© 2024', 'regex': False, 'style': {}, 'restyle': []}]
+
+        soup, count = apply_edits('<html><body><div><span style="color:red">© 2023 Smith</span></div></body></html>', edits)
+        self.assertEqual(count, 1)
+        self.assertEqual(str(soup), '<html><body><div><span style="color:red">© 2024 Smith</span></div></body></html>')
+
+        # text written as entities in the source matches too
+        soup, count = apply_edits('<p>&copy; 2023 Smith &amp; Co</p>', edits)
+        self.assertEqual((soup.p.string, count), ('© 2024 Smith & Co', 1))
+
+    def test_unmatched_page_isnt_parsed(self):
+        edits = load_spec(self.spec)['edits'][:1]
+        with mock.patch('accounts.batch.BeautifulSoup') as parse:
+            self.assertEqual(apply_edits('<p>nothing here</p>', edits), (None, 0))
+        self.assertFalse(parse.called)
+
+
+class TransferHistoryTest(TestCase):
+
+    def setUp(self):
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir)
+        patcher = mock.patch('accounts.locks.LOCK_DIR', lock_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.admin = create_profile('admin@example.com', is_staff=True, is_superuser=True)
+        self.client_request, = create_client_requests(self.admin, 1)
+
+    def test_push_is_recorded(self):
+        repo = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, repo)
+        with open(os.path.join(repo, 'index.html'), 'w') as fp:
+            fp.write('<p>Hello</p>')
+
+        ChangeRequest.objects.create(client_request=self.client_request, repo=repo, files=['index.html'])
+        with mock.patch('accounts.push.push_git', side_effect=[None, Exception('rejected')]):
+            push_change_requests(ChangeRequest.objects.all())
+            ChangeRequest.objects.update(success=False)
+            push_change_requests(ChangeRequest.objects.all())
+
+        succeeded, failed = TransferAttempt.objects.order_by('pk')
+        self.assertEqual((succeeded.kind, succeeded.transport, succeeded.files, succeeded.bytes, succeeded.success),
+                         ('push', 'git', 1, 12, True))
+        self.assertEqual((failed.success, failed.error), (False, 'rejected'))
+        self.assertLessEqual(failed.created_at, failed.started_at)
+
+    def test_dashboard(self):
+        for duration in (1, 2, 3, 4, 100):
+            TransferAttempt.objects.create(client_request=self.client_request, kind='push', transport='ftp', repo='site',
+                                           created_at=timezone.now(), started_at=timezone.now(),
+                                           finished_at=timezone.now(), duration=duration, success=duration < 100)
+
+        row, = latency_report('transport')
+        self.assertEqual((row.group, row.count, row.failures, row.p50), ('ftp', 5, 1, 3))
+        self.assertAlmostEqual(percentile([1, 2, 3, 4, 100], 95), 80.8)
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin:accounts_transferattempt_dashboard'))
+        self.assertContains(response, self.client_request.url)
+        self.assertEqual(response.context['by_client'][0].p99, 96.16)
+
+
+class StreamingExtractionTest(SimpleTestCase):
+
+    # void elements closed twice or never, stray and missing end tags, single
+    # child chains, preserved whitespace, comments, entities and template text
+    html = ('<!DOCTYPE html><html><head><title>Site</title><style>p {color: red}</style></head><body>'
+            '<div><span><b>Nested</b></span></div><div>\n  <p style="color:#333;font-size:14px">First &amp; second</p>\n</div>'
+            '<p>Unclosed<p>paragraph</span></p><br></br><pre>  kept  </pre><p><!-- comment --></p>'
+            '<p tag="x">Skipped</p><h1>{{ title }}</h1><img src="logo.png"><img src="photo.jpg"/>'
+            '<a><img src="logo.png">after</a><ul><li>One<li>Two</ul>&copy; 2022</body></html>')
+
+    img_list = ['site/logo.png', 'site/images/photo.jpg']
+
+    def test_same_rows_as_tree(self):
+        soup = BeautifulSoup(self.html, 'html.parser')
+
+        # chunk boundaries fall inside tags, entities and strings
+        for chunk_size in (streaming.CHUNK_SIZE, 1, 7):
+            with mock.patch('accounts.streaming.CHUNK_SIZE', chunk_size):
+                self.assertEqual(stream_web_elements(self.html), get_all_web_elements(soup))
+                self.assertEqual(stream_images(self.html, self.img_list), get_all_images(soup, self.img_list))
+
+        self.assertEqual(len(stream_images(self.html, self.img_list)), 3)
+
+    def test_locators_resolve_in_tree(self):
+        soup = BeautifulSoup(self.html, 'html.parser')
+        for element in stream_web_elements(self.html):
+            self.assertEqual(find_by_locator(soup, element.locator).string.strip(), element.text)
+
+
+class ImageMetaTest(SimpleTestCase):
+
+    def setUp(self):
+        from PIL import Image
+
+        self.repo_name, lock_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+        for directory in (self.repo_name, lock_dir):
+            self.addCleanup(shutil.rmtree, directory)
+        patcher = mock.patch('accounts.locks.LOCK_DIR', lock_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        os.makedirs(os.path.join(self.repo_name, 'img'))
+        self.sizes = {'img/logo.png': ('PNG', (120, 40)), 'img/photo.jpg': ('JPEG', (640, 480)),
+                      'img/anim.gif': ('GIF', (16, 9)), 'img/pic.webp': ('WEBP', (30, 20))}
+        for image, (image_format, size) in self.sizes.items():
+            Image.new('RGB', size).save(os.path.join(self.repo_name, image), image_format)
+        with open(os.path.join(self.repo_name, 'img', 'broken.png'), 'wb') as fp:
+            fp.write(b'not an image')
+
+    def test_header_dimensions(self):
+        index = build_image_index(self.repo_name, [*self.sizes, 'img/broken.png', 'img/missing.png'])
+
+        for image, (image_format, size) in self.sizes.items():
+            meta = image_metadata(self.repo_name, image, index)
+            self.assertEqual((meta.format, (meta.width, meta.height)), (image_format, size))
+            self.assertEqual(meta.size, os.path.getsize(os.path.join(self.repo_name, image)))
+
+        self.assertEqual(image_metadata(self.repo_name, 'img/broken.png', index)[:3], (None, None, None))
+        self.assertIsNone(image_metadata(self.repo_name, 'img/missing.png', index))
+
+    def test_unchanged_images_are_not_read_again(self):
+        build_image_index(self.repo_name, list(self.sizes))
+
+        with mock.patch('accounts.image_meta.image_meta', wraps=image_meta.image_meta) as read:
+            build_image_index(self.repo_name, list(self.sizes))
+            self.assertFalse(read.called)
+
+            with open(os.path.join(self.repo_name, 'img', 'logo.png'), 'ab') as fp:
+                fp.write(b'\0')
+            build_image_index(self.repo_name, list(self.sizes))
+            self.assertEqual(read.call_args.args, (os.path.join(self.repo_name, 'img/logo.png'),))
+
+    def test_image_table_and_default_size(self):
+        build_image_index(self.repo_name, list(self.sizes))
+        repo_dir = os.path.dirname(self.repo_name)
+        src = os.path.join('All_Repo', os.path.basename(self.repo_name), 'img', 'photo.jpg')
+
+        row, = with_metadata(self.repo_name, [ImageElement('photo', src, [], 0, '0:abc')], repo_dir)
+        self.assertEqual((row.meta.width, row.meta.height), (640, 480))
+
+        self.assertEqual(scaled_size(row.meta, width=320), (320, 240))
+        self.assertEqual(scaled_size(row.meta, height=48), (64, 48))
+        self.assertEqual(scaled_size(row.meta, 10, 10), (10, 10))
+        self.assertEqual(scaled_size(None, width=320), (320, None))
+
+    def test_readers_dont_save_index(self):
+        repo_dir = os.path.dirname(self.repo_name)
+        src = os.path.join('All_Repo', os.path.basename(self.repo_name), 'img', 'logo.png')
+
+        # image tables are listed with the reader lock, a missing index is built but not written
+        row, = with_metadata(self.repo_name, [ImageElement('logo', src, [], 0, '0:abc')], repo_dir)
+        self.assertEqual((row.meta.width, row.meta.height), (120, 40))
+        self.assertFalse(os.path.exists(lock_path(self.repo_name, 'images')))
+        self.assertFalse(os.path.exists(lock_path(self.repo_name, 'assets')))
+
+
+class ExportTest(TestCase):
+
+    def setUp(self):
+        repo_dir, lock_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+        for directory in (repo_dir, lock_dir):
+            self.addCleanup(shutil.rmtree, directory)
+        for target, value in (('accounts.workspace.REPO_DIR', repo_dir), ('accounts.locks.LOCK_DIR', lock_dir),
+                              ('accounts.export.CHUNK_SIZE', 1000)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.profile = create_profile('client@example.com')
+        self.client_request = ClientRequest.objects.create(
+            url='https://site.example.com', code_link='ftp.example.com', username='user', token='token',
+            version_control='ftp', branch='/site', port=21, profile=self.profile)
+
+        self.path = workspace_path(self.client_request)
+        os.makedirs(os.path.join(self.path, 'img'))
+        self.files = {'index.html': b'<p>Hello</p>' * 500, 'img/logo.png': os.urandom(5000), 'caf\u00e9.html': b'<p>Caf\xc3\xa9</p>'}
+        for name, content in self.files.items():
+            with open(os.path.join(self.path, name), 'wb') as fp:
+                fp.write(content)
+
+        # FTP workspaces count files written after the last sync as changed
+        with open(lock_path(self.path, 'generation'), 'w') as fp:
+            fp.write('1')
+        for name in self.files:
+            os.utime(os.path.join(self.path, name), (0, 0))
+
+        self.client.force_login(self.profile)
+
+    def download(self, **params):
+        response = self.client.get(reverse('download'), {'url': self.client_request.url, **params})
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        content = b''.join(response.streaming_content)
+        return response, zipfile.ZipFile(io.BytesIO(content)), content
+
+    def test_stored_archive_has_exact_length(self):
+        response, archive, content = self.download()
+
+        self.assertEqual(int(response['Content-Length']), len(content))
+        self.assertEqual({name: archive.read(name) for name in archive.namelist()}, self.files)
+        self.assertIsNone(archive.testzip())
+
+    def test_compressed_archive_is_chunked(self):
+        response, archive, content = self.download(compress=1)
+
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(archive.read('index.html'), self.files['index.html'])
+        self.assertLess(len(content), sum(map(len, self.files.values())))
+
+    def test_changed_files_only(self):
+        with open(os.path.join(self.path, 'index.html'), 'wb') as fp:
+            fp.write(b'<p>Edited</p>')
+        self.assertEqual(changed_files(self.path), ['index.html'])
+
+        response, archive, content = self.download(changed=1)
+        self.assertEqual(archive.namelist(), ['index.html'])
+        self.assertIn('-changes.zip', response['Content-Disposition'])
+
+    def test_symlinks_are_not_exported(self):
+        secret = tempfile.NamedTemporaryFile()
+        self.addCleanup(secret.close)
+        os.symlink(secret.name, os.path.join(self.path, 'secret.html'))
+        os.symlink(os.path.dirname(secret.name), os.path.join(self.path, 'tmp'))
+
+        response, archive, content = self.download()
+        self.assertEqual(sorted(archive.namelist()), sorted(self.files))
+        self.assertEqual(changed_files(self.path), [])
+
+    def test_other_clients_workspace_is_not_found(self):
+        self.client.force_login(create_profile('other@example.com'))
+        self.assertEqual(self.client.get(reverse('download'), {'url': self.client_request.url}).status_code, 404)
@@ -31,6 +31,10 @@ urlpatterns = [
         views.change_request,
         name='change_request'),
     
+    path('download/', 
+        views.download,
+        name='download'),
+    
     path('logout/', 
         auth_views.LogoutView.as_view(template_name='accounts/signin.html'),
         name='logout'),
@@ -1,21 +1,10 @@
 from typing import Any
 from uuid import uuid4
-import git
 import os
-from bs4 import BeautifulSoup
-import re
 from pathlib import Path
 import io
-import ftplib
-import shutil
-try:
-    import PIL.Image as Image
-except: 
-    pass
 
-# from PIL import Image
-
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import redirect, HttpResponseRedirect, render
 from django.urls import reverse
 from django.template.response import TemplateResponse
@@ -23,6 +12,8 @@ from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import PasswordResetForm, SetPasswordForm
 from django.template.loader import render_to_string
+from django.db import transaction
+from django.db.models import Subquery
 from django.db.models.query_utils import Q
 from django.utils.http import urlsafe_base64_encode
 from django.contrib.auth.tokens import default_token_generator
@@ -31,11 +22,15 @@ from django.template import loader
 from django.conf import settings
 
 from accounts.models import ClientRequest, ChangeRequest
+from accounts import editor
+from accounts.css import set_declarations
+from accounts.eviction import touch_workspace
+from accounts.export import archive_size, export_sizes, stream_zip
+from accounts.ftp_lazy import fetch_page, lazy_listing, lazy_mode
+from accounts.locks import repo_lock
+from accounts.workspace import REPO_DIR, list_workspace, workspace_path
 from modifier_admin.models import Profile
 
-# Create path where all repos from client will be stored
-REPO_DIR = os.path.join(os.path.join(Path(__file__).resolve().parent, 'static'), 'All_Repo')
-
 def index(request: Any) -> TemplateResponse:
     """
     View for home page
@@ -55,17 +50,15 @@ def index(request: Any) -> TemplateResponse:
             # Message to be displayed
             context['message'] = 'Welcome to AI Modifier'
             
-            # Get profile using email(unique field in Profile table)
-            profile = Profile.objects.get(email=request.user.email)   
-            
-            # set user in context     
+            # set user in context (request.user already is the Profile)
             context['user'] = request.user
             
-            # get all request by user (if already added)
-            if len(profile.client_request.all()) > 0 :
+            # get urls of all request by user (if already added) in a single query
+            urls = list(request.user.client_request.values_list('url', flat=True))
+            if urls:
                 
                 # set urls in context 
-                context['urls'] = [client_req.url for client_req in profile.client_request.all()]
+                context['urls'] = urls
             
             # render and pass context to the index.html to be displayed 
             return TemplateResponse(request, 'accounts/index.html', context)
@@ -129,36 +122,27 @@ def add_request(request: Any) -> TemplateResponse:
         # find if user request already exists and update it
         try:
             
-            # check if user request exists
-            if ClientRequest.objects.filter(url=request.POST['url']).exists():
-                
-                # filter out client request and all fields 
-                ClientRequest.objects.filter(url=request.POST['url']).update(
-                    url=request.POST['url'],
-                    code_link=request.POST['link'],
-                    username=request.POST['username'],
-                    token=request.POST['token'],
-                    version_control=request.POST['version_control'],
-                    branch=request.POST['branch'],
-                    port=request.POST['port'],
-                    profile=Profile.objects.get(email=request.POST['email'])
-                )
-                
+            fields = {
+                'code_link': request.POST['link'],
+                'username': request.POST['username'],
+                'token': request.POST['token'],
+                'version_control': request.POST['version_control'],
+                'branch': request.POST['branch'],
+                'port': request.POST['port'],
                 
-            else:
+                # profile is looked up within the same statement, unknown email fails on NOT NULL
+                'profile_id': Subquery(Profile.objects.filter(email=request.POST['email']).values('pk')[:1]),
+            }
+            
+            with transaction.atomic():
                 
-                # user request didn't exists, so create new user request
-                instance = ClientRequest(url=request.POST['url'],
-                                        code_link=request.POST['link'],
-                                        username=request.POST['username'],
-                                        token=request.POST['token'],
-                                        version_control=request.POST['version_control'],
-                                        branch=request.POST['branch'],
-                                        port=request.POST['port'],
-                                        profile=Profile.objects.get(email=request.POST['email']))
+                # update user request if it exists
+                updated = ClientRequest.objects.filter(url=request.POST['url']).update(**fields)
                 
-                # save user request
-                instance.save()
+                if not updated:
+                    
+                    # user request didn't exists, so create new user request
+                    ClientRequest.objects.create(url=request.POST['url'], **fields)
             
             # return to home page
             return HttpResponseRedirect(reverse('index'))
@@ -174,169 +158,70 @@ def add_request(request: Any) -> TemplateResponse:
     return TemplateResponse(request, 'accounts/add_request.html', {'message': 'Add new request'})
 
 
-def get_images(dir: str, dir_level:int) -> list:
-    """
-    Check all directories within 'dir' and get all images(jpg,png and jpeg).
-    
-    :args : dir: path to directory where images will be searched
+def asset_table(repo_name: str) -> list:
     """
+    List images of the workspace along with the pages using them, unused images first.
     
-    # initialize results
-    res = []
+    : args: repo_name: path of the workspace
     
-    # explore 'dir' and all contents winthin it 
-    for root, dirnames, filenames in os.walk(dir):
-        
-        # for all files found in 'filenames'
-        for filename in filenames:
-            file_level = len(root.split('/')) + 1
-            # check if filname is an images
-            if file_level == dir_level and (filename.endswith('.png') or filename.endswith('.jpg') or filename.endswith('.jpeg')):
-                
-                # add image's path to the result
-                # res.append([filename, os.path.join(root, filename)])
-                print(f'{root}/{filename}')
-                res.append(filename)
-    
-    # return result       
-    return res
+    : returns: list of [image path relative to REPO_DIR, sorted pages using it]
+    """
+    # listing only needs the reader lock, a missing index isn't saved
+    used = editor.references(editor.load_index(repo_name, save=False))
+    table = [[os.path.relpath(os.path.join(repo_name, image), REPO_DIR), sorted({page for page, locator in pages})]
+             for image, pages in used.items()]
     
+    return sorted(table, key=lambda row: (len(row[1]) != 0, row[0]))
+
 
-def get_all_images(soup: BeautifulSoup, img_list: list) -> list:
+def track_modified_file(request: Any, repo_name: str, file_path: str) -> None:
     """
-    Get all images from 'soup' object and find all other images at the same level 
+    Remember a file changed by the editor so that only that file is staged when pushed.
     
-    :args: soup: BeautifulSoup object loaded with html file, parsed using html parser
-         : img_list: list of all images within the repo.
-         
-    : returns: list conatining all information about all images within soup
+    : args: request: Any(WSGI Requst object)
+          : repo_name: path of the repository the file belongs to
+          : file_path: absolute path of the changed file
     """
     
-    # Initialize results
-    response_table = []
+    # modified files are kept per repository in the user's session
+    modified_files = request.session.get('modified_files', {})
+    files = modified_files.setdefault(repo_name, [])
     
-    # dir = os.path.join(settings.BASE_DIR, repo_name)
+    # store path relative to repository root
+    file_path = os.path.relpath(file_path, repo_name)
+    if file_path not in files:
+        files.append(file_path)
     
-    # find all 'img' Tags and index them
-    for idx, img in enumerate(soup.find_all('img')):
-        try:
-            # get image path from img_list
-            for img_list_element in img_list:
-                
-                # check if img_list_element ends with 'image source'
-                if img_list_element.endswith(img['src']):
-                    
-                    # found image location and adding 'tag', 'current image source',
-                    # 'all other images in that directory' and 'index of img' soup element.
-                    file_path = os.path.join(REPO_DIR, img_list_element)
-                    response_table.append([img_list_element.split('/')[-1].split('.')[0], 
-                                           {'src': os.path.join('All_Repo', img_list_element), 
-                                            'available_images': get_images(file_path[:file_path.rfind('/')], len(file_path.split('/')))}, 
-                                           idx])
-                    
-        except Exception as e: 
-            print(e)
-            
-    # return response table
-    return response_table
+    request.session['modified_files'] = modified_files
 
 
-def get_all_web_elements(soup: BeautifulSoup) -> list:
+def positive_int(value: str):
     """
-    Find all static text and their style property if exists.
-    
-    : args: soup: BeautifulSoup object loaded with html file, parsed using html parser
-    
-    : returns: list of all static text found in soup.
+    Parse 'value' as a positive whole number, None if it isn't one.
     """
+    try:
+        number = int(value)
+    except ValueError:
+        return None
     
-    # Initialize results
-    response_Table = []
-    
-    tags = ['style', 'script', 'head', 'meta', '[document]']
+    return number if number > 0 else None
+
+
+def pop_modified_files(request: Any, repo_name: str) -> list:
+    """
+    Get and forget all files changed by the editor within 'repo_name'.
     
-    # get all web elements
-    for idx, x in enumerate(soup.find_all(tag='', text=re.compile(''))):
-        # remove ankle brackets
-        tag = str(x).split("<")[1].split(">")[0]
-        
-        # split web element string at " "
-        if " " in tag: tag = tag.split(" ")[0]
-        
-        if tag not in tags:
-        
-            # get web element's string
-            soup_string = str(x.string)
-            
-            # if web element is dynamic i.e., have {{ some variable }}, skip it
-            if "{{" in soup_string and "}}" in soup_string: continue
-            
-            # convert string
-            text = str(x)
-            
-            # if font-size is present in web element 
-            if text.find("font-size") != -1:
-                
-                # extract font-size's value 
-                size = str(text.split("font-size:")[1].split("px;")[0])
-                
-            # else set it to ""
-            else:
-                size = ""
-                
-            # if color is present in web element
-            if text.find("color") != -1:
-                
-                # extract color's value
-                color = text.split("color:")[1].split(";")[0]
-                
-            # else set it to ""
-            else:
-                color = ""
-                
-            # create attribute list of web element
-            temp = [tag, soup_string.strip(), text ,size, color, idx]
-            
-            # append attribute list to Response_Table
-            response_Table.append(temp)
+    : args: request: Any(WSGI Requst object)
+          : repo_name: path of the repository
+          
+    : returns: list of paths relative to repository root
+    """
+    modified_files = request.session.get('modified_files', {})
+    files = modified_files.pop(repo_name, [])
+    request.session['modified_files'] = modified_files
     
-    return response_Table
-        
-    # Remove duplicates from Response_Table        
-    # temp = []
-    # for x in Response_Table:
-    #     if x not in temp:
-    #         temp.append(x)
-            
-    # return temp
+    return files
     
-def download_files(ftp, path, destination):
-
-    path = path[:-1] if path[-1] == '/' else path
-
-    try:
-        folder = path[path.rfind('/')+1:]
-        destination = os.path.join(destination, folder)
-        if not os.path.exists(destination):
-            os.makedirs(destination)
-                
-    except ftplib.error_perm:
-        pass
-        
-    for file in ftp.nlst():
-        try:
-            #this will check if file is folder:
-            new_dest = f'{path}/{file}'
-            ftp.cwd(file)
-            #if so, explore it:
-            download_files(ftp, new_dest, destination)
-            ftp.cwd('..')
-        except ftplib.error_perm:
-            if file.endswith('.html') or file.endswith('.png') or file.endswith('.jpg') or file.endswith('.jpeg'):
-                with open(os.path.join(destination,file),"wb") as f:
-                    ftp.retrbinary("RETR "+file, f.write)
-            
-    return
 
 def change_request(request: Any) -> TemplateResponse:
     """
@@ -351,7 +236,7 @@ def change_request(request: Any) -> TemplateResponse:
         try:
             
             # get ClientRequest obeject from 'client_req_urls'
-            client_request = ClientRequest.objects.get(url=request.POST['client_req_urls'])
+            client_request = ClientRequest.objects.select_related('profile').get(url=request.POST['client_req_urls'])
             
             # get all fields
             url = client_request.url
@@ -363,10 +248,8 @@ def change_request(request: Any) -> TemplateResponse:
             port = client_request.port
             profile = client_request.profile
             
-            # if version control is FTP
-            Repo_Name = os.path.join(REPO_DIR, branch[branch.rfind('/')+1:]) \
-                            if version_control.lower() == 'ftp' \
-                            else os.path.join(REPO_DIR, code_link[code_link.rfind('/')+1:].split('.')[0])
+            # get local workspace of client request
+            Repo_Name = workspace_path(client_request)
 
             # if user pressed 'Edit Request' btn render add_request.html
             if 'edit_request' in request.POST:
@@ -406,6 +289,9 @@ def change_request(request: Any) -> TemplateResponse:
                 Response_Image_Table = []
                 Response_Image_Table_Length = len(Response_Image_Table)
                 
+                # images of the site and pages using them, only listed on request
+                Asset_Table = []
+                
                 # if version_control.lower() == 'ftp':
                 #     Repo_Path = code_link.replace('//',f'//{username}:{token}@')
                 #     # Set branch
@@ -425,351 +311,343 @@ def change_request(request: Any) -> TemplateResponse:
                 #     Repo_Name = os.path.join(REPO_DIR, Repo_Path[Repo_Path.rfind('/')+1:].split('.')[0])
                 
                 
-                Html_List = []
-                img_list = []
-                for root, dirnames, filenames in os.walk(Repo_Name):
-                    for filename in filenames:
-                        if filename.endswith('.html'):
-                            # Html_List.append([filename, os.path.join(root, filename)])
-                            
-                            file_path = os.path.join(root, filename)
-                            if file_path:
-                                
-                                Html_List.append([filename, file_path[len(REPO_DIR)+1:]])
-                            
-                        elif filename.endswith('.png') or filename.endswith('.jpg') or filename.endswith('.jpeg'):
-                            # img_list.append(os.path.join(root, filename))
-                            
-                            file_path = os.path.join(root, filename)
-                            if file_path:
-                                
-                                img_list.append(file_path[len(REPO_DIR)+1:])
+                # large FTP sites are only listed, pages are downloaded when opened
+                lazy = lazy_mode(client_request)
                 
-                # if 'Repo_Path' in request.POST and 'Branch_Name' in request.POST and 'Page_Name' not in request.POST and 'save' not in request.POST and 'push' not in request.POST:
+                # sync takes the writer lock of the workspace by itself
                 if 'make_changes' in request.POST:
                     
-                    if version_control.lower() == 'ftp':
-                        
-                        if os.path.exists(Repo_Name):
-                            # os.rmdir(Repo_Name)
-                            shutil.rmtree(Repo_Name)
-                            
-                        # create FTP instance 
-                        ftp = ftplib.FTP()
-                        
-                        # connect to ftp server
-                        ftp.connect(host=code_link, port=int(port))
-                        
-                        # Login to server
-                        ftp.login(username, token)
-                        
-                        # change to location to source
-                        ftp.cwd(branch)
-                        
-                        # download all files to REPO_DIR (All_Repo)
-                        download_files(ftp, branch, REPO_DIR)
-                        
-                        ftp.quit()
-                        
-                    else:
-                        
-                        Repo_Path = code_link.replace('//',f'//{username}:{token}@')
-                        
-                        # Auto pull remote repository and change branch
-                        if not(os.path.exists(REPO_DIR)):
-                            os.makedirs(REPO_DIR)
-
-                        if not(os.path.exists(Repo_Name)):
-                            repo = git.Repo.clone_from(Repo_Path, Repo_Name)
-                            
-                        else:
-                            repo = git.Repo(Repo_Name)
-                            repo.git.reset("--hard")
-                            
-                        repo.git.checkout(branch)
-                        repo.git.pull()
-                    
-                    Html_List = []
-                    img_list = []
-                    for root, dirnames, filenames in os.walk(Repo_Name):
-                        for filename in filenames:
-                            if filename.endswith('.html'):
-                                # Html_List.append([filename, os.path.join(root, filename)])
-                                
-                                file_path = os.path.join(root, filename)
-                                if file_path:
-                                                      
-                                    Html_List.append([filename, file_path[len(REPO_DIR)+1:]])
-                                
-                            elif filename.endswith('.png') or filename.endswith('.jpg') or filename.endswith('.jpeg'):
-                                # img_list.append(os.path.join(root, filename))
-                                
-                                file_path = os.path.join(root, filename)
-                                if file_path:
-                                    
-                                    img_list.append(file_path[len(REPO_DIR)+1:])
+                    # local changes are discarded by sync, so are the recorded files
+                    pop_modified_files(request, Repo_Name)
+                    
+                    # clone or download client's code into workspace, lazy workspaces have nothing to extract yet
+                    editor.sync_workspace(client_request, extract=not lazy, lazy=lazy)
+                
+                # page being opened is downloaded first, under the writer lock
+                if lazy and 'Page_Name' in request.POST:
+                    fetch_page(client_request, Repo_Name,
+                               os.path.relpath(os.path.join(REPO_DIR, request.POST['Page_Name']), Repo_Name).replace(os.sep, '/'))
+                
+                # edits need the workspace for themselves, everything else only reads it
+                editing = (any(key in request.POST for key in ('Replace_Text_With', 'current_src', 'save', 'replace_image'))
+                           or request.POST.get('restyle') == 'replace')
                 
-                elif 'Page_Name' in request.POST and 'save' not in request.POST and 'push' not in request.POST:
+                with repo_lock(Repo_Name, shared=not editing):
                     
-                    # Pull all the Editable content from the HTML page
-                    Path_To_Search = os.path.join(REPO_DIR, request.POST['Page_Name'])
+                    # recently used workspaces are the last to be evicted
+                    touch_workspace(Repo_Name)
                     
-                    if 'find' in request.POST:
-                        with open(Path_To_Search) as fp:
-                            soup = BeautifulSoup(fp, 'html.parser')
+                    # get all html pages and images within workspace
+                    Html_List, img_list = lazy_listing(client_request, Repo_Name) if lazy else list_workspace(Repo_Name)
+                    
+                    if 'Page_Name' in request.POST and 'save' not in request.POST and 'push' not in request.POST:
+                    
+                        # Pull all the Editable content from the HTML page
+                        Path_To_Search = os.path.join(REPO_DIR, request.POST['Page_Name'])
+                    
+                        if 'find' in request.POST:
                 
                             # tags = ['style', 'script', 'head', 'title', 'meta', '[document]']
                             # tags = ['style']
                             # for t in tags:
                             #     [s.extract() for s in soup(t)]
                             
-                            # get response table
-                            Response_Table = get_all_web_elements(soup=soup)                        
+                            # get response table, extracted by any worker before if the page didn't change
+                            Response_Table = editor.text_table(Path_To_Search)
                             Response_Table_Length = len(Response_Table)
                     
-                    elif 'img' in request.POST:
-                        with open(Path_To_Search) as fp:
-                            soup = BeautifulSoup(fp, 'html.parser')
-                            
-                            # get response table
-                            Response_Image_Table = get_all_images(soup=soup,  
-                                                                  img_list=img_list)   
+                        elif 'img' in request.POST:
                             
+                            # get response table, with dimensions of every image from the metadata index
+                            Response_Image_Table = editor.with_metadata(Repo_Name, editor.image_table(Path_To_Search, img_list), REPO_DIR)
                             Response_Image_Table_Length = len(Response_Image_Table)
                     
-                # elif 'Replace_Text_With' in request.POST and 'Text_To_Replace' in request.POST and 'Where_To_Change' in request.POST:
-                elif 'Replace_Text_With' in request.POST:
+                    # elif 'Replace_Text_With' in request.POST and 'Text_To_Replace' in request.POST and 'Where_To_Change' in request.POST:
+                    elif 'Replace_Text_With' in request.POST:
                     
-                    with open(Path_To_Search) as fp:
-                        soup = BeautifulSoup(fp, 'html.parser')
-                        
-                    # Where_To_Change = request.POST['Where_To_Change']
-                    # Text_To_Replace = request.POST['Text_To_Replace']
-                    Replace_Text_With = request.POST['Replace_Text_With']
-                    Replace_Font_With = request.POST['Replace_Font_With']
-                    Replace_Color_With = request.POST['Replace_Color_With']
-                    color_change = request.POST['color_change']
+                        with open(Path_To_Search) as fp:
+                            soup = editor.BeautifulSoup(fp, 'html.parser')
+                        
+                        # Where_To_Change = request.POST['Where_To_Change']
+                        # Text_To_Replace = request.POST['Text_To_Replace']
+                        Replace_Text_With = request.POST['Replace_Text_With']
+                        Replace_Font_With = request.POST['Replace_Font_With']
+                        Replace_Color_With = request.POST['Replace_Color_With']
+                        color_change = request.POST['color_change']
                     
-                    # for t in tags:
-                    #     [s.extract() for s in soup(t)]
+                        # for t in tags:
+                        #     [s.extract() for s in soup(t)]
                     
-                    elements = soup.find_all(tag='', text=re.compile(''))
-                    element = elements[int(request.POST['index'])]
+                        # find element, page may have changed since the table was extracted
+                        try:
+                            element = editor.find_by_locator(soup, request.POST['locator'])
+                        except editor.LocatorConflict as e:
+                            element = None
+                            msg = f'{e} Please find the text again.'
+                        
+                        if element is not None:
                     
-                    print(f'Text: {element.text}')
+                            print(f'Text: {element.text}')
                     
                     
-                    if element.has_attr('style'):
-                        print(element['style'])
-                        style = element['style']
-                        
-                        style = style.split(';')
-                        new_style = []
-                        for style_attr in style:
-                            if color_change != 'false' and style_attr.split(':')[0] == 'color':
-                                new_style.append(f'color:{Replace_Color_With}')
-                                
-                            elif Replace_Font_With != '' and style_attr.split(':')[0] == 'font-size':
-                                new_style.append(f'font-size:{Replace_Font_With}px')
-                            
-                            else:
-                                new_style.append(style_attr)
-                        
-                        print(new_style)
-                        new_style = ';'.join(new_style)
-                        
-                        if color_change != 'false' and new_style.find('color') == -1:
-                            new_style += f'color:{Replace_Color_With};'
-                        
-                        if Replace_Font_With != '' and new_style.find('font-size') == -1:
-                            new_style += f'font-size:{Replace_Font_With}px;'
-                        
-                        element['style'] = new_style
-                        print(element['style'])
-                        
-                    elif color_change != 'false' or Replace_Font_With != '':
-                        attribute = ''
-                        if color_change != 'false':
-                            attribute += f'color:{Replace_Color_With};'
-                        
-                        if Replace_Font_With != '':
-                            attribute += f'font-size:{Replace_Font_With}px;'
-                        
-                        element['style'] = attribute
-                        
-                        print(element['style'])
+                            # only declarations being changed are touched, the rest of the style is kept as is
+                            changes = {}
+                            if color_change != 'false':
+                                changes['color'] = Replace_Color_With
+                            if Replace_Font_With != '':
+                                changes['font-size'] = f'{Replace_Font_With}px'
+                    
+                            if changes:
+                                element['style'] = set_declarations(element.get('style'), changes)
+                                print(element['style'])
                         
-                    # element.string = element.string.replace(Text_To_Replace,Replace_Text_With)
-                    element.string = Replace_Text_With
-                    print(f'Text: {element.text}')
+                            # element.string = element.string.replace(Text_To_Replace,Replace_Text_With)
+                            element.string = Replace_Text_With
+                            print(f'Text: {element.text}')
                     
-                    with open(Path_To_Search, "w") as fp:
-                        fp.write(soup.prettify())
+                            with open(Path_To_Search, "w") as fp:
+                                fp.write(soup.prettify())
                     
-                    msg = "Success. Please push the changes"
+                            track_modified_file(request, Repo_Name, Path_To_Search)
                     
-                    Response_Table = get_all_web_elements(soup)
-                    Response_Table_Length = len(Response_Table)
-                    save_btn = "undo"
+                            msg = "Success. Please push the changes"
+                            save_btn = "undo"
                     
+                        Response_Table = editor.text_table(Path_To_Search)
+                        Response_Table_Length = len(Response_Table)
                     
-                elif 'current_src' in request.POST:
                     
-                    # Check if atleast one of the option is present 
-                    # either image is selected or image is uploaded
-                    if request.POST['available_images'] != "select_availaible_image" or len(request.FILES) != 0:
-                        
-                        # open Path_To_Search html file 
-                        with open(Path_To_Search) as fp:
-                            original_soup = BeautifulSoup(fp, 'html.parser')
-                        
-                        # Initialize width and height to None
-                        width, height = None, None
+                    elif 'current_src' in request.POST:
+                    
+                        # Check if atleast one of the option is present 
+                        # either image is selected or image is uploaded
+                        if request.POST['available_images'] != "select_availaible_image" or len(request.FILES) != 0:
                         
-                        # Check if width is present in request   
-                        if request.POST['width'] != '':
+                            # open Path_To_Search html file 
+                            with open(Path_To_Search) as fp:
+                                original_soup = editor.BeautifulSoup(fp, 'html.parser')
+                            
+                            # find img tag, page may have changed since the table was extracted
+                            try:
+                                image_to_change = editor.find_by_locator(original_soup, request.POST['locator'])
+                                conflict = None
+                            except editor.LocatorConflict as e:
+                                image_to_change = None
+                                conflict = f'{e} Please find the image again.'
+                        
+                            # Initialize width and height to None
+                            width, height = None, None
+                            invalid_size = False
+                        
+                            # Check if width is present in request   
+                            if request.POST['width'] != '':
                             
-                            # set width
-                            width = int(request.POST['width'])
+                                # set width
+                                width = positive_int(request.POST['width'])
+                                invalid_size = width is None
                             
-                        # Check if height is present in request
-                        if request.POST['height'] != '':
+                            # Check if height is present in request
+                            if request.POST['height'] != '':
                             
-                            # set height
-                            height = int(request.POST['height'])
+                                # set height
+                                height = positive_int(request.POST['height'])
+                                invalid_size = invalid_size or height is None
                         
-                        # Initialize file_exists to None
-                        file_exists = False
+                            # Initialize file_exists to None
+                            file_exists = False
                         
-                        # get current source of image relative to repository
-                        current_src = request.POST['current_src']
+                            # get current source of image relative to repository
+                            current_src = request.POST['current_src']
                         
-                        # If image is uploaded by user
-                        if request.POST['available_images'] == "select_availaible_image":
+                            # If image is uploaded by user
+                            if request.POST['available_images'] == "select_availaible_image":
                             
-                            # get image name 
-                            name = request.FILES["filename"].name
+                                # get image name 
+                                name = request.FILES["filename"].name
                             
-                            # reading and saving the image in the same directory as current image
-                            image_location = f"{REPO_DIR[:REPO_DIR.rfind('All_Repo')]}{current_src[:current_src.rfind('/')+1]}{name}"
+                                # reading and saving the image in the same directory as current image
+                                image_location = f"{REPO_DIR[:REPO_DIR.rfind('All_Repo')]}{current_src[:current_src.rfind('/')+1]}{name}"
                             
-                            # check if image is not already present in that directory
-                            if not os.path.exists(image_location):
+                                # check if image is not already present in that directory
+                                if not os.path.exists(image_location):
                                 
-                                # try and save image 
-                                try:
+                                    # try and save image 
+                                    try:
+                                    
+                                        # read image data from Bytes
+                                        image = editor.Image.open(io.BytesIO(request.FILES["filename"].file.read()))
                                     
-                                    # read image data from Bytes
-                                    image = Image.open(io.BytesIO(request.FILES["filename"].file.read()))
+                                        # save image to location
+                                        image.save(image_location)
                                     
-                                    # save image to location
-                                    image.save(image_location)
+                                        # append newly created image to image_list
+                                        img_list.append(image_location[len(REPO_DIR)+1:])
                                     
-                                    # append newly created image to image_list
-                                    img_list.append(image_location[len(REPO_DIR)+1:])
-                                except:
-                                    pass
+                                        # uploaded image has to be pushed along with the page
+                                        track_modified_file(request, Repo_Name, image_location)
+                                        editor.update_index(Repo_Name, [image_location])
+                                    except:
+                                        pass
 
-                            else:
+                                else:
                                 
-                                # image already exists, set file_exists to True
-                                file_exists = True
+                                    # image already exists, set file_exists to True
+                                    file_exists = True
                             
-                        # image is selected from dropdown
-                        else:
+                            # image is selected from dropdown
+                            else:
                             
-                            # get image name 
-                            name = request.POST['available_images'].split('/')[-1]
+                                # get image name 
+                                name = request.POST['available_images'].split('/')[-1]
                         
-                        # set message and save_btn value for html rendering
-                        msg = "Success. Please push the changes"
-                        save_btn = "undo"
+                            # set message and save_btn value for html rendering
+                            msg = "Success. Please push the changes"
+                            save_btn = "undo"
                         
-                        # Change value of message and save_btn if file already exists
-                        if file_exists:
-                            msg = "File already exists with same name. Please change file name."
-                            save_btn = "save"   
+                            # Change value of message and save_btn if file already exists
+                            if file_exists:
+                                msg = "File already exists with same name. Please change file name."
+                                save_btn = "save"   
                             
-                        # Change source of image tag 
-                        else:
+                            elif conflict:
+                                msg = conflict
+                                save_btn = "save"
                             
-                            # get img tag at index
-                            image_to_change = original_soup.find_all('img')[int(request.POST['index'])]
+                            elif invalid_size:
+                                msg = "Width and height have to be positive whole numbers."
+                                save_btn = "save"
                             
-                            # construct new source path 
-                            new_src = f"{image_to_change['src'][:image_to_change['src'].rfind('/')+1]}{name}"
+                            # Change source of image tag 
+                            else:
                             
-                            # set new source path to selected image
-                            image_to_change['src'] = new_src
+                                # construct new source path 
+                                new_src = f"{image_to_change['src'][:image_to_change['src'].rfind('/')+1]}{name}"
+                            
+                                # set new source path to selected image
+                                image_to_change['src'] = new_src
+                                
+                                # a missing width or height keeps the new image's aspect ratio, read from the metadata index
+                                new_image = editor.resolve_src(os.path.relpath(Path_To_Search, Repo_Name), new_src)
+                                if new_image is not None:
+                                    width, height = editor.scaled_size(editor.image_metadata(Repo_Name, new_image), width, height)
 
-                            # if width is not None
-                            if width:
+                                # if width is not None
+                                if width:
                                 
-                                # set width value
-                                image_to_change['width'] = width
+                                    # set width value
+                                    image_to_change['width'] = width
                             
-                            # if height is not None
-                            if height:
+                                # if height is not None
+                                if height:
                                 
-                                # set height value
-                                image_to_change['height'] = height
+                                    # set height value
+                                    image_to_change['height'] = height
 
-                            # write changed contents to the html file
-                            with open(Path_To_Search, "w") as fp:
-                                    fp.write(original_soup.prettify())
+                                # write changed contents to the html file
+                                with open(Path_To_Search, "w") as fp:
+                                        fp.write(original_soup.prettify())
+                            
+                                track_modified_file(request, Repo_Name, Path_To_Search)
+                                editor.update_index(Repo_Name, [Path_To_Search])
                                     
-                    # Nither image is selected from dropdown, nor image is uploaded
-                    else:
-                        msg = "Please select image from dropdown or upload an image"
-                        save_btn = "save"
+                        # Nither image is selected from dropdown, nor image is uploaded
+                        else:
+                            msg = "Please select image from dropdown or upload an image"
+                            save_btn = "save"
                     
-                    with open(Path_To_Search) as fp:
-                        soup = BeautifulSoup(fp, 'html.parser') 
-                        
-                        
-                        Response_Image_Table = get_all_images(soup=soup,  
-                                                              img_list=img_list)   
-                                                    
+                        Response_Image_Table = editor.with_metadata(Repo_Name, editor.image_table(Path_To_Search, img_list), REPO_DIR)
                         Response_Image_Table_Length = len(Response_Image_Table)
 
                   
-                elif 'save' in request.POST and 'push' not in request.POST:
-                    
-                    # Write the soup to the source file or Undo saved changes
-                    save_btn = request.POST['save']
-                    if save_btn == "save":
-                        with open(Path_To_Search, "w") as fp:
-                            original_soup = original_soup.prettify()
-                            fp.write(original_soup)
-                        # repo.git.add(update=True)
-                        # repo.index.commit(Commit_Message)
-                        msg = "Success. Please push the changes"
-                        save_btn = "undo"
+                    elif 'restyle' in request.POST:
+                    
+                        # rewrite a colour or font-size on every page of the site, or only count where it's used
+                        changes = [(request.POST['Style_Property'], request.POST['Style_From'], request.POST['Style_To'])]
+                        dry_run = request.POST['restyle'] != 'replace'
+                        
+                        changed = editor.restyle_workspace(Repo_Name, changes, dry_run=dry_run)
+                        count = sum(changed.values())
+                        
+                        if dry_run:
+                            msg = f"Found {count} declarations on {len(changed)} pages"
+                        elif count:
+                            for page in changed:
+                                track_modified_file(request, Repo_Name, os.path.join(Repo_Name, page))
+                            msg = "Success. Please push the changes"
+                            save_btn = "undo"
+                        else:
+                            msg = "Nothing to replace"
+                    
+                    
+                    elif 'replace_image' in request.POST:
+                    
+                        # point every page using an image to another one, each page is written once
+                        old_image = os.path.relpath(os.path.join(REPO_DIR, request.POST['Old_Image']), Repo_Name)
+                        new_image = os.path.relpath(os.path.join(REPO_DIR, request.POST['New_Image']), Repo_Name)
+                        
+                        changed = editor.replace_image(Repo_Name, old_image, new_image)
                         
-                    else:
-                        repo = git.Repo(Repo_Name)
-                        repo.git.stash("save")
-                        msg = "Changes successfully restored"
-                        save_btn = "save"
-                    
-                    with open(Path_To_Search) as fp:
-                        soup = BeautifulSoup(fp, 'html.parser')
-                    # tags = ['style']
-                    # for t in tags:
-                    #     [s.extract() for s in soup(t)]
-                    
-                    Response_Table = get_all_web_elements(soup)
-                    Response_Table_Length = len(Response_Table)
-                    
-                    
-                elif 'push' in request.POST:
-                    
-                    try:
-                        change_request = ChangeRequest(client_request=client_request, repo=Repo_Name)
-                        change_request.save()
-                        msg = "Changes have been pushed successfully"
-                    except:
-                        msg = "Failed to push changes!"
+                        if changed:
+                            for page in changed:
+                                track_modified_file(request, Repo_Name, os.path.join(Repo_Name, page))
+                            msg = "Success. Please push the changes"
+                            save_btn = "undo"
+                        else:
+                            msg = "Image isn't used by any page"
+                        
+                        Asset_Table = asset_table(Repo_Name)
+                    
+                    
+                    elif 'assets' in request.POST:
+                        Asset_Table = asset_table(Repo_Name)
+                    
+                    
+                    elif 'save' in request.POST and 'push' not in request.POST:
+                    
+                        # Write the soup to the source file or Undo saved changes
+                        save_btn = request.POST['save']
+                        if save_btn == "save":
+                            with open(Path_To_Search, "w") as fp:
+                                original_soup = original_soup.prettify()
+                                fp.write(original_soup)
+                            # repo.git.add(update=True)
+                            # repo.index.commit(Commit_Message)
+                            track_modified_file(request, Repo_Name, Path_To_Search)
+                            msg = "Success. Please push the changes"
+                            save_btn = "undo"
+                        
+                        else:
+                            repo = editor.git.Repo(Repo_Name)
+                            repo.git.stash("save")
+                            pop_modified_files(request, Repo_Name)
+                            editor.build_index(Repo_Name)
+                            msg = "Changes successfully restored"
+                            save_btn = "save"
+                    
+                        # tags = ['style']
+                        # for t in tags:
+                        #     [s.extract() for s in soup(t)]
+                    
+                        Response_Table = editor.text_table(Path_To_Search)
+                        Response_Table_Length = len(Response_Table)
+                    
+                    
+                    elif 'push' in request.POST:
+                    
+                        # only files changed by the editor are staged and pushed
+                        files = request.session.get('modified_files', {}).get(Repo_Name, [])
+                    
+                        if not files:
+                            msg = "No changes to push"
+                    
+                        else:
+                            try:
+                                change_request = ChangeRequest(client_request=client_request, repo=Repo_Name, files=files)
+                                change_request.save()
+                                pop_modified_files(request, Repo_Name)
+                                msg = "Changes have been pushed successfully"
+                            except:
+                                msg = "Failed to push changes!"
                         
                     
                 return TemplateResponse(request, 
@@ -782,6 +660,7 @@ def change_request(request: Any) -> TemplateResponse:
                                          'Text_Table_Length':Response_Table_Length,
                                          'Image_Table':Response_Image_Table, 
                                          'Image_Table_Length':Response_Image_Table_Length,
+                                         'Asset_Table':Asset_Table,
                                          'msg':msg, 
                                          'save_btn':save_btn, 
                                          'client_req_urls':request.POST['client_req_urls'],
@@ -794,6 +673,46 @@ def change_request(request: Any) -> TemplateResponse:
     return redirect("index")
 
 
+def download(request: Any) -> StreamingHttpResponse:
+    """
+    Download a client's workspace as a zip archive, generated while it is sent.
+    
+    : args: request: Any(WSGI Requst object), GET parameters: 'url' of the client request,
+                     'changed' to only include files changed since sync, 'compress' to deflate
+    : return: StreamingHttpResponse: zip archive
+    """
+    
+    if not request.user.is_authenticated:
+        return redirect("login")
+    
+    # clients can only download their own workspaces, staff any of them
+    client_requests = ClientRequest.objects.filter(url=request.GET.get('url', ''))
+    if not request.user.is_staff:
+        client_requests = client_requests.filter(profile=request.user)
+    client_request = client_requests.first()
+    
+    if client_request is None or not os.path.isdir(workspace_path(client_request)):
+        raise Http404("No workspace for this request")
+    
+    Repo_Name = workspace_path(client_request)
+    changed_only = bool(request.GET.get('changed'))
+    compress = bool(request.GET.get('compress'))
+    
+    sizes = export_sizes(Repo_Name, changed_only)
+    
+    response = StreamingHttpResponse(stream_zip(Repo_Name, sizes, compress), content_type='application/zip')
+    
+    # stored archives have a known length, deflated ones are sent chunked
+    length = None if compress else archive_size(sizes)
+    if length is not None:
+        response['Content-Length'] = length
+    
+    name = os.path.basename(Repo_Name.rstrip(os.sep))
+    response['Content-Disposition'] = f'attachment; filename="{name}{"-changes" if changed_only else ""}.zip"'
+    
+    return response
+
+
 def password_reset_request(request):
 
     if request.method == "POST":
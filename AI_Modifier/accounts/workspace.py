@@ -0,0 +1,325 @@
+"""
+Local workspaces of client requests.
+
+Git upstreams are fetched once into a bare mirror which is shared by all
+client requests using the same code link. Every client request gets its own
+lightweight worktree of that mirror. FTP sites are downloaded into a plain
+directory.
+"""
+import hashlib
+import os
+import re
+import shutil
+from pathlib import Path
+
+from .ftp_transfer import download_files, with_session
+from .history import files_size, track
+from .lazy import lazy_import
+from .locks import repo_lock, generation, bump_generation, single_flight
+
+git = lazy_import('git')
+
+# Create path where all repos from client will be stored
+REPO_DIR = os.path.join(os.path.join(Path(__file__).resolve().parent, 'static'), 'All_Repo')
+
+# Bare mirrors are shared between worktrees and kept out of the static tree
+MIRROR_DIR = os.path.join(Path(__file__).resolve().parent, 'mirrors')
+
+# Names of the two levels of directories workspaces are fanned out over
+FAN_OUT = re.compile(r'[0-9a-f]{2}')
+
+# FTP downloads in progress, partial files are kept here until a sync completes
+DOWNLOAD_DIR = os.path.join(Path(__file__).resolve().parent, 'downloads')
+
+
+def is_ftp(client_request) -> bool:
+    """
+    Check if client request is served over FTP instead of git.
+    """
+    return client_request.version_control.lower() == 'ftp'
+
+
+def upstream_url(client_request) -> str:
+    """
+    Build git url of client request with credentials.
+    """
+    return client_request.code_link.replace('//', f'//{client_request.username}:{client_request.token}@')
+
+
+def normalize_url(code_link: str) -> str:
+    """
+    Normalize upstream url, same upstream may be written with or without trailing '/' and '.git'.
+    """
+    url = code_link.strip().rstrip('/')
+    if url.endswith('.git'):
+        url = url[:-len('.git')]
+
+    return url
+
+
+def mirror_path(code_link: str) -> str:
+    """
+    Get path of the bare mirror shared by everyone using 'code_link'.
+
+    : args: code_link: url of the upstream repository
+
+    : returns: path of the mirror within MIRROR_DIR
+    """
+    url = normalize_url(code_link)
+    key = hashlib.sha1(url.encode()).hexdigest()[:16]
+
+    return os.path.join(MIRROR_DIR, f"{url[url.rfind('/')+1:]}-{key}.git")
+
+
+def workspace_name(client_request) -> str:
+    """
+    Get directory name of the workspace of client request, its id and branch.
+    """
+    branch = re.sub(r'[^A-Za-z0-9._-]+', '-', client_request.branch or '').strip('-.') or 'root'
+    return f'{client_request.pk}-{branch}'
+
+
+def workspace_path(client_request) -> str:
+    """
+    Get path of the local checkout of client request.
+
+    Workspaces are fanned out over two levels of directories named after a
+    hash of the client request's id and branch, e.g. All_Repo/3f/a2/42-main,
+    so no directory grows with the number of clients and the path is computed
+    without listing anything.
+
+    : args: client_request: ClientRequest object
+
+    : returns: path of the workspace within REPO_DIR
+    """
+    key = hashlib.sha1(f'{client_request.pk}:{client_request.branch or ""}'.encode()).hexdigest()
+    return os.path.join(REPO_DIR, key[:2], key[2:4], workspace_name(client_request))
+
+
+def legacy_workspace_path(client_request) -> str:
+    """
+    Get path of the workspace of client request in the old flat layout, see migrate_workspaces.
+    """
+    branch = client_request.branch or ''
+
+    # FTP sites were downloaded into folder named after the remote directory
+    if is_ftp(client_request):
+        return os.path.join(REPO_DIR, branch[branch.rfind('/')+1:])
+
+    url = normalize_url(client_request.code_link)
+    return os.path.join(REPO_DIR, f"{url[url.rfind('/')+1:]}-{client_request.pk}")
+
+
+def workspace_paths() -> list:
+    """
+    Get paths of all workspaces within the fan-out directories of REPO_DIR.
+    """
+    paths = []
+
+    # workspaces of the old flat layout aren't within two character hash directories
+    for first in scan_dirs(REPO_DIR, FAN_OUT):
+        for second in scan_dirs(first, FAN_OUT):
+            paths.extend(scan_dirs(second))
+
+    return paths
+
+
+def scan_dirs(path: str, pattern: 're.Pattern' = None) -> list:
+    """
+    Get sorted paths of directories directly within 'path' (whose name matches 'pattern'), symlinks aren't followed.
+    """
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return []
+
+    return sorted(entry.path for entry in entries
+                  if entry.is_dir(follow_symlinks=False) and (pattern is None or pattern.fullmatch(entry.name)))
+
+
+def list_workspace(repo_name: str) -> tuple:
+    """
+    Find all html pages and images within workspace.
+
+    : args: repo_name: path of the workspace
+
+    : returns: tuple of html pages ([filename, path]) and images (path), paths are relative to REPO_DIR
+    """
+    Html_List = []
+    img_list = []
+
+    for root, dirnames, filenames in os.walk(repo_name):
+        for filename in filenames:
+
+            file_path = os.path.join(root, filename)
+
+            if filename.endswith('.html'):
+                Html_List.append([filename, file_path[len(REPO_DIR)+1:]])
+
+            elif filename.endswith('.png') or filename.endswith('.jpg') or filename.endswith('.jpeg'):
+                img_list.append(file_path[len(REPO_DIR)+1:])
+
+    return Html_List, img_list
+
+
+def sync_mirror(client_request, fetch: bool = True) -> 'git.Repo':
+    """
+    Create or fetch the bare mirror of client request's upstream.
+
+    : args: client_request: ClientRequest object
+          : fetch: False if the mirror is already up to date
+
+    : returns: git.Repo of the mirror
+    """
+    path = mirror_path(client_request.code_link)
+
+    if not os.path.exists(path):
+        mirror = git.Repo.init(path, bare=True, mkdir=True)
+
+        # keep upstream branches as remote branches, local branches belong to worktrees
+        mirror.create_remote('origin', upstream_url(client_request))
+
+        # a new mirror (or one created again after eviction) has nothing fetched yet
+        fetch = True
+
+    else:
+        mirror = git.Repo(path)
+
+    if fetch:
+
+        # credentials may have changed since the last fetch
+        mirror.remote(name='origin').set_url(upstream_url(client_request))
+
+        mirror.git.fetch('origin', '--prune')
+        bump_generation(path)
+
+    return mirror
+
+
+def sync_git(client_request, path: str) -> None:
+    """
+    Fetch shared mirror and bring worktree at 'path' up to date with the upstream branch.
+    """
+    branch = client_request.branch
+
+    # worktree's local branch is private to the workspace, a worktree left
+    # behind for the client request's previous branch keeps its own
+    local_branch = f'ai_modifier/{workspace_name(client_request)}'
+
+    # mirror is shared with other workspaces, it gets a lock of its own
+    mirror_dir = mirror_path(client_request.code_link)
+    started = generation(mirror_dir)
+
+    with repo_lock(mirror_dir):
+
+        # fetch is skipped if another workspace fetched the mirror while this one was waiting
+        mirror = sync_mirror(client_request, fetch=generation(mirror_dir) == started)
+
+        if not os.path.exists(os.path.join(path, '.git')):
+
+            # drop leftovers of a deleted worktree before adding it again
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            mirror.git.worktree('prune')
+
+            mirror.git.worktree('add', '--track', '-B', local_branch, path, f'origin/{branch}')
+            return
+
+    repo = git.Repo(path)
+    repo.git.reset('--hard')
+    repo.git.merge(f'origin/{branch}')
+
+
+def commits_ahead(repo):
+    """
+    Count local commits which are not pushed to the upstream branch yet.
+    """
+    try:
+        return int(repo.git.rev_list('--count', '@{u}..HEAD'))
+    except git.GitCommandError:
+        return 0
+
+
+def sync_ftp(client_request, path: str) -> None:
+    """
+    Download client request's FTP site into 'path' from scratch.
+
+    Files are downloaded into a staging directory first, which survives failed
+    syncs, so the next attempt resumes where the failed one stopped. The
+    workspace is replaced once everything has arrived.
+    """
+    staging = os.path.join(DOWNLOAD_DIR, hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16])
+
+    def download(ftp):
+        # change to location to source
+        ftp.cwd(client_request.branch)
+
+        # download all files to staging directory
+        return download_files(ftp, client_request.branch, staging)
+
+    # connection to the client's host is reused from earlier syncs and pushes
+    downloaded = with_session(client_request, download)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    shutil.move(downloaded, path)
+    shutil.rmtree(staging)
+
+
+def sync_locked(client_request, path: str, lazy: bool = False) -> str:
+    """
+    Sync workspace at 'path' while holding its writer lock.
+    """
+    started = generation(path)
+
+    with repo_lock(path):
+
+        # another worker finished syncing this workspace while this one was waiting,
+        # unless it was evicted meanwhile, which resets the generation
+        if generation(path) != started and os.path.exists(path):
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with track(client_request, 'sync', 'ftp' if is_ftp(client_request) else 'git', path) as attempt:
+            if is_ftp(client_request) and lazy:
+
+                # imported here, lazy mode depends on this module
+                from .ftp_lazy import sync_lazy
+                sync_lazy(client_request, path)
+
+            elif is_ftp(client_request):
+                sync_ftp(client_request, path)
+                attempt.bytes = files_size(path)
+            else:
+                sync_git(client_request, path)
+
+        # imported here, extraction itself depends on this module
+        from .assets import build_index
+        build_index(path)
+
+        bump_generation(path)
+
+    return path
+
+
+def sync_workspace(client_request, extract: bool = True, lazy: bool = False) -> str:
+    """
+    Bring workspace of client request up to date with its remote.
+
+    : args: client_request: ClientRequest object
+          : extract: extract tables of all pages in the background once synced
+          : lazy: only list FTP sites, pages are downloaded when opened (see ftp_lazy)
+
+    : returns: path of the workspace
+    """
+    path = workspace_path(client_request)
+
+    # requests arriving during a sync of the same workspace share its result
+    single_flight(('sync', path), lambda: sync_locked(client_request, path, lazy))
+
+    if extract:
+        from .pipeline import run_in_background
+        run_in_background(path)
+
+    return path
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.forms import UserCreationForm
-from .models import Profile
+from .models import Profile, OutgoingEmail
 
 
 class UserRegisterForm(UserCreationForm):
@@ -28,3 +28,13 @@ class ProfileAdmin(UserAdmin):
           'fields': ('email', 'name'),
       }),
     )
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'created_at', 'sent_at', 'attempts', 'error',)
+    list_filter = ('sent_at',)
+    search_fields = ('to',)
+    readonly_fields = ('created_at',)
+    # welcome emails hold generated passwords until they are sent
+    exclude = ('body', 'html_body',)
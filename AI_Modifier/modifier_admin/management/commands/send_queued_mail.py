@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from modifier_admin import outbox
+
+
+class Command(BaseCommand):
+    help = 'Send emails queued in the outbox, reusing one mail server connection per batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=outbox.BATCH_SIZE,
+                            help='Emails sent over one connection.')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep draining the outbox instead of exiting once it is empty.')
+        parser.add_argument('--interval', type=int, default=outbox.INTERVAL,
+                            help='Seconds to wait between runs with --loop.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = outbox.send_all_queued_mail(options['batch_size'])
+            self.stdout.write(f'Sent {sent} emails')
+
+            if not options['loop']:
+                return
+
+            time.sleep(options['interval'])
@@ -0,0 +1,25 @@
+# Generated by Django 4.0.5 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+def blank_sent_bodies(apps, schema_editor):
+    # sent welcome emails kept generated passwords
+    OutgoingEmail = apps.get_model('modifier_admin', 'OutgoingEmail')
+    OutgoingEmail.objects.filter(sent_at__isnull=False).update(body='', html_body='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modifier_admin', '0007_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outgoingemail',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(blank_sent_bodies, migrations.RunPython.noop),
+    ]
@@ -5,20 +5,16 @@ import os
 # from sendgrid.helpers.mail import Mail
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.db.models.signals import pre_save, post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import AbstractUser
 from django.template.loader import render_to_string
-from django.core.mail import send_mail
-from django.core.mail import EmailMultiAlternatives
 
-from .password import random_password, temp_password
+from . import outbox
+from .password import random_password
 from .manager import CustomProfileManager
 
-# Stores password
-temp = temp_password()
-
 # Create your models here.
 class Profile(AbstractUser):
     username = models.CharField(max_length = 100, blank = True, null = True, unique = False)
@@ -38,44 +34,72 @@ class Profile(AbstractUser):
         verbose_name = "Client"
         verbose_name_plural = "Clients"
 
+
+class OutgoingEmail(models.Model):
+    to = models.EmailField(max_length=250)
+    subject = models.CharField(max_length=250)
+    body = models.TextField()
+    html_body = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    # set while a worker sends the email, so other workers leave it alone
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.subject} ({self.to})'
+
+    class Meta:
+        ordering = ('created_at',)
+        verbose_name = "Outgoing Email"
+        verbose_name_plural = "Outgoing Emails"
+
+
+def welcome_email(user, password):
+    """
+    Build (unsaved) welcome email with login credentials of 'user'.
+    """
+    context = {
+                'user': user,
+                'password': password,
+            }
+    
+    return OutgoingEmail(
+        to=user.email,
+        subject=render_to_string('modifier_admin/subject.txt', context).strip(),
+        body=render_to_string('modifier_admin/user_created.txt', context),
+        html_body=render_to_string('modifier_admin/user_created.html', context),
+    )
+
+
 @receiver(pre_save, sender=settings.AUTH_USER_MODEL)
 def add_password(sender, instance, *args, **kwargs):
     
     if not instance.auto_generated:
         password = random_password()
         instance.set_password(password)
-        temp.save_password(password)
+        
+        # kept on the instance being saved until post_save, never shared between users or threads
+        instance.generated_password = password
+        
+        # stored with the same save, so the password isn't generated again
+        instance.auto_generated = True
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def send_mail_to_user(sender, instance, created, **kwargs):
-    password = temp.get_password
+    password = instance.__dict__.pop('generated_password', None)
+    
+    # nothing to tell if this save didn't generate a password
+    if password is None:
+        return
+    
     print(f'\nLogin Credentials\nEmail: {instance.email}\nPassword: {password}') # Display Credentials to console
     if created:
-        instance.auto_generated = True
-        instance.save()
-        
-        # Send Email to user
-        context = {
-                    'user': instance,
-                    'password': password,
-                }
-        
-        subject = render_to_string('modifier_admin/subject.txt', context)
-        text_message = render_to_string('modifier_admin/user_created.txt', context)
-        html_message = render_to_string('modifier_admin/user_created.html', context)
-        
-        mail = EmailMultiAlternatives(subject=subject, from_email=settings.DEFAULT_FROM_EMAIL,
-                             to=[instance.email], body=text_message)
         
-        mail.attach_alternative(html_message, "text/html")
-        mail.send()
+        # Queue Email to user, it is written within the same transaction as the user
+        welcome_email(instance, password).save()
         
-        # send_mail(
-        #             subject='Welcome to AI Modifier!',
-        #             message=html_message,
-        #             html_message=html_message,
-        #             recipient_list=[instance.email],
-        #             from_email=settings.DEFAULT_FROM_EMAIL,
-        #             fail_silently=False,
-        #         )
\ No newline at end of file
+        # background worker sends it once the user is committed
+        transaction.on_commit(outbox.wake)
@@ -0,0 +1,143 @@
+"""
+Outbox of emails.
+
+Emails are stored as OutgoingEmail rows within the transaction which creates
+them and are sent later by a background worker, in batches over a single
+connection to the mail server. A batch is claimed within a short transaction
+and sent outside of it, so no row stays locked while the mail server is
+talked to. Bodies of sent emails and of emails given up on are blanked,
+welcome emails carry generated passwords which must not be kept.
+"""
+import threading
+from datetime import timedelta
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+# Emails failing this many times are left for someone to look at
+MAX_ATTEMPTS = 5
+
+# Emails sent over one connection
+BATCH_SIZE = 100
+
+# Claims of workers which died while sending expire after this long
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+# Worker drains the outbox at least this often (seconds), even if nobody wakes it
+INTERVAL = 60
+
+_wakeup = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def send_queued_mail(batch_size: int = BATCH_SIZE, emails=None) -> int:
+    """
+    Send one batch of queued emails over a single connection.
+
+    : args: batch_size: maximum number of emails to send
+          : emails: OutgoingEmail queryset to send from, the whole outbox if None
+
+    : returns: number of emails sent
+    """
+    from .models import OutgoingEmail
+
+    sent = 0
+    now = timezone.now()
+
+    if emails is None:
+        emails = OutgoingEmail.objects.all()
+
+    # emails given up on earlier, or by a worker which died during their last attempt
+    (OutgoingEmail.objects.filter(sent_at__isnull=True, attempts__gte=MAX_ATTEMPTS)
+                          .filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - CLAIM_TIMEOUT))
+                          .exclude(body='', html_body='')
+                          .update(body='', html_body='', claimed_at=None))
+
+    with transaction.atomic():
+
+        # rows locked by another worker are left to it
+        emails = list(emails.select_for_update(skip_locked=True)
+                                           .filter(sent_at__isnull=True, attempts__lt=MAX_ATTEMPTS)
+                                           .filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - CLAIM_TIMEOUT))
+                                           .order_by('created_at')[:batch_size])
+        if not emails:
+            return 0
+
+        # claimed rows are skipped by other workers once this transaction commits
+        for email in emails:
+            email.attempts += 1
+            email.claimed_at = now
+        OutgoingEmail.objects.bulk_update(emails, ['attempts', 'claimed_at'])
+
+    with get_connection() as mail_connection:
+        for email in emails:
+            mail = EmailMultiAlternatives(subject=email.subject, body=email.body,
+                                          to=[email.to], connection=mail_connection)
+            if email.html_body:
+                mail.attach_alternative(email.html_body, "text/html")
+
+            try:
+                mail.send()
+                email.sent_at = timezone.now()
+                email.error = ''
+
+                # sent emails don't keep the credentials they carried
+                email.body = email.html_body = ''
+                sent += 1
+            except Exception as e:
+                email.error = str(e)
+
+                # given up on, the credentials aren't kept either
+                if email.attempts >= MAX_ATTEMPTS:
+                    email.body = email.html_body = ''
+
+            email.claimed_at = None
+
+    OutgoingEmail.objects.bulk_update(emails, ['sent_at', 'error', 'body', 'html_body', 'claimed_at'])
+
+    return sent
+
+
+def send_all_queued_mail(batch_size: int = BATCH_SIZE, emails=None) -> int:
+    """
+    Send batches until the outbox (or 'emails') is empty or only failing emails are left.
+    """
+    total = 0
+    while True:
+        sent = send_queued_mail(batch_size, emails)
+        total += sent
+        if sent < batch_size:
+            return total
+
+
+def run_worker(interval: int = INTERVAL) -> None:
+    """
+    Drain the outbox whenever woken up, or every 'interval' seconds.
+    """
+    while True:
+        _wakeup.wait(interval)
+        _wakeup.clear()
+        try:
+            send_all_queued_mail()
+        except Exception as e:
+            print(f'Outbox worker failed: {e}')
+        finally:
+            # the worker's thread has its own database connection
+            connection.close()
+
+
+def wake() -> None:
+    """
+    Ask the background worker of this process to drain the outbox, starting it if needed.
+    """
+    global _worker
+
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=run_worker, name='outbox', daemon=True)
+            _worker.start()
+
+    _wakeup.set()
@@ -27,19 +27,3 @@ def random_password(pass_len=12):
         random.shuffle(new_pass)
 
     return "".join(new_pass)
-
-    
-
-class temp_password:
-
-    def __init__(self, password=None) -> None:
-        self.password = password
-    
-    def save_password(self, password):
-        self.password = password
-
-    @property
-    def get_password(self):
-        password = self.password
-        self.password = None
-        return password
\ No newline at end of file
@@ -1,3 +1,93 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.db.models.signals import post_save
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import outbox
+from .models import Profile, OutgoingEmail
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class OutboxTest(TestCase):
+
+    def create_profile(self, email):
+        return Profile.objects.create(email=email, name=email.split('@')[0])
+
+    def test_user_is_saved_once(self):
+        saves = []
+        post_save.connect(lambda sender, **kwargs: saves.append(kwargs['created']), sender=Profile, weak=False,
+                          dispatch_uid='test_user_is_saved_once')
+        try:
+            profile = self.create_profile('client@example.com')
+        finally:
+            post_save.disconnect(sender=Profile, dispatch_uid='test_user_is_saved_once')
+
+        self.assertEqual(saves, [True])
+        self.assertTrue(profile.auto_generated)
+
+    def test_mail_is_queued_not_sent(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.create_profile('client@example.com')
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutgoingEmail.objects.get().to, 'client@example.com')
+        self.assertEqual(callbacks, [outbox.wake])
+
+    def test_batch_is_sent_over_one_connection(self):
+        for i in range(3):
+            self.create_profile(f'client{i}@example.com')
+
+        with mock.patch('modifier_admin.outbox.get_connection', wraps=outbox.get_connection) as get_connection:
+            self.assertEqual(outbox.send_queued_mail(), 3)
+
+        self.assertEqual(get_connection.call_count, 1)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['client0@example.com', 'client1@example.com', 'client2@example.com'])
+        self.assertFalse(OutgoingEmail.objects.filter(sent_at__isnull=True).exists())
+
+        # generated passwords aren't kept once sent
+        self.assertFalse(OutgoingEmail.objects.exclude(body='', html_body='').exists())
+
+        # nothing is sent twice
+        self.assertEqual(outbox.send_queued_mail(), 0)
+
+    def test_failed_mail_is_retried(self):
+        self.create_profile('client@example.com')
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            self.assertEqual(outbox.send_queued_mail(), 0)
+
+        email = OutgoingEmail.objects.get()
+        self.assertEqual((email.attempts, email.error, email.claimed_at), (1, 'down', None))
+        self.assertNotEqual(email.body, '')
+
+        self.assertEqual(outbox.send_all_queued_mail(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_given_up_mail_is_blanked(self):
+        self.create_profile('client@example.com')
+        OutgoingEmail.objects.update(attempts=outbox.MAX_ATTEMPTS - 1)
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            self.assertEqual(outbox.send_queued_mail(), 0)
+
+        email = OutgoingEmail.objects.get()
+        self.assertEqual((email.attempts, email.error, email.body, email.html_body), (outbox.MAX_ATTEMPTS, 'down', '', ''))
+
+        # a worker which died during the last attempt leaves it to the next one
+        self.create_profile('other@example.com')
+        OutgoingEmail.objects.filter(to='other@example.com').update(
+            attempts=outbox.MAX_ATTEMPTS, claimed_at=timezone.now() - outbox.CLAIM_TIMEOUT)
+        self.assertEqual(outbox.send_queued_mail(), 0)
+        self.assertFalse(OutgoingEmail.objects.exclude(body='', html_body='').exists())
+
+    def test_claimed_mail_is_left_alone(self):
+        self.create_profile('client@example.com')
+        OutgoingEmail.objects.update(claimed_at=timezone.now())
+        self.assertEqual(outbox.send_queued_mail(), 0)
+
+        # claim of a worker which died expires
+        OutgoingEmail.objects.update(claimed_at=timezone.now() - outbox.CLAIM_TIMEOUT)
+        self.assertEqual(outbox.send_queued_mail(), 1)